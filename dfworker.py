@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+""" dfworker.py: background triangulation
+
+ A pool of worker threads that triangulates SOIs off of the GUI thread. Jobs
+ are submitted with a key and collected (without blocking) by polling i.e.
+ from a Tk after() callback
+
+  pool = DFWorker()
+  pool.submit(key,soi,cutt)
+  ...
+  for (key,job,df,error) in pool.results(): ...
+  pool.close()
+
+ Until its result arrives an SOI is given a pending df (see pendingdf).
+
+ Retriangulator re-triangulates many SOIs (i.e. after the cut threshold
+ changes) in chunks over a multiprocessing pool using every core
+"""
+
+__name__ = 'dfworker'
+__license__ = 'GPL v3.0'
+__version__ = '0.0.1'
+__date__ = 'October 2026'
+__author__ = 'Dale Patterson'
+__maintainer__ = 'Dale Patterson'
+__email__ = 'wraith.wireless@yandex.com'
+__status__ = 'Development'
+
+import copy                                          # copies of submitted sois
+import collections                                   # chunks in flight
+import threading                                     # worker threads
+import Queue                                         # jobs & results
+import multiprocessing                               # bulk re-triangulation
+import landnav                                       # locks of forked processes
+from soi import SOI                                  # SOI objects
+from soi import DF                                   # DF objects
+
+# CONSTANTS
+DF_THREADS = 2          # number of worker threads
+DF_PENDING = "Pending"  # status of a df waiting on its triangulation
+DF_CHUNK   = 256        # SOIs per bulk re-triangulation task
+
+def pendingdf():
+    """
+     returns a placeholder DF for an SOI waiting on its triangulation. It has
+     no cuts and is not incremental so any lob added to it re-triangulates
+    """
+    df = DF()
+    df.status = DF_PENDING
+    df._sites = None
+    return df
+
+class DFWorker(object):
+    """
+     A pool of threads triangulating SOIs. submit copies the SOI so the
+     caller's SOI is never touched by a worker. results returns the finished
+     jobs as tuples (key,job,df,error) where job is the number returned by
+     submit, df is the found DF or None and error is the exception raised
+     (or None)
+    """
+    def __init__(self,nthreads=DF_THREADS):
+        self._jobs = Queue.Queue()
+        self._results = Queue.Queue()
+        self._lock = threading.Lock()
+        self._nJob = 0          # job counter
+        self._nPending = 0      # jobs submitted but not collected
+        self._threads = []
+        for i in range(nthreads):
+            t = threading.Thread(target=self._work,name='dfworker-%d' % i)
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def __len__(self): return self._nPending
+
+    def submit(self,key,soi,cutt):
+        """ queues the SOI soi (at key) for triangulation with threshold cutt """
+        with self._lock:
+            self._nJob += 1
+            job = self._nJob
+            self._nPending += 1
+        self._jobs.put((key,job,copy.deepcopy(soi),cutt))
+        return job
+
+    def results(self,timeout=None):
+        """
+         returns a list of finished jobs (key,job,df,error) without blocking or,
+         if timeout, waiting up to timeout secs for the first to finish
+        """
+        done = []
+        if timeout:
+            try:
+                done.append(self._results.get(True,timeout))
+            except Queue.Empty:
+                pass
+        while True:
+            try:
+                done.append(self._results.get_nowait())
+            except Queue.Empty:
+                break
+        with self._lock: self._nPending -= len(done)
+        return done
+
+    def close(self):
+        """ stops the workers once queued jobs are finished """
+        for t in self._threads: self._jobs.put(None)
+        for t in self._threads: t.join()
+        self._threads = []
+
+#### PRIVATE FUNCTIONS ####
+
+    def _work(self):
+        """ triangulates jobs until the None sentinel """
+        while True:
+            item = self._jobs.get()
+            if item is None: break
+            (key,job,soi,cutt) = item
+            try:
+                soi.triangulate(cutt)
+                self._results.put((key,job,soi.df,None))
+            except Exception, e:
+                self._results.put((key,job,None,e))
+
+class RetriangulateCancelled(Exception): pass
+
+class Retriangulator(threading.Thread):
+    """
+     Re-triangulates the SOIs keys of recs (a LazyRecords or SOIStore) with
+     threshold cutt in a thread, fanning chunks of SOIs out over a pool of
+     nprocs processes (one per core by default). done and total are the SOIs
+     re-triangulated so far, once finished result is a dict key -> DF of all
+     of them (nothing is changed, the caller swaps them in) or error is the
+     exception that ended it. SOIs that fail to triangulate are left out of
+     result and put in failed, a dict key -> exception raised. Records are
+     loaded one at a time (not kept in memory) on this thread, keys deleted
+     meanwhile are skipped
+     NOTE: the pool is forked on creation i.e. on the caller's thread before
+      this one starts. Other threads (DFWorker, an export) may hold locks at
+      the time, the pool processes only triangulate the SOIs passed to them
+      and the only locks they take are landnav's which _initprocess replaces
+    """
+    def __init__(self,recs,keys,cutt,nprocs=None,chunk=DF_CHUNK):
+        threading.Thread.__init__(self,name='retriangulate')
+        self.daemon = True
+        self.cutt = cutt
+        self.done = 0
+        self.total = len(keys)
+        self.result = None
+        self.error = None
+        self.failed = {}
+        self._recs = recs
+        self._keys = list(keys)
+        self._nprocs = nprocs or multiprocessing.cpu_count()
+        self._chunk = chunk
+        self._cancel = threading.Event()
+        self._pool = multiprocessing.Pool(self._nprocs,_initprocess)
+
+    def cancel(self): self._cancel.set()
+    def cancelled(self): return self._cancel.is_set()
+
+    def run(self):
+        try:
+            # chunks are read here, not by the pool's task thread, with at most
+            # two per process in flight
+            dfs = {}
+            running = collections.deque()
+            for task in self._chunks():
+                running.append(self._pool.apply_async(_triangulatechunk,(task,)))
+                if len(running) >= 2*self._nprocs: self._collect(running.popleft(),dfs)
+            while running: self._collect(running.popleft(),dfs)
+            if self._cancel.is_set(): raise RetriangulateCancelled
+            self.result = dfs
+        except Exception, e:
+            if not isinstance(e,RetriangulateCancelled): self.error = e
+        finally:
+            self._pool.terminate()
+            self._pool.join()
+
+    def _collect(self,running,dfs):
+        """ waits on the chunk running, adding its dfs to dfs & failures to failed """
+        found = running.get()
+        if self._cancel.is_set(): raise RetriangulateCancelled
+        for (key,df,error) in found:
+            if error is None: dfs[key] = df
+            else: self.failed[key] = error
+        self.done += len(found)
+
+    def _chunks(self):
+        """ generator of tasks (chunk of (key,soi),cutt) for the pool """
+        for i in xrange(0,len(self._keys),self._chunk):
+            if self._cancel.is_set(): return
+            chunk = []
+            for key in self._keys[i:i+self._chunk]:
+                try:
+                    rec = self._recs.peek(key)
+                except KeyError:
+                    self.total -= 1
+                    continue
+                if isinstance(rec,SOI): chunk.append((key,rec))
+                else: self.total -= 1
+            yield (chunk,self.cutt)
+
+def _initprocess():
+    """
+     pool process initializer. Locks held by other threads when the process
+     was forked would never be released, replace them
+    """
+    landnav._MGRSLOCK = threading.Lock()
+    landnav._LLCACHE._lock = threading.Lock()
+    landnav._MGRSCACHE._lock = threading.Lock()
+
+def _triangulatechunk(task):
+    """
+     triangulates a chunk of SOIs in a pool process returning [(key,df,error)]
+     where df is the found DF or None and error the exception raised (or None)
+    """
+    (chunk,cutt) = task
+    found = []
+    for (key,soi) in chunk:
+        try:
+            soi.triangulate(cutt)
+            found.append((key,soi.df,None))
+        except Exception, e:
+            found.append((key,None,e))
+    return found
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+""" g6density.py: density of green 6 geolocations
+
+ Bins the fixes, cuts and lobs of the SOIs of a green 6 into 2D histograms for
+ drawing as a heatmap. SOIs are filtered on their summaries (rf and time up)
+ before being loaded and are loaded one at a time (not kept in memory). Lobs
+ are rasterized by sampling points along each lob
+"""
+
+__name__ = 'g6density'
+__license__ = 'GPL v3.0'
+__version__ = '0.0.1'
+__date__ = 'October 2026'
+__author__ = 'Dale Patterson'
+__maintainer__ = 'Dale Patterson'
+__email__ = 'wraith.wireless@yandex.com'
+__status__ = 'Development'
+
+import numpy as np                                   # arrays & histograms
+from soi import SOI                                  # SOI objects
+from landnav import tolatlon                         # mgrs to lat,lon
+from landnav import _GEOD                            # lob termini
+from g6spatial import geolocations                   # fix/cuts of an soi
+
+# CONSTANTS
+LOB_DIST = 10000 # meters lobs are rasterized to
+LOB_STEP = 250   # meters between points sampled along a lob
+
+def selectsois(sois,rf=None,start=None,end=None,callsign=None):
+    """
+     generator of the SOIs in the LazyRecords sois matching all given filters
+      rf - tuple (min,max) of rf
+      start,end - earliest and latest (zulu) time up
+      callsign - callsign that must be in the SOI
+    """
+    for key in sois.keys():
+        summary = sois.summary(key)
+        if summary.convo: continue
+        if rf and not rf[0] <= summary.rf <= rf[1]: continue
+        if start and summary.dtg < start: continue
+        if end and summary.dtg > end: continue
+        rec = sois.peek(key)
+        if not isinstance(rec,SOI): continue
+        if callsign and not callsign in rec.getuniquecallsigns(): continue
+        yield rec
+
+def gather(recs):
+    """
+     returns the tuple (geos,lobs) of the SOIs recs where geos is the tuple of
+     arrays (lats,lons) of their fixes and cuts and lobs is the tuple of
+     arrays (lats,lons,azimuths) of the sites and lobs
+    """
+    geos = []
+    lobs = []
+    for rec in recs:
+        for name in rec.pri:
+            (lat,lon) = tolatlon(rec.sites[name].location)
+            lobs.append((lat,lon,rec.sites[name].lob))
+        geos.extend(geolocations(rec))
+    geos = np.array(geos,dtype=float).reshape(-1,2)
+    lobs = np.array(lobs,dtype=float).reshape(-1,3)
+    return (geos[:,0],geos[:,1]),(lobs[:,0],lobs[:,1],lobs[:,2])
+
+def sitelobs(recs,name=None):
+    """
+     returns the tuple of arrays (lats,lons,azimuths) of the site name (all
+     sites if None) and its lob in each of the SOIs recs
+    """
+    lobs = []
+    for rec in recs:
+        for site in rec.pri:
+            if name is not None and site != name: continue
+            (lat,lon) = tolatlon(rec.sites[site].location)
+            lobs.append((lat,lon,rec.sites[site].lob))
+    lobs = np.array(lobs,dtype=float).reshape(-1,3)
+    return lobs[:,0],lobs[:,1],lobs[:,2]
+
+def lobpoints(lats,lons,azimuths,dist=LOB_DIST,step=LOB_STEP):
+    """
+     samples points every step meters along each lob out to dist returning the
+     tuple of arrays (lats,lons,weights) where each lob's points weigh 1 in total
+    """
+    n = max(1,int(dist // step))
+    if not len(lats): return np.array([]),np.array([]),np.array([])
+    ds = np.tile(np.arange(1,n+1) * float(step),len(lats))
+    lons2,lats2,_ = _GEOD.fwd(np.repeat(lons,n),np.repeat(lats,n),np.repeat(azimuths,n),ds)
+    return np.asarray(lats2),np.asarray(lons2),np.ones(len(ds)) / n
+
+def density(xs,ys,bins,extent,weights=None):
+    """
+     bins the points xs,ys into a bins x bins grid over extent ((x0,x1),(y0,y1))
+     returning the grid with rows of y (i.e. for imshow) and the x,y bin edges
+    """
+    (grid,xedges,yedges) = np.histogram2d(xs,ys,bins=bins,range=extent,weights=weights)
+    return grid.T,xedges,yedges
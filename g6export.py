@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+""" g6export.py: green 6 csv/GeoJSON exporter
+
+ Exports the SOIs of a green 6 to csv, one row per SOI site, or to GeoJSON, one
+ feature per SOI. Rows/features are generated one SOI at a time and written
+ through a buffered writer. Records are peeked at (see LazyRecords.peek) so
+ exporting a stored green 6 does not load it into memory. ExportWorker runs a csv export in a thread reporting progress. csv
+ export can also be run from the command line:
+
+  python g6export.py [-s SITE] [-n {true,grid,magnetic}] [-l] [-c CONF] g6 csv
+"""
+
+__license__ = 'GPL v3.0'
+__version__ = '0.0.1'
+__date__ = 'October 2026'
+__author__ = 'Dale Patterson'
+__maintainer__ = 'Dale Patterson'
+__email__ = 'wraith.wireless@yandex.com'
+__status__ = 'Development'
+
+import os                                            # for path, remove
+import sys                                           # for stderr, exit
+import csv                                           # csv writer
+import json                                          # GeoJSON writer
+import threading                                     # export worker
+import argparse                                      # command line
+from soi import SOI                                  # SOI objects
+from soi import summarize                            # list columns of records
+from soi import z2l                                  # zulu to local
+from soi import DF_FIX,DF_CUT,DF_CUT_X               # df state & cut location
+from landnav import convertazimuth                   # convert norths
+from landnav import tolatlon                         # mgrs to lat,lon
+from g6store import openg6                           # open a green 6
+from lobsterconfig import LobsterConfig              # preferences reader
+
+#### exceptions ####
+class ExportCancelled(Exception): pass               # export was cancelled
+
+# CONSTANTS
+G6_HEADER = ["NUM","SITE","LOCATION","TIME UP","RF","LOB","CALLSIGNS","GIST","OP NOTE","GEOLOCATION"]
+BUFSIZE = 65536                                      # output buffer size
+PROGRESS_EVERY = 100                                 # sois between progress
+
+def cleantext(text):
+    """ cleans text for csv, removes non-printable characters """
+    return "".join([ch for ch in text if 31 < ord(ch) < 126])
+
+def eachsoi(sois,progress=None):
+    """
+     generator of (key,soi) of the SOIs in the dict sois in key order, convos
+     are skipped. Records of sois having peek (i.e. LazyRecords or a SOIStore)
+     are not kept loaded. If set, progress(done,total) is called every
+     PROGRESS_EVERY records and after the last
+    """
+    get = getattr(sois,'peek',sois.__getitem__)
+    keys = sorted(sois.keys())
+    total = len(keys)
+    for i in range(total):
+        try:
+            soi = get(keys[i])
+        except KeyError:
+            # deleted since the export started
+            soi = None
+        if isinstance(soi,SOI): yield keys[i],soi
+        if progress and ((i+1) % PROGRESS_EVERY == 0 or i+1 == total):
+            progress(i+1,total)
+
+def soirows(sois,sites=None,north='true',dtime='zulu',decl=None,z2lDiff=0,progress=None):
+    """
+     generator of csv rows of the SOIs in the dict sois (convos are skipped)
+      sites - names of sites to write or None for all sites
+      north - north of lobs, one of {'true','grid','magnetic'}
+      dtime - time up as 'zulu' or 'local'
+      decl - declination diagram (see landnav.convertazimuth)
+      z2lDiff - local time difference from zulu
+      progress - progress callback (see eachsoi)
+    """
+    recNum = 0
+    for key,soi in eachsoi(sois,progress):
+        # columns common to all of the soi's sites
+        tu = soi.dtg
+        if dtime == 'local': tu = z2l(tu,z2lDiff)
+        tu = tu.strftime("%d%H%ML%b%Y").upper()
+        rf = "%.3f" % soi.getrf()
+        callsigns = " ".join(soi.getuniquecallsigns())
+        gist = cleantext(soi.gist)
+        opnote = cleantext(soi.opnote)
+        status = soi.df.status
+        for name in soi.pri:
+            # only write if it is in specified sites list
+            if sites is not None and not name in sites: continue
+            lob = soi.sites[name].lob
+            if north != 'true': lob = convertazimuth('true',north,lob,decl)
+            recNum += 1
+            yield [recNum,name,soi.sites[name].location,tu,rf,"%.1f" % lob,
+                   callsigns,gist,opnote,status]
+
+def soifeature(key,soi):
+    """
+     returns the GeoJSON feature (a dict) of soi. The geometry is the point of
+     its fix or cut, None if it has neither
+    """
+    location = None
+    geometry = None
+    if soi.df:
+        if soi.df.state == DF_FIX: location = soi.df.fix
+        elif soi.df.state == DF_CUT: location = soi.df.cuts[0][DF_CUT_X]
+    if location:
+        (lat,lon) = tolatlon(location)
+        geometry = {'type':'Point','coordinates':[round(lon,6),round(lat,6)]}
+    sites = []
+    for name in soi.pri:
+        sites.append({'name':name,
+                      'location':soi.sites[name].location,
+                      'lob':soi.sites[name].lob})
+    status = None
+    if soi.df: status = soi.df.status
+    return {'type':'Feature','id':key,'geometry':geometry,
+            'properties':{'dtg':soi.dtg.isoformat(),'rf':soi.rf,'status':status,
+                          'location':location,'sites':sites,
+                          'callsigns':soi.getuniquecallsigns(),
+                          'gist':soi.gist,'opnote':soi.opnote}}
+
+def export(fpath,sois,sites=None,north='true',dtime='zulu',decl=None,z2lDiff=0,progress=None):
+    """
+     writes the SOIs in sois to the csv fpath returning the number of rows
+     written (see soirows for parameters)
+    """
+    fout = open(fpath,'wb',BUFSIZE)
+    try:
+        wr = csv.writer(fout)
+        wr.writerow(G6_HEADER)
+        n = 0
+        for row in soirows(sois,sites,north,dtime,decl,z2lDiff,progress):
+            wr.writerow(row)
+            n += 1
+        return n
+    finally:
+        fout.close()
+
+def exportgeojson(fpath,sois,progress=None):
+    """
+     writes the SOIs in sois to fpath as a GeoJSON FeatureCollection returning
+     the number of features written (see eachsoi for progress)
+    """
+    fout = open(fpath,'wb',BUFSIZE)
+    try:
+        fout.write('{"type": "FeatureCollection", "features": [\n')
+        n = 0
+        for key,soi in eachsoi(sois,progress):
+            if n: fout.write(',\n')
+            fout.write(json.dumps(soifeature(key,soi)))
+            n += 1
+        fout.write('\n]}\n')
+        return n
+    finally:
+        fout.close()
+
+class ExportWorker(threading.Thread):
+    """
+     Runs an export in a thread. done and total are the SOIs exported so far,
+     once finished result is the number of rows written or error is the
+     exception that ended the export. If cancelled (or on error) the partially
+     written file is removed. An optional progress(done,total) callback is
+     called from the worker thread
+    """
+    def __init__(self,fpath,sois,sites=None,north='true',dtime='zulu',decl=None,z2lDiff=0,progress=None):
+        threading.Thread.__init__(self,name='g6export')
+        self.daemon = True
+        self.fpath = fpath
+        self.done = 0
+        self.total = len(sois)
+        self.result = None
+        self.error = None
+        self._args = (sois,sites,north,dtime,decl,z2lDiff)
+        self._cb = progress
+        self._cancel = threading.Event()
+
+    def cancel(self): self._cancel.set()
+    def cancelled(self): return self._cancel.is_set()
+
+    def run(self):
+        try:
+            self.result = export(self.fpath,*self._args,progress=self._progress)
+        except Exception, e:
+            if not isinstance(e,ExportCancelled): self.error = e
+            try:
+                os.remove(self.fpath)
+            except OSError:
+                pass
+
+    def _progress(self,done,total):
+        """ records progress, stopping the export if cancelled """
+        if self._cancel.is_set(): raise ExportCancelled
+        self.done = done
+        self.total = total
+        if self._cb: self._cb(done,total)
+
+#### command line
+def main():
+    ap = argparse.ArgumentParser(description='Export the SOIs of a green 6 to csv')
+    ap.add_argument('g6',help='green 6 (.g6) file')
+    ap.add_argument('csv',help='csv file to write')
+    ap.add_argument('-s','--site',action='append',help='only export site (repeatable)')
+    ap.add_argument('-n','--north',default='true',choices=['true','grid','magnetic'],
+                    help='north of lobs (default true)')
+    ap.add_argument('-l','--local',action='store_true',help='time up in local time')
+    ap.add_argument('-c','--conf',default='lobster.conf',help='LOBster preferences')
+    args = ap.parse_args()
+
+    try:
+        config = LobsterConfig(args.conf)
+        (store,sites,nSOI,sois) = openg6(args.g6,summarize)
+    except Exception, e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+    def progress(done,total): sys.stderr.write("\r%d/%d SOIs" % (done,total))
+    dtime = 'zulu'
+    if args.local: dtime = 'local'
+    try:
+        n = export(args.csv,sois,args.site,args.north,dtime,config.declination,
+                   config.ui['z2l'],progress)
+    except Exception, e:
+        sys.stderr.write("\nError writing %s: %s\n" % (args.csv,e))
+        return 1
+    finally:
+        if store: store.close()
+    sys.stderr.write("\nWrote %d SOIs to %s\n" % (n,args.csv))
+    return 0
+
+if __name__ == '__main__': sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+""" g6index.py: green 6 secondary indexes
+
+ Indexes of the records of a green 6 built from and kept up to date with their
+ summaries (see soi.summarize) so they never load a record: SOI keys sorted by
+ time up and by rf (bisect) for time window and frequency band queries and a
+ reverse index of the convos containing each SOI
+"""
+
+__name__ = 'g6index'
+__license__ = 'GPL v3.0'
+__version__ = '0.0.1'
+__date__ = 'October 2026'
+__author__ = 'Dale Patterson'
+__maintainer__ = 'Dale Patterson'
+__email__ = 'wraith.wireless@yandex.com'
+__status__ = 'Development'
+
+import bisect                                        # sorted insert/lookup
+
+# CONSTANTS
+BATCH_REBUILD = 32 # removing more keys than this rebuilds the sorted indexes
+
+class G6Index(object):
+    """
+     Secondary indexes of records by key. update (re)indexes a record given
+     its summary, remove drops it. Queries return keys
+    """
+    def __init__(self):
+        self._dtg = []       # sorted (dtg,key) of SOIs
+        self._rf = []        # sorted (rf,key) of SOIs
+        self._convos = {}    # soi key -> set of keys of convos containing it
+        self._indexed = {}   # key -> summary indexed
+
+    def __len__(self): return len(self._indexed)
+    def __contains__(self,key): return self._indexed.has_key(key)
+
+#### MODIFIERS ####
+
+    def build(self,records):
+        """ indexes all records of records (a LazyRecords) from scratch """
+        self.clear()
+        for key in records.keys():
+            summary = records.summary(key)
+            self._indexed[key] = summary
+            if summary.convo: self._addconvo(key,summary)
+            else:
+                self._dtg.append((summary.dtg,key))
+                self._rf.append((summary.rf,key))
+        self._dtg.sort()
+        self._rf.sort()
+
+    def update(self,key,summary):
+        """ (re)indexes the record key with summary """
+        self.remove(key)
+        self._indexed[key] = summary
+        if summary.convo: self._addconvo(key,summary)
+        else:
+            bisect.insort(self._dtg,(summary.dtg,key))
+            bisect.insort(self._rf,(summary.rf,key))
+
+    def remove(self,key):
+        """ drops the record key from the indexes (missing keys are ignored) """
+        summary = self._indexed.pop(key,None)
+        if summary is None: return
+        if summary.convo: self._delconvo(key,summary)
+        else:
+            self._delsorted(self._dtg,(summary.dtg,key))
+            self._delsorted(self._rf,(summary.rf,key))
+
+    def removemany(self,keys):
+        """ drops the records keys (missing keys are ignored) """
+        keys = set([key for key in keys if self._indexed.has_key(key)])
+        if len(keys) <= BATCH_REBUILD:
+            for key in keys: self.remove(key)
+            return
+        for key in keys:
+            summary = self._indexed.pop(key)
+            if summary.convo: self._delconvo(key,summary)
+        self._dtg = [item for item in self._dtg if not item[1] in keys]
+        self._rf = [item for item in self._rf if not item[1] in keys]
+
+    def clear(self):
+        """ empties the indexes """
+        self._dtg = []
+        self._rf = []
+        self._convos = {}
+        self._indexed = {}
+
+#### QUERIES ####
+
+    def convos(self,key):
+        """ returns the set of keys of convos containing the SOI key """
+        return set(self._convos.get(key,()))
+
+    def bytime(self):
+        """ returns the SOI keys in time up order """
+        return [key for (dtg,key) in self._dtg]
+
+    def between(self,start=None,end=None):
+        """ returns the keys of SOIs up from start to end in time up order """
+        i = 0
+        j = len(self._dtg)
+        if start is not None: i = bisect.bisect_left(self._dtg,(start,))
+        if end is not None:
+            j = bisect.bisect_left(self._dtg,(end,))
+            while j < len(self._dtg) and self._dtg[j][0] == end: j += 1
+        return [key for (dtg,key) in self._dtg[i:j]]
+
+    def band(self,lo=None,hi=None):
+        """ returns the keys of SOIs with rf from lo to hi in rf order """
+        i = 0
+        j = len(self._rf)
+        if lo is not None: i = bisect.bisect_left(self._rf,(lo,))
+        if hi is not None:
+            j = bisect.bisect_left(self._rf,(hi,))
+            while j < len(self._rf) and self._rf[j][0] == hi: j += 1
+        return [key for (rf,key) in self._rf[i:j]]
+
+#### PRIVATE FUNCTIONS ####
+
+    def _addconvo(self,key,summary):
+        """ adds the convo key to the reverse index of its SOIs """
+        for skey in summary.keys: self._convos.setdefault(skey,set()).add(key)
+
+    def _delconvo(self,key,summary):
+        """ removes the convo key from the reverse index of its SOIs """
+        for skey in summary.keys:
+            convos = self._convos.get(skey)
+            if convos is None: continue
+            convos.discard(key)
+            if not convos: del self._convos[skey]
+
+    def _delsorted(self,lst,item):
+        """ deletes item from the sorted list lst """
+        i = bisect.bisect_left(lst,item)
+        if i < len(lst) and lst[i] == item: del lst[i]
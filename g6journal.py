@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+""" g6journal.py: green 6 write-ahead journal
+
+ A sidecar file (the green 6 path + 'j') of changes made since the green 6 was
+ last saved. Records use the g6store record format and are written and fsync'd
+ by a background thread so the caller never waits on the disk. After a crash,
+ replaying the journal on top of the green 6 recovers the unsaved changes.
+"""
+
+__name__ = 'g6journal'
+__license__ = 'GPL v3.0'
+__version__ = '0.0.1'
+__date__ = 'October 2026'
+__author__ = 'Dale Patterson'
+__maintainer__ = 'Dale Patterson'
+__email__ = 'wraith.wireless@yandex.com'
+__status__ = 'Development'
+
+import os                                            # for path, fsync
+import zlib                                          # crc32 of payloads
+import pickle                                        # record payloads
+import threading                                     # background writer
+import Queue                                         # writer's queue
+from g6store import G6Exception                      # base store exception
+from g6store import loads                            # finds moved classes
+from g6store import _HEADER,_RECORD                  # record format
+from g6store import OP_PUT,OP_DEL,OP_META            # record ops
+
+#### exceptions ####
+class G6JournalException(G6Exception): pass          # journal write failed
+
+# CONSTANTS
+MAGIC = 'LOBSTRJ6'
+VERSION = 1
+_OP_TRUNC = 0                                        # writer only, not on disk
+
+def journalpath(fpath):
+    """ returns the journal path for the green 6 at fpath """
+    return fpath + 'j'
+
+class G6Journal(object):
+    """
+     An open journal. put, delete & setmeta queue a record for the writer
+     thread, records are flushed and fsync'd whenever the queue empties
+    """
+    def __init__(self,fpath):
+        """ opens the journal at fpath, creating it if necessary """
+        self.fpath = fpath
+        self._n = 0          # number of records since last truncate
+        self._err = None     # last error of the writer thread
+        self._f = None
+        end = self._scan(lambda op,key,data: None)
+        if end:
+            self._f = open(fpath,'r+b')
+            self._f.seek(end)
+            self._f.truncate() # drop any torn record
+        else:
+            self._f = open(fpath,'w+b')
+            self._f.write(_HEADER.pack(MAGIC,VERSION,0))
+            self._f.flush()
+        self._q = Queue.Queue()
+        self._t = threading.Thread(target=self._writer,name='g6journal')
+        self._t.daemon = True
+        self._t.start()
+
+    def __len__(self): return self._n
+
+    def replay(self):
+        """
+         returns a list of journaled records (op,key,obj) in the order they
+         were written. obj is None for deletions
+        """
+        recs = []
+        def _load(op,key,data):
+            if op == OP_DEL: recs.append((op,key,None))
+            else: recs.append((op,key,loads(data)))
+        self._scan(_load)
+        self._n = len(recs)
+        return recs
+
+    def put(self,key,obj):
+        """ journals obj stored at key """
+        self._queue(OP_PUT,key,pickle.dumps(obj,pickle.HIGHEST_PROTOCOL))
+
+    def delete(self,key):
+        """ journals deletion of key """
+        self._queue(OP_DEL,key,'')
+
+    def setmeta(self,meta):
+        """ journals the metadata dict meta """
+        self._queue(OP_META,0,pickle.dumps(meta,pickle.HIGHEST_PROTOCOL))
+
+    def truncate(self):
+        """ discards all journaled records i.e. after a save """
+        self._queue(_OP_TRUNC,0,'')
+        self._n = 0
+
+    def sync(self):
+        """ blocks until all queued records are on disk """
+        self._q.join()
+        if self._err: raise G6JournalException, self._err
+
+    def close(self,remove=False):
+        """ writes any queued records and closes, removing the file if remove """
+        if self._f:
+            self._q.put(None)
+            self._t.join()
+            self._f.close()
+            self._f = None
+            if remove:
+                try:
+                    os.remove(self.fpath)
+                except OSError:
+                    pass
+
+#### PRIVATE FUNCTIONS ####
+
+    def _queue(self,op,key,data):
+        """ queues a record for the writer thread """
+        if self._err: raise G6JournalException, self._err
+        self._q.put((op,key,data))
+        if op != _OP_TRUNC: self._n += 1
+
+    def _writer(self):
+        """ writer thread, writes queued records syncing when the queue empties """
+        while True:
+            item = self._q.get()
+            try:
+                if item is None: break
+                (op,key,data) = item
+                if op == _OP_TRUNC:
+                    self._f.seek(_HEADER.size)
+                    self._f.truncate()
+                else:
+                    self._f.write(_RECORD.pack(op,key,len(data),zlib.crc32(data) & 0xffffffff))
+                    self._f.write(data)
+                if self._q.empty():
+                    self._f.flush()
+                    os.fsync(self._f.fileno())
+            except (IOError,OSError), e:
+                self._err = e
+            finally:
+                self._q.task_done()
+
+    def _scan(self,cb):
+        """
+         calls cb(op,key,data) for each whole record in the journal file and
+         returns the offset of the end of the last whole record or None if
+         the file does not exist or is not a journal
+        """
+        try:
+            fin = open(self.fpath,'rb')
+        except IOError:
+            return None
+        try:
+            hdr = fin.read(_HEADER.size)
+            if len(hdr) != _HEADER.size: return None
+            (magic,version,_) = _HEADER.unpack(hdr)
+            if magic != MAGIC or version > VERSION: return None
+            offset = _HEADER.size
+            while True:
+                rec = fin.read(_RECORD.size)
+                if len(rec) != _RECORD.size: break
+                (op,key,length,crc) = _RECORD.unpack(rec)
+                data = fin.read(length)
+                if len(data) != length: break
+                if zlib.crc32(data) & 0xffffffff != crc: break
+                if not op in (OP_PUT,OP_DEL,OP_META): break
+                cb(op,key,data)
+                offset += _RECORD.size + length
+            return offset
+        finally:
+            fin.close()
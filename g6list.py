@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+""" g6list.py: green 6 list model
+
+ The rows of the green 6 list kept in display order independent of any widget.
+ A view only has to show the rows in its window (see window) so the cost of
+ showing the list is independent of the number of rows. Rows can be inserted
+ and deleted in batches and sorted on any column without touching the view.
+"""
+
+__name__ = 'g6list'
+__license__ = 'GPL v3.0'
+__version__ = '0.0.1'
+__date__ = 'October 2026'
+__author__ = 'Dale Patterson'
+__maintainer__ = 'Dale Patterson'
+__email__ = 'wraith.wireless@yandex.com'
+__status__ = 'Development'
+
+import bisect                                        # sorted insert/lookup
+
+# CONSTANTS
+BATCH_RESORT = 32 # batches larger than this are appended and resorted
+
+class G6ListModel(object):
+    """
+     An ordered collection of rows (tuples of column values) each identified
+     by a unique key. If sortcol is set, rows are kept sorted on that column
+     (ties broken by key) otherwise they are in insertion order
+    """
+    def __init__(self,sortcol=None,reverse=False):
+        self._rows = {}      # key -> row
+        self._order = []     # keys in ascending order (or insertion order)
+        self._skeys = []     # (row[sortcol],key) aligned with _order if sorted
+        self.sortcol = sortcol
+        self.reverse = reverse
+
+    def __len__(self): return len(self._order)
+    def __contains__(self,key): return self._rows.has_key(key)
+
+#### ACCESSORS ####
+
+    def row(self,key): return self._rows[key]
+
+    def keys(self):
+        """ returns the keys in display order """
+        if self.reverse: return self._order[::-1]
+        return self._order[:]
+
+    def index(self,key):
+        """ returns the display index of key """
+        if self.sortcol is None: i = self._order.index(key)
+        else:
+            i = bisect.bisect_left(self._skeys,self._skey(key,self._rows[key]))
+        if self.reverse: return len(self._order)-1-i
+        return i
+
+    def window(self,top,n):
+        """ returns a list of (key,row) of the n rows in display order from top """
+        top = max(0,top)
+        if self.reverse:
+            end = len(self._order)-top
+            keys = self._order[max(0,end-n):max(0,end)][::-1]
+        else:
+            keys = self._order[top:top+n]
+        return [(key,self._rows[key]) for key in keys]
+
+#### MODIFIERS ####
+
+    def insert(self,rows):
+        """ inserts rows, a sequence of (key,row) tuples """
+        rows = list(rows)
+        if len(rows) > BATCH_RESORT:
+            # the last row of a key repeated in the batch wins
+            new = dict(rows)
+            seen = set()
+            keys = []
+            for key,_ in rows:
+                if not key in seen:
+                    seen.add(key)
+                    keys.append(key)
+            old = set([key for key in keys if self._rows.has_key(key)])
+            if old: self._order = [key for key in self._order if not key in old]
+            for key in keys:
+                self._rows[key] = new[key]
+                self._order.append(key)
+            if self.sortcol is not None: self._resort()
+        elif self.sortcol is None:
+            for key,row in rows:
+                if self._rows.has_key(key): self._remove(key)
+                self._rows[key] = row
+                self._order.append(key)
+        else:
+            for key,row in rows:
+                if self._rows.has_key(key): self._remove(key)
+                self._rows[key] = row
+                skey = self._skey(key,row)
+                i = bisect.bisect_left(self._skeys,skey)
+                self._skeys.insert(i,skey)
+                self._order.insert(i,key)
+
+    def delete(self,keys):
+        """ deletes the rows with keys (missing keys are ignored) """
+        keys = set([key for key in keys if self._rows.has_key(key)])
+        if len(keys) > BATCH_RESORT:
+            for key in keys: del self._rows[key]
+            self._order = [key for key in self._order if not key in keys]
+            if self.sortcol is not None:
+                self._skeys = [skey for skey in self._skeys if not skey[1] in keys]
+        else:
+            for key in keys:
+                self._remove(key)
+                del self._rows[key]
+
+    def update(self,key,row):
+        """ replaces the row with key, moving it if its sort column changed """
+        if self.sortcol is not None and row[self.sortcol] != self._rows[key][self.sortcol]:
+            self.insert([(key,row)])
+        else:
+            self._rows[key] = row
+
+    def clear(self):
+        """ deletes all rows """
+        self._rows = {}
+        self._order = []
+        self._skeys = []
+
+    def sort(self,col,reverse=False):
+        """ sorts rows on column col (in reverse order if reverse) """
+        self.reverse = reverse
+        if col != self.sortcol:
+            self.sortcol = col
+            self._resort()
+
+#### PRIVATE FUNCTIONS ####
+
+    def _skey(self,key,row): return (row[self.sortcol],key)
+
+    def _resort(self):
+        """ rebuilds the sorted order from scratch """
+        self._skeys = [self._skey(key,self._rows[key]) for key in self._order]
+        self._skeys.sort()
+        self._order = [skey[1] for skey in self._skeys]
+
+    def _remove(self,key):
+        """ removes key from the order (but not its row) """
+        if self.sortcol is None: self._order.remove(key)
+        else:
+            i = bisect.bisect_left(self._skeys,self._skey(key,self._rows[key]))
+            del self._skeys[i]
+            del self._order[i]
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+""" g6spatial.py: spatial index of green 6 geolocations
+
+ A grid bucket index of the geolocations (fixes and cuts) of SOIs answering
+ which SOIs are inside a box or within a distance of a point without looking
+ at every SOI. Points are hashed into cells of CELL_SIZE degrees, a query only
+ tests the points of the cells it overlaps
+"""
+
+__name__ = 'g6spatial'
+__license__ = 'GPL v3.0'
+__version__ = '0.0.1'
+__date__ = 'October 2026'
+__author__ = 'Dale Patterson'
+__maintainer__ = 'Dale Patterson'
+__email__ = 'wraith.wireless@yandex.com'
+__status__ = 'Development'
+
+import math                                          # cells & distances
+from soi import DF_FIX,DF_CUT,DF_CUT_X               # df state & cut location
+from landnav import tolatlon                         # mgrs to lat,lon
+
+# CONSTANTS
+CELL_SIZE = 0.01       # degrees per cell side (~1km of latitude)
+EARTH_R   = 6371008.8  # mean earth radius in meters
+
+def geolocations(rec):
+    """ returns a list of (lat,lon) of the fix or cuts of the SOI rec """
+    if not rec.df: return []
+    if rec.df.state == DF_FIX: return [tolatlon(rec.df.fix)]
+    if rec.df.state >= DF_CUT:
+        return [tolatlon(cut[DF_CUT_X]) for cut in rec.df.cuts if rec.df._validcut(cut[DF_CUT_X])]
+    return []
+
+def haversine(lat1,lon1,lat2,lon2):
+    """ returns the great circle distance in meters between two points """
+    dLat = math.radians(lat2-lat1)
+    dLon = math.radians(lon2-lon1)
+    a = math.sin(dLat/2)**2 +\
+        math.cos(math.radians(lat1))*math.cos(math.radians(lat2))*math.sin(dLon/2)**2
+    return 2 * EARTH_R * math.asin(min(1,math.sqrt(a)))
+
+class SpatialIndex(object):
+    """
+     A grid bucket index of keys each having zero or more (lat,lon) points.
+     Inserting a key already in the index replaces its points
+    """
+    def __init__(self,cell=CELL_SIZE):
+        self.cell = cell
+        self._pts = {}   # key -> list of (lat,lon)
+        self._cells = {} # (i,j) -> {key:[(lat,lon),...]}
+
+    def __len__(self): return len(self._pts)
+    def __contains__(self,key): return self._pts.has_key(key)
+
+#### MODIFIERS ####
+
+    def insert(self,key,points):
+        """ indexes key at points, a list of (lat,lon) """
+        if self._pts.has_key(key): self.remove(key)
+        self._pts[key] = list(points)
+        for pt in self._pts[key]:
+            self._cells.setdefault(self._cellof(pt),{}).setdefault(key,[]).append(pt)
+
+    def remove(self,key):
+        """ removes key (missing keys are ignored) """
+        for pt in self._pts.pop(key,[]):
+            c = self._cellof(pt)
+            bucket = self._cells.get(c)
+            if bucket is None: continue
+            bucket.pop(key,None)
+            if not bucket: del self._cells[c]
+
+    def clear(self):
+        """ removes all keys """
+        self._pts = {}
+        self._cells = {}
+
+#### QUERIES ####
+
+    def points(self,key): return self._pts[key]
+
+    def inbox(self,s,w,n,e):
+        """ returns the set of keys with a point inside the box s,w,n,e """
+        found = set()
+        for bucket in self._buckets(s,w,n,e):
+            for key,pts in bucket.iteritems():
+                if key in found: continue
+                for (lat,lon) in pts:
+                    if s <= lat <= n and w <= lon <= e:
+                        found.add(key)
+                        break
+        return found
+
+    def near(self,lat,lon,radius):
+        """
+         returns a list of (dist,key) of keys with a point within radius meters
+         of lat,lon sorted by distance (dist is that of the key's nearest point)
+        """
+        dLat = math.degrees(radius / EARTH_R)
+        dLon = math.degrees(radius / (EARTH_R * max(math.cos(math.radians(lat)),1e-6)))
+        found = {}
+        for bucket in self._buckets(lat-dLat,lon-dLon,lat+dLat,lon+dLon):
+            for key,pts in bucket.iteritems():
+                for (plat,plon) in pts:
+                    d = haversine(lat,lon,plat,plon)
+                    if d <= radius and (not found.has_key(key) or d < found[key]):
+                        found[key] = d
+        return sorted([(d,key) for key,d in found.iteritems()])
+
+#### PRIVATE FUNCTIONS ####
+
+    def _cellof(self,pt):
+        """ returns the cell of the point pt """
+        return (int(math.floor(pt[0] / self.cell)),int(math.floor(pt[1] / self.cell)))
+
+    def _buckets(self,s,w,n,e):
+        """ returns the buckets of the cells overlapping the box s,w,n,e """
+        (i0,j0) = self._cellof((s,w))
+        (i1,j1) = self._cellof((n,e))
+        if (i1-i0+1) * (j1-j0+1) > len(self._cells):
+            # a large box, cheaper to test every occupied cell
+            return [self._cells[c] for c in self._cells
+                    if i0 <= c[0] <= i1 and j0 <= c[1] <= j1]
+        buckets = []
+        for i in xrange(i0,i1+1):
+            for j in xrange(j0,j1+1):
+                if self._cells.has_key((i,j)): buckets.append(self._cells[(i,j)])
+        return buckets
@@ -0,0 +1,486 @@
+#!/usr/bin/env python
+""" g6store.py: green 6 storage engine
+
+ An append-only record log with a fixed header and an offset index. Saving a
+ record appends it to the end of the file and opening the file only reads the
+ index (and any record headers appended after it), bodies are not unpickled
+ until requested.
+
+ FILE LAYOUT
+  header  - magic, version and offset of the last index record
+  records - each a record header (op,key,length,crc32) followed by length bytes
+            of payload. op is one of:
+             OP_PUT - payload is a pickled SOI/Convo stored at key
+             OP_DEL - key has been deleted (no payload)
+             OP_META - payload is pickled dict of file metadata (sites etc)
+             OP_INDEX - payload is a pickled index of all records before it
+             OP_SUM - payload is pickled summary of the preceding record
+ A record superseding an earlier one for the same key simply comes later in
+ the file, compact rewrites the file with only the current records.
+
+ A record may be stored with a summary (OP_SUM following its OP_PUT), the
+ summaries are kept in memory and in the index so that a store can be listed
+ without reading records. LazyRecords is a dict of a store's records loading
+ each record on first access.
+"""
+
+__name__ = 'g6store'
+__license__ = 'GPL v3.0'
+__version__ = '0.0.1'
+__date__ = 'October 2026'
+__author__ = 'Dale Patterson'
+__maintainer__ = 'Dale Patterson'
+__email__ = 'wraith.wireless@yandex.com'
+__status__ = 'Development'
+
+import os                                            # for path, rename, fsync
+import struct                                        # header packing
+import zlib                                          # crc32 of payloads
+import pickle                                        # record payloads
+import threading                                     # file access lock
+import tempfile                                      # spilled records
+import UserDict                                      # for DictMixin
+from cStringIO import StringIO                       # unpickle from str
+
+#### exceptions ####
+class G6Exception(Exception): pass                   # generic store
+class G6FormatException(G6Exception): pass           # not a green 6 store
+class G6KeyException(G6Exception,KeyError): pass     # no record for key
+
+# CONSTANTS
+MAGIC = 'LOBSTRG6'
+VERSION = 1
+INDEX_INTERVAL = 256                          # tail records before reindexing
+_HEADER = struct.Struct('<8sHQ')              # magic,version,index offset
+_RECORD = struct.Struct('<BiII')              # op,key,payload length,crc32
+
+# RECORD OPS
+OP_PUT   = 1
+OP_DEL   = 2
+OP_META  = 3
+OP_INDEX = 4
+OP_SUM   = 5
+
+# classes that have moved since they were pickled (old,new) as (module,name)
+MOVED = {('__main__','Convo'):('soi','Convo'),
+         ('lobster','Convo'):('soi','Convo')}
+
+class G6Unpickler(pickle.Unpickler):
+    """ unpickler that finds classes that have moved (see MOVED) """
+    def find_class(self,module,name):
+        (module,name) = MOVED.get((module,name),(module,name))
+        return pickle.Unpickler.find_class(self,module,name)
+
+def loads(data):
+    """ unpickles data finding moved classes """
+    return G6Unpickler(StringIO(data)).load()
+
+def isg6store(fpath):
+    """ returns True if fpath is a green 6 store (False for legacy pickles) """
+    try:
+        fin = open(fpath,'rb')
+        try:
+            return fin.read(len(MAGIC)) == MAGIC
+        finally:
+            fin.close()
+    except IOError:
+        return False
+
+def loadlegacy(fpath):
+    """
+     loads a pickled green 6 file (LOBster <= 0.2.9) returns the tuple
+     (sites,nSOI,sois) NOTE: unpickles everything
+    """
+    fin = open(fpath,'rb')
+    try:
+        unpickler = G6Unpickler(fin)
+        sites = unpickler.load()
+        soiRec = unpickler.load()
+        sois = unpickler.load()
+    finally:
+        fin.close()
+    return sites,soiRec,sois
+
+def openg6(fpath,summarize=None):
+    """
+     opens the green 6 at fpath returning the tuple (store,sites,nSOI,records)
+     where store is the open G6Store (None for pickled files) and records a
+     LazyRecords of its SOIs/convos using summarize
+    """
+    if isg6store(fpath):
+        store = G6Store(fpath)
+        try:
+            meta = store.getmeta()
+            return store,meta['sites'],meta['nSOI'],LazyRecords(store,summarize)
+        except:
+            store.close()
+            raise
+    (sites,nSOI,recs) = loadlegacy(fpath)
+    records = LazyRecords(None,summarize)
+    records.update(recs)
+    return None,sites,nSOI,records
+
+def saveg6(fpath,meta,records,store=None,changed=None):
+    """
+     saves the LazyRecords records and metadata dict meta to fpath. If store is
+     the open store of fpath only the records with keys in changed are appended
+     (or deleted) otherwise all records are written to a new store. Returns the
+     store of fpath, a new store is left open and store is not closed
+    """
+    if store and store.fpath == fpath:
+        for key in changed:
+            if records.has_key(key): records.writeto(store,key)
+            elif store.has_key(key): store.delete(key)
+        store.setmeta(meta)
+        store.flush(True)
+        return store
+    new = G6Store(fpath,True)
+    try:
+        for key in records: records.writeto(new,key)
+        new.setmeta(meta)
+        new.checkpoint()
+        new.flush(True)
+    except:
+        new.close()
+        raise
+    return new
+
+class G6Store(object):
+    """
+     An open green 6 store. Keeps the offset index of current records in
+     memory, payloads are read and unpickled on demand
+    """
+    def __init__(self,fpath,create=False):
+        """
+         opens the store at fpath, if create is True a new (empty) store is
+         created, overwriting any existing file
+        """
+        self.fpath = fpath
+        self._index = {}     # key -> (payload offset,payload length)
+        self._sums = {}      # key -> summary
+        self._meta = None    # (payload offset,payload length) of metadata
+        self._lock = threading.Lock() # file reads/writes may be from any thread
+        self._tail = 0       # number of records after the last index record
+        self._end = 0        # offset of the end of the last good record
+        self._f = None
+        if create:
+            self._f = open(fpath,'w+b')
+            self._f.write(_HEADER.pack(MAGIC,VERSION,0))
+            self._end = _HEADER.size
+            self._f.flush()
+        else:
+            self._f = open(fpath,'r+b')
+            self._readindex()
+
+#### ACCESSORS ####
+
+    def keys(self): return self._index.keys()
+    def has_key(self,key): return self._index.has_key(key)
+    def __contains__(self,key): return self._index.has_key(key)
+    def __len__(self): return len(self._index)
+
+    def get(self,key):
+        """ reads & unpickles the record stored at key """
+        try:
+            (offset,length) = self._index[key]
+        except KeyError:
+            raise G6KeyException, key
+        return loads(self._read(offset,length))
+
+    def getraw(self,key):
+        """ returns the pickled payload of the record stored at key """
+        try:
+            (offset,length) = self._index[key]
+        except KeyError:
+            raise G6KeyException, key
+        return self._read(offset,length)
+
+    def summary(self,key):
+        """ returns the summary of the record stored at key or None """
+        return self._sums.get(key)
+
+    def getmeta(self):
+        """ returns the metadata dict or None if never set """
+        if not self._meta: return None
+        return loads(self._read(*self._meta))
+
+#### MODIFIERS ####
+
+    def put(self,key,obj,summary=None):
+        """ appends a record storing obj (and its summary if any) at key """
+        self.putraw(key,pickle.dumps(obj,pickle.HIGHEST_PROTOCOL),summary)
+
+    def putraw(self,key,data,summary=None):
+        """ appends a record storing the pickled payload data at key """
+        self._index[key] = self._append(OP_PUT,key,data)
+        if summary is None: self._sums.pop(key,None)
+        else:
+            self._append(OP_SUM,key,pickle.dumps(summary,pickle.HIGHEST_PROTOCOL))
+            self._sums[key] = summary
+
+    def delete(self,key):
+        """ appends a deletion record for key """
+        if not self._index.has_key(key): raise G6KeyException, key
+        self._append(OP_DEL,key,'')
+        del self._index[key]
+        self._sums.pop(key,None)
+
+    def setmeta(self,meta):
+        """ appends a metadata record, meta is a dict """
+        self._meta = self._append(OP_META,0,pickle.dumps(meta,pickle.HIGHEST_PROTOCOL))
+
+    def flush(self,sync=False):
+        """
+         flushes appended records to disk (forcing to disk if sync) and
+         writes a new index if enough records have been appended since the
+         last index
+        """
+        if self._tail >= INDEX_INTERVAL: self.checkpoint()
+        self._f.flush()
+        if sync: os.fsync(self._f.fileno())
+
+    def checkpoint(self):
+        """ appends an index of all current records and points the header to it """
+        data = pickle.dumps({'index':self._index,'summaries':self._sums,
+                             'meta':self._meta},pickle.HIGHEST_PROTOCOL)
+        (offset,length) = self._append(OP_INDEX,0,data)
+        with self._lock:
+            self._f.flush()
+            self._f.seek(0)
+            self._f.write(_HEADER.pack(MAGIC,VERSION,offset-_RECORD.size))
+            self._f.flush()
+        self._tail = 0
+
+    def compact(self,fpath=None):
+        """
+         rewrites the store with only current records to fpath (or in place
+         if fpath is None) without unpickling any records. returns the new
+         store, when compacting in place this store is closed
+        """
+        dest = fpath
+        if fpath is None: dest = self.fpath + '.tmp'
+        new = G6Store(dest,True)
+        try:
+            for key in sorted(self._index.keys()):
+                new.putraw(key,self.getraw(key),self._sums.get(key))
+            if self._meta:
+                new._meta = new._append(OP_META,0,self._read(*self._meta))
+            new.checkpoint()
+            new.flush(True)
+        except:
+            new.close()
+            os.remove(dest)
+            raise
+        if fpath is None:
+            # replace this store with the compacted one
+            new.close()
+            self.close()
+            os.rename(dest,self.fpath)
+            new = G6Store(self.fpath)
+        return new
+
+    def close(self):
+        """ writes an index if necessary and closes the file """
+        if self._f:
+            if self._tail: self.checkpoint()
+            self._f.close()
+            self._f = None
+
+#### PRIVATE FUNCTIONS ####
+
+    def _read(self,offset,length):
+        """ reads length bytes of payload at offset """
+        with self._lock:
+            self._f.seek(offset)
+            return self._f.read(length)
+
+    def _append(self,op,key,data):
+        """ appends a record returning the tuple (payload offset,length) """
+        with self._lock:
+            self._f.seek(self._end)
+            self._f.write(_RECORD.pack(op,key,len(data),zlib.crc32(data) & 0xffffffff))
+            self._f.write(data)
+        offset = self._end + _RECORD.size
+        self._end = offset + len(data)
+        self._tail += 1
+        return offset,len(data)
+
+    def _readindex(self):
+        """
+         reads the last index record (if any) and scans the records appended
+         after it. A truncated or corrupt final record (i.e. a crash during a
+         write) ends the scan and will be overwritten by the next append
+        """
+        hdr = self._f.read(_HEADER.size)
+        if len(hdr) != _HEADER.size: raise G6FormatException, "Missing header"
+        (magic,version,idxOffset) = _HEADER.unpack(hdr)
+        if magic != MAGIC: raise G6FormatException, "Not a green 6 store"
+        if version > VERSION: raise G6FormatException, "Unsupported version %d" % version
+
+        offset = _HEADER.size
+        if idxOffset:
+            (op,key,length,crc) = _RECORD.unpack(self._read(idxOffset,_RECORD.size))
+            idx = loads(self._read(idxOffset+_RECORD.size,length))
+            self._index = idx['index']
+            self._sums = idx.get('summaries',{})
+            self._meta = idx['meta']
+            offset = idxOffset + _RECORD.size + length
+
+        # scan any records appended after the index, checking each is whole
+        self._f.seek(0,os.SEEK_END)
+        size = self._f.tell()
+        self._tail = 0
+        while offset + _RECORD.size <= size:
+            (op,key,length,crc) = _RECORD.unpack(self._read(offset,_RECORD.size))
+            start = offset + _RECORD.size
+            if start + length > size: break
+            data = self._read(start,length)
+            if zlib.crc32(data) & 0xffffffff != crc: break
+            if op == OP_PUT:
+                self._index[key] = (start,length)
+                self._sums.pop(key,None)
+            elif op == OP_DEL:
+                self._index.pop(key,None)
+                self._sums.pop(key,None)
+            elif op == OP_SUM: self._sums[key] = loads(data)
+            elif op == OP_META: self._meta = (start,length)
+            elif op != OP_INDEX: break
+            offset = start + length
+            self._tail += 1
+        self._end = offset
+
+class LazyRecords(UserDict.DictMixin):
+    """
+     A dict of records where records in the store are not read until first
+     accessed. summary returns a record's summary without loading it.
+     Records replaced while not loaded (see replace) are spilled to a
+     temporary store until written to the store by writeto. Records may be
+     read from any thread
+     NOTE: values, items, iteration over values etc (anything other than keys)
+      will load every record
+    """
+    def __init__(self,store=None,summarize=None):
+        """
+         store is the G6Store (if any) of records to be loaded lazily and
+         summarize the function returning a summary of a loaded record
+        """
+        self._store = store
+        self._summarize = summarize
+        self._recs = {}        # loaded (or added) records
+        self._lazy = set()     # keys in the store not yet loaded
+        self._spill = None     # temporary store of replaced records
+        self._spilled = set()  # keys in the spill not yet loaded
+        self._lock = threading.RLock() # guards the records & spill
+        if store: self._lazy.update(store.keys())
+
+    def __getitem__(self,key):
+        with self._lock:
+            if key in self._lazy:
+                self._recs[key] = self._store.get(key)
+                self._lazy.discard(key)
+            elif key in self._spilled:
+                self._recs[key] = self._spill.get(key)
+                self._unspill(key)
+            return self._recs[key]
+
+    def __setitem__(self,key,rec):
+        with self._lock:
+            self._lazy.discard(key)
+            if key in self._spilled: self._unspill(key)
+            self._recs[key] = rec
+
+    def __delitem__(self,key):
+        with self._lock:
+            if key in self._lazy: self._lazy.discard(key)
+            elif key in self._spilled: self._unspill(key)
+            else: del self._recs[key]
+
+    def __contains__(self,key): return self.has_key(key)
+    def has_key(self,key):
+        with self._lock:
+            return key in self._lazy or key in self._spilled or key in self._recs
+    def __len__(self):
+        with self._lock:
+            return len(self._lazy) + len(self._spilled) + len(self._recs)
+    def __iter__(self): return iter(self.keys())
+    def keys(self):
+        with self._lock:
+            return list(self._lazy) + list(self._spilled) + self._recs.keys()
+
+    def peek(self,key):
+        """ returns the record at key without keeping it loaded """
+        with self._lock:
+            if key in self._lazy: return self._store.get(key)
+            if key in self._spilled: return self._spill.get(key)
+            return self._recs[key]
+
+    def replace(self,key,rec):
+        """
+         sets the record at key to rec. If the record at key is not loaded,
+         rec is spilled rather than kept in memory
+        """
+        with self._lock:
+            if not key in self._lazy and not key in self._spilled:
+                self[key] = rec
+                return
+            if self._spill is None:
+                # the spill is removed on creation, the open file is all we need
+                (fd,fpath) = tempfile.mkstemp('.g6')
+                os.close(fd)
+                self._spill = G6Store(fpath,True)
+                os.remove(fpath)
+            self._spill.put(key,rec,self._summarize(rec))
+            self._lazy.discard(key)
+            self._spilled.add(key)
+
+    def isloaded(self,key):
+        """ returns True if the record at key is in memory """
+        return key in self._recs
+
+    def summary(self,key):
+        """ returns the summary of the record at key, loading only if necessary """
+        with self._lock:
+            if key in self._lazy:
+                summary = self._store.summary(key)
+                if summary is not None: return summary
+            elif key in self._spilled: return self._spill.summary(key)
+            return self._summarize(self[key])
+
+    def writeto(self,store,key):
+        """ writes the record at key to store, not loading it if possible """
+        with self._lock:
+            if key in self._lazy:
+                store.putraw(key,self._store.getraw(key),self.summary(key))
+            elif key in self._spilled:
+                store.putraw(key,self._spill.getraw(key),self._spill.summary(key))
+                if store is self._store:
+                    # the store has it now
+                    self._unspill(key)
+                    self._lazy.add(key)
+            else:
+                store.put(key,self._recs[key],self._summarize(self._recs[key]))
+
+    def setstore(self,store):
+        """
+         lazily loaded records will be read from store, which must have every
+         record i.e. all were written to it
+        """
+        with self._lock:
+            self._store = store
+            if self._spilled:
+                self._lazy.update(self._spilled)
+                self._spilled.clear()
+                self._unspill(None)
+
+    def close(self):
+        """ drops any spilled records """
+        with self._lock:
+            self._spilled.clear()
+            self._unspill(None)
+
+    def _unspill(self,key):
+        """ removes key from the spill, closing the spill once it is empty """
+        self._spilled.discard(key)
+        if not self._spilled and self._spill is not None:
+            self._spill.close()
+            self._spill = None
@@ -11,18 +11,223 @@ __maintainer__ = 'Dale Patterson'
 __email__ = 'wraith.wireless@yandex.com'
 __status__ = 'Development'
 
-import mpl_toolkits.basemap.pyproj as pyproj
+try:
+    # standalone pyproj avoids loading basemap (and matplotlib) on import
+    import pyproj
+except ImportError:
+    import mpl_toolkits.basemap.pyproj as pyproj
 import mgrs
 import math
+import collections
+import threading
+import numpy as np
 
 # GLOBALS
-_GEOD = pyproj.Geod(ellps='WGS84')
 _MGRS = mgrs.MGRS()
+_MGRSLOCK = threading.Lock() # mgrs conversions share static state in the C library
+
+# GEODESY (see setgeodesy)
+GEODESY_ELLIPSOIDAL = 'ellipsoidal' # exact geodesics on the ellipsoid (pyproj)
+GEODESY_FAST        = 'fast'        # local tangent plane, see TangentPlaneGeodesy
+GEODESY_MODES       = [GEODESY_ELLIPSOIDAL,GEODESY_FAST]
+GEODESY_LOOP        = 16            # fast arrays up to this size are looped
+WGS84_A = 6378137.0                 # semi-major axis (m)
+WGS84_F = 1 / 298.257223563         # flattening
+
+# LEAST SQUARES FIX (lsqfix)
+FIX_SIGMA    = 3       # degrees, standard deviation of a lob
+FIX_CONF     = 2.4477  # scale of the 1 sigma ellipse to 95% confidence (2 dof)
+FIX_ITERS    = 3       # solutions reweighting by range
+FIX_MINRANGE = 100.0   # meters, ranges are at least this when weighting
+FIX_COND     = 1e-6    # lobs closer to parallel than this have no fix
+ELLIPSE_PTS  = 36      # points of an error ellipse outline
+
+# QUADRANTS & LOB ERROR WEDGES (quadrants,wedges)
+WEDGE_DIST = 10000 # meters out to which a lob error wedge is drawn
+WEDGE_PTS  = 2     # points along the far edge of a wedge
+_QUAD_B1 = np.array([-1,-1,1,1])  # signs of the error on b1 of each corner
+_QUAD_B2 = np.array([-1,1,-1,1])  # and on b2
+
+# CONVERSION CACHE
+CACHE_SIZE = 4096 # max # of conversions held in each direction
+LL_ROUND   = 7    # decimal places lat/lon are rounded to for keys (~1cm)
+
+# CUT STATUS (findcuts_batch)
+CUT_VALID = 0 # a single intersection
+CUT_INF   = 1 # infinite solutions
+CUT_AMB   = 2 # ambiguous solution
+CUT_NONE  = 3 # no solution (coincident points)
+
+# GEOTERMS INDICES
+GEO_LAT    = 0
+GEO_LON    = 1
+GEO_RLAT   = 2 # radians
+GEO_RLON   = 3
+GEO_SINLAT = 4
+GEO_COSLAT = 5
+
+# MGRS GRID (mgrsgrid)
+GRID_SPACING = 1000 # meters between gridlines
+GRID_MIN     = 2    # maps narrower than this many lines are widened by it
+GRID_SAMPLES = 8    # points along each gridline (to clip at zone boundaries)
+
+class LRUCache(object):
+    """
+     A bounded least recently used cache. Keeps a count of hits and misses.
+     Values that fail to be made (i.e. raise) are never cached. Safe to use
+     from multiple threads (i.e. dfworker), make is called outside of the lock
+    """
+    def __init__(self,maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self,key,make):
+        """ returns the cached value of key, calling make() on a miss """
+        with self._lock:
+            try:
+                val = self._cache.pop(key)
+            except KeyError:
+                pass
+            else:
+                self.hits += 1
+                self._cache[key] = val # reinsert as most recently used
+                return val
+        val = make()
+        with self._lock:
+            self.misses += 1
+            self._cache.pop(key,None) # made by another thread meanwhile
+            if len(self._cache) >= self.maxsize: self._cache.popitem(last=False)
+            self._cache[key] = val
+        return val
+    
+    def clear(self):
+        """ empties the cache and resets the counters """
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def __len__(self): return len(self._cache)
+
+class ConversionCache(LRUCache):
+    """ An LRUCache of mgrs conversions, invalid mgrs are never cached """
+    pass
+
+_LLCACHE = ConversionCache()   # mgrs -> (lat,lon)
+_MGRSCACHE = ConversionCache() # (lat,lon,precision) -> mgrs
+
+def tolatlon(location):
+    """ cached conversion of mgrs location to the tuple (lat,lon) """
+    def convert():
+        with _MGRSLOCK: return _MGRS.toLatLon(location)
+    return _LLCACHE.get(location,convert)
+
+def tomgrs(lat,lon,precision=5):
+    """
+     cached conversion of lat,lon to a mgrs location of precision digits. lat 
+     and lon are rounded to LL_ROUND decimal places before converting
+    """
+    lat = round(float(lat),LL_ROUND)
+    lon = round(float(lon),LL_ROUND)
+    def convert():
+        with _MGRSLOCK: return _MGRS.toMGRS(lat,lon,MGRSPrecision=precision)
+    return _MGRSCACHE.get((lat,lon,precision),convert)
+
+def cachestats():
+    """ returns a dict of (hits,misses,size) for each conversion direction """
+    return {'latlon':(_LLCACHE.hits,_LLCACHE.misses,len(_LLCACHE)),
+            'mgrs':(_MGRSCACHE.hits,_MGRSCACHE.misses,len(_MGRSCACHE))}
+
+def clearcache():
+    """ empties both conversion caches """
+    _LLCACHE.clear()
+    _MGRSCACHE.clear()
+
+_UTM = {} # (zone,south) -> utm projection
+
+def utmzone(lon):
+    """
+     returns the utm zone (1 to 60) of longitude lon
+     NOTE: the Norway/Svalbard exceptions are not handled
+    """
+    return int((lon + 180) // 6) % 60 + 1
+
+def _utm(zone,south):
+    """ returns the utm projection of zone (southern hemisphere if south) """
+    try:
+        return _UTM[(zone,south)]
+    except KeyError:
+        _UTM[(zone,south)] = pyproj.Proj(proj='utm',zone=zone,ellps='WGS84',south=south)
+        return _UTM[(zone,south)]
+
+def gridextent(locations):
+    """ returns the tuple (s,w,n,e) bounding the mgrs locations """
+    lls = [tolatlon(location) for location in locations]
+    lats = [ll[0] for ll in lls]
+    lons = [ll[1] for ll in lls]
+    return min(lats),min(lons),max(lats),max(lons)
+
+def _gridrange(lo,hi,spacing):
+    """ returns the first and last gridline (in spacings) covering lo to hi """
+    first = int(math.floor(lo / spacing))
+    last = int(math.ceil(hi / spacing))
+    if last - first <= GRID_MIN:
+        first -= GRID_MIN
+        last += GRID_MIN
+    return first,last
+
+def mgrsgrid(extent,spacing=GRID_SPACING):
+    """
+     determines the mgrs gridlines covering extent, a tuple (s,w,n,e) (see
+     gridextent). returns the tuple es,ns of easting and northing lines, each a
+     list of (lats,lons,label,major) where lats and lons are arrays of points
+     along the line, label is the line's 2 digit km and major is True if the
+     line is a 100km square boundary. An extent crossing utm zones is gridded
+     in each zone with the lines clipped to the zone's longitudes
+    """
+    (s,w,n,e) = extent
+    south = n < 0
+    zones = range(utmzone(w),utmzone(e)+1)
+    t = np.linspace(0,1,GRID_SAMPLES)
+    es = []
+    ns = []
+    for zone in zones:
+        utm = _utm(zone,south)
+        zw = -180 + (zone-1) * 6 # zone's longitudes
+        ze = zw + 6
+        
+        # project the corners of the zone's part of the extent to get the
+        # first and last eastings & northings
+        xs,ys = utm([max(w,zw),max(w,zw),min(e,ze),min(e,ze)],[s,n,s,n])
+        (e0,e1) = _gridrange(min(xs),max(xs),spacing)
+        (n0,n1) = _gridrange(min(ys),max(ys),spacing)
+        eings = np.arange(e0,e1+1) * float(spacing)
+        nings = np.arange(n0,n1+1) * float(spacing)
+        
+        # points of all lines of each direction are inverted in one call
+        for lines,ings,x,y in [(es,eings,eings[:,None],nings[0] + t*(nings[-1]-nings[0])),
+                               (ns,nings,eings[0] + t*(eings[-1]-eings[0]),nings[:,None])]:
+            (x,y) = np.broadcast_arrays(x,y)
+            lons,lats = utm(x.ravel(),y.ravel(),inverse=True)
+            lons = np.reshape(lons,x.shape)
+            lats = np.reshape(lats,x.shape)
+            for i in range(len(ings)):
+                (la,lo) = (lats[i],lons[i])
+                if len(zones) > 1:
+                    keep = (lo >= zw) & (lo <= ze)
+                    if keep.sum() < 2: continue
+                    (la,lo) = (la[keep],lo[keep])
+                km = int(round(ings[i])) // 1000
+                lines.append((la,lo,"%02d" % (km % 100),km % 100 == 0))
+    return es,ns
 
 def validMGRS(location):
     """ attempts to convert mgrs location to lat lon, returns false on failure """
     try:
-        _MGRS.toLatLon(location)
+        tolatlon(location)
     except:
         return False
     else:
@@ -63,14 +268,121 @@ def convertazimuth(fNorth,tNorth,azimuth,dd):
             if tNorth == 'magnetic': return (azimuth + dd['g2m']) % 360
             else: return (azimuth + dd['g2t']) % 360
 
+class EllipsoidalGeodesy(object):
+    """
+     exact geodesics on the ellipsoid ellps. inv and fwd are those of
+     pyproj.Geod, arguments are scalars or arrays
+    """
+    name = GEODESY_ELLIPSOIDAL
+    def __init__(self,ellps='WGS84'): self._geod = pyproj.Geod(ellps=ellps)
+    def inv(self,lons1,lats1,lons2,lats2): return self._geod.inv(lons1,lats1,lons2,lats2)
+    def fwd(self,lons,lats,azs,dists): return self._geod.fwd(lons,lats,azs,dists)
+
+class TangentPlaneGeodesy(object):
+    """
+     fast geodesics for short ranges. A line is solved in the plane tangent to
+     the WGS84 ellipsoid at its midpoint, using the meridional and prime
+     vertical radii of curvature there, with the azimuths corrected for the
+     convergence of meridians. inv and fwd take and return the same as
+     pyproj.Geod (azimuths -180 to 180), scalars and small arrays (where numpy
+     overhead dominates) are computed with math and arrays in one numpy pass.
+     Compared to the ellipsoidal geodesic for lines up to 30 km (i.e. VHF DF)
+     the errors are at most:
+       latitude    distance   azimuth    fwd position
+        0-60        0.11 m    0.0002     0.14 m
+        60-75       0.51 m    0.0006     0.59 m
+        75-84       2.9 m     0.0032     3.3 m
+     growing with the cube of the length for longer lines
+    """
+    name = GEODESY_FAST
+    def __init__(self,a=WGS84_A,f=WGS84_F):
+        self.a = a
+        self.e2 = f * (2 - f)
+
+    def inv(self,lons1,lats1,lons2,lats2):
+        """ returns the tuple (azimuths,back azimuths,distances) """
+        if _isscalar(lons1,lats1,lons2,lats2):
+            return self._inv(math,math.atan2,float(lons1),float(lats1),float(lons2),float(lats2))
+        args = np.broadcast_arrays(*[np.asarray(a,dtype=float) for a in (lons1,lats1,lons2,lats2)])
+        if args[0].size <= GEODESY_LOOP: return self._loop(self.inv,args)
+        return self._inv(np,np.arctan2,*args)
+
+    def fwd(self,lons,lats,azs,dists):
+        """ returns the tuple (lons,lats,back azimuths) of the end points """
+        if _isscalar(lons,lats,azs,dists):
+            return self._fwd(math,float(lons),float(lats),float(azs),float(dists))
+        args = np.broadcast_arrays(*[np.asarray(a,dtype=float) for a in (lons,lats,azs,dists)])
+        if args[0].size <= GEODESY_LOOP: return self._loop(self.fwd,args)
+        return self._fwd(np,*args)
+
+    def _loop(self,f,args):
+        """ applies the scalar f to each element of the arrays args """
+        shape = args[0].shape
+        rets = [f(*[float(a) for a in xs]) for xs in zip(*[a.ravel() for a in args])]
+        if not rets: return tuple([np.zeros(shape) for i in range(3)])
+        return tuple([np.array(r).reshape(shape) for r in zip(*rets)])
+
+    def _radii(self,m,rlat):
+        """ returns (sin,cos,meridional,prime vertical) radii at rlat """
+        s = m.sin(rlat)
+        w = 1 - self.e2 * s * s
+        n = self.a / m.sqrt(w)
+        return s,m.cos(rlat),n * (1 - self.e2) / w,n
+
+    def _inv(self,m,atan2,lon1,lat1,lon2,lat2):
+        """ inv with the math module or numpy m """
+        (s,c,rm,rn) = self._radii(m,m.radians((lat1 + lat2) / 2))
+        dLon = m.radians((lon2 - lon1 + 540) % 360 - 180)
+        dn = rm * m.radians(lat2 - lat1)
+        de = rn * c * dLon
+        azm = m.degrees(atan2(de,dn))
+        conv = m.degrees(dLon * s) / 2 # half the convergence of the meridians
+        return (azm-conv+540) % 360 - 180,(azm+conv+360) % 360 - 180,m.sqrt(dn*dn + de*de)
+
+    def _fwd(self,m,lon,lat,az,dist):
+        """ fwd with the math module or numpy m, iterating on the midpoint """
+        lat2 = lat
+        lon2 = lon
+        for i in range(3):
+            (s,c,rm,rn) = self._radii(m,m.radians((lat + lat2) / 2))
+            dLon = m.radians(lon2 - lon)
+            azm = m.radians(az + m.degrees(dLon * s) / 2)
+            lat2 = lat + m.degrees(dist * m.cos(azm) / rm)
+            lon2 = lon + m.degrees(dist * m.sin(azm) / (rn * c))
+        return (lon2+540) % 360 - 180,lat2,(az + m.degrees(dLon * s) + 360) % 360 - 180
+
+def _isscalar(*args):
+    """ returns True if all args are numbers (not sequences) """
+    for arg in args:
+        if not isinstance(arg,(int,long,float)): return False
+    return True
+
+class Geodesy(object):
+    """
+     the current geodesy backend. Modules import _GEOD once, setgeodesy swaps
+     the backend underneath it
+    """
+    def __init__(self,backend): self.backend = backend
+    def inv(self,lons1,lats1,lons2,lats2): return self.backend.inv(lons1,lats1,lons2,lats2)
+    def fwd(self,lons,lats,azs,dists): return self.backend.fwd(lons,lats,azs,dists)
+    name = property(lambda self: self.backend.name)
+
+_GEOD = Geodesy(EllipsoidalGeodesy())
+
+def setgeodesy(mode):
+    """ sets the geodesy backend to mode, one of GEODESY_MODES """
+    if mode == GEODESY_ELLIPSOIDAL: _GEOD.backend = EllipsoidalGeodesy()
+    elif mode == GEODESY_FAST: _GEOD.backend = TangentPlaneGeodesy()
+    else: raise ValueError, "Invalid geodesy %s" % mode
+
 def dist(sp,ep):
     """
      determines the distance between pts sp and ep and the bearing from sp to ep
       sp and ep must be in mgrs coordinates
     """
     try:
-        (sLat,sLon) = _MGRS.toLatLon(sp)
-        (eLat,eLon) = _MGRS.toLatLon(ep)
+        (sLat,sLon) = tolatlon(sp)
+        (eLat,eLon) = tolatlon(ep)
         a,a2,d = _GEOD.inv(sLon,sLat,eLon,eLat)
     except:
         raise ValueError, "Invalid MGRS point"
@@ -88,26 +400,36 @@ def terminus(pt,lob,dist):
     """
     # convert site mgrs to (lat,lon) determine end point and convert back to
     # mgrs before returning
-    (lat,lon) = _MGRS.toLatLon(pt)
+    (lat,lon) = tolatlon(pt)
     lon2,lat2,baz = _GEOD.fwd(lon,lat,lob,dist)
-    return lat2,lon2,_MGRS.toMGRS(lat2,lon2),(baz%360)
+    return lat2,lon2,tomgrs(lat2,lon2),(baz%360)
+
+def geoterms(lat,lon):
+    """
+     returns the precomputed terms used by findcut for the point lat,lon as the
+     tuple (lat,lon,rlat,rlon,sin(rlat),cos(rlat)) where rlat,rlon are radians
+    """
+    rlat = math.radians(lat)
+    rlon = math.radians(lon)
+    return lat,lon,rlat,rlon,math.sin(rlat),math.cos(rlat)
 
 def findcut(p1,b1,p2,b2):
     """
      determines the cut, the intersection between two points p1 and p2 given bearings
      b1 and b2
-     Points p1 and p2 must be tuples (lat,lon)
+     Points p1 and p2 must be tuples (lat,lon) or the precomputed geoterms of 
+     each point
      Bearings b1 and b2 must be True North and in degrees between and 0 and 359.9999.....
      NOTE:
       if sin(angle1) or sin(angle2) = 0 there are infinite solutions
       if sin(angle1) * sin(angle2) < 0 the solution is ambiguous
      FROM http://www.movable-type.co.uk/scripts/latlong.html
     """
-    # convert to radians
-    lat1 = math.radians(p1[0])
-    lon1 = math.radians(p1[1])
-    lat2 = math.radians(p2[0])
-    lon2 = math.radians(p2[1])
+    # convert to radians (if not already precomputed)
+    if len(p1) == 2: p1 = geoterms(p1[0],p1[1])
+    if len(p2) == 2: p2 = geoterms(p2[0],p2[1])
+    (lat1,lon1,sinLat1,cosLat1) = p1[GEO_RLAT:]
+    (lat2,lon2,sinLat2,cosLat2) = p2[GEO_RLAT:]
     b13 = math.radians(b1)
     b23 = math.radians(b2)
     
@@ -116,12 +438,12 @@ def findcut(p1,b1,p2,b2):
 
     # could use already predefined distance function in GEOD for this??    
     dist12 = 2 * math.asin(math.sqrt(math.sin(dLat/2)*math.sin(dLat/2) +\
-                           math.cos(lat1)*math.cos(lat2)*math.sin(dLon/2)*math.sin(dLon/2)))
+                           cosLat1*cosLat2*math.sin(dLon/2)*math.sin(dLon/2)))
     if dist12 == 0: return None
     
-    bA = math.acos((math.sin(lat2) - math.sin(lat1)*math.cos(dist12)) / (math.sin(dist12)*math.cos(lat1)))
+    bA = math.acos((sinLat2 - sinLat1*math.cos(dist12)) / (math.sin(dist12)*cosLat1))
     if math.isnan(bA): bA = 0
-    bB = math.acos((math.sin(lat1) - math.sin(lat2)*math.cos(dist12)) / (math.sin(dist12)*math.cos(lat2)))
+    bB = math.acos((sinLat1 - sinLat2*math.cos(dist12)) / (math.sin(dist12)*cosLat2))
     
     if math.sin(lon2-lon1) > 0:
         b12 = bA
@@ -141,35 +463,222 @@ def findcut(p1,b1,p2,b2):
     alpha3 = math.acos(-math.cos(alpha1) * math.cos(alpha2) + math.sin(alpha1) * math.sin(alpha2) * math.cos(dist12))
     dist13 = math.atan2(math.sin(dist12) * math.sin(alpha1) * math.sin(alpha2),\
                         math.cos(alpha2) + math.cos(alpha1) * math.cos(alpha3))
-    lat3 = math.asin(math.sin(lat1) * math.cos(dist13) + math.cos(lat1) * math.sin(dist13) * math.cos(b13))
-    dLon13 = math.atan2(math.sin(b13) * math.sin(dist13) * math.cos(lat1),\
-                        math.cos(dist13) - math.sin(lat1) * math.sin(lat3))
+    lat3 = math.asin(sinLat1 * math.cos(dist13) + cosLat1 * math.sin(dist13) * math.cos(b13))
+    dLon13 = math.atan2(math.sin(b13) * math.sin(dist13) * cosLat1,\
+                        math.cos(dist13) - sinLat1 * math.sin(lat3))
     lon3 = lon1 + dLon13
     lon3 = (lon3 + 3 * math.pi) % (2 * math.pi) - math.pi
     
     return math.degrees(lat3),math.degrees(lon3)
 
+def findcuts_batch(lats1,lons1,b1,lats2,lons2,b2):
+    """
+     vectorized findcut, determines the cuts for N pairs of points in one pass
+      lats1,lons1,b1 are array-likes of length N giving the first point of each
+      pair and its bearing, lats2,lons2,b2 the second point and its bearing
+      (degrees, bearings True North)
+     returns the tuple lats,lons,status where lats and lons are float arrays of
+     the cuts (NaN where there is no cut) and status is an int array with one of
+     CUT_VALID, CUT_INF, CUT_AMB or CUT_NONE per pair, i.e. the same outcomes as
+     findcut returning a tuple, Inf, NaN or None respectively
+    """
+    lats1 = np.asarray(lats1,dtype=float)
+    lons1 = np.asarray(lons1,dtype=float)
+    lats2 = np.asarray(lats2,dtype=float)
+    lons2 = np.asarray(lons2,dtype=float)
+    rlat1 = np.radians(lats1)
+    rlat2 = np.radians(lats2)
+    g1 = (lats1,lons1,rlat1,np.radians(lons1),np.sin(rlat1),np.cos(rlat1))
+    g2 = (lats2,lons2,rlat2,np.radians(lons2),np.sin(rlat2),np.cos(rlat2))
+    return findcuts_geo(g1,b1,g2,b2)
+
+def findcuts_geo(g1,b1,g2,b2):
+    """
+     findcuts_batch given precomputed geoterms. g1 and g2 are sequences of the 
+     six geoterms columns, each an array of length N (i.e. the transpose of 
+     N geoterms tuples) for the first and second points of each pair. returns 
+     the same as findcuts_batch
+    """
+    lat1 = np.asarray(g1[GEO_RLAT],dtype=float)
+    lon1 = np.asarray(g1[GEO_RLON],dtype=float)
+    sinLat1 = np.asarray(g1[GEO_SINLAT],dtype=float)
+    cosLat1 = np.asarray(g1[GEO_COSLAT],dtype=float)
+    lat2 = np.asarray(g2[GEO_RLAT],dtype=float)
+    lon2 = np.asarray(g2[GEO_RLON],dtype=float)
+    sinLat2 = np.asarray(g2[GEO_SINLAT],dtype=float)
+    cosLat2 = np.asarray(g2[GEO_COSLAT],dtype=float)
+    b13 = np.radians(np.asarray(b1,dtype=float))
+    b23 = np.radians(np.asarray(b2,dtype=float))
+    
+    dLat = lat2-lat1
+    dLon = lon2-lon1
+    
+    # NOTE: invalid values (i.e. coincident points) are masked by status below
+    # so suppress numpy warnings for them
+    with np.errstate(all='ignore'):
+        dist12 = 2 * np.arcsin(np.sqrt(np.sin(dLat/2)**2 +\
+                               cosLat1*cosLat2*np.sin(dLon/2)**2))
+        
+        # clip the cosines, rounding can push them just past +/-1
+        bA = np.arccos(np.clip((sinLat2 - sinLat1*np.cos(dist12)) /\
+                               (np.sin(dist12)*cosLat1),-1,1))
+        bA = np.where(np.isnan(bA),0,bA)
+        bB = np.arccos(np.clip((sinLat1 - sinLat2*np.cos(dist12)) /\
+                               (np.sin(dist12)*cosLat2),-1,1))
+        
+        east = np.sin(lon2-lon1) > 0
+        b12 = np.where(east,bA,2 * np.pi - bA)
+        b21 = np.where(east,2 * np.pi - bB,bB)
+        
+        alpha1 = (b13 - b12 + np.pi) % (2 * np.pi) - np.pi  # angle 2-1-3
+        alpha2 = (b21 - b23 + np.pi) % (2 * np.pi) - np.pi  # angle 1-2-3
+        sa1 = np.sin(alpha1)
+        sa2 = np.sin(alpha2)
+        
+        alpha3 = np.arccos(-np.cos(alpha1) * np.cos(alpha2) + sa1 * sa2 * np.cos(dist12))
+        dist13 = np.arctan2(np.sin(dist12) * sa1 * sa2,\
+                            np.cos(alpha2) + np.cos(alpha1) * np.cos(alpha3))
+        lat3 = np.arcsin(sinLat1 * np.cos(dist13) + cosLat1 * np.sin(dist13) * np.cos(b13))
+        dLon13 = np.arctan2(np.sin(b13) * np.sin(dist13) * cosLat1,\
+                            np.cos(dist13) - sinLat1 * np.sin(lat3))
+        lon3 = (lon1 + dLon13 + 3 * np.pi) % (2 * np.pi) - np.pi
+
+        # solution outcomes in the same order of precedence as findcut
+        status = np.zeros(dist12.shape,dtype=int)
+        status[sa1*sa2 < 0] = CUT_AMB
+        status[(sa1 == 0) & (sa2 == 0)] = CUT_INF
+        status[dist12 == 0] = CUT_NONE
+    
+    lats = np.where(status == CUT_VALID,np.degrees(lat3),np.nan)
+    lons = np.where(status == CUT_VALID,np.degrees(lon3),np.nan)
+    return lats,lons,status
+
+def lsqfix(lats,lons,lobs,sigma=FIX_SIGMA):
+    """
+     the weighted least squares fix of the lobs (degrees, True North) from the
+     sites at lats,lons, the point minimizing the squared perpendicular misses
+     of the lobs weighted by 1/range^2 (a lob's error grows with range). Solved
+     in a plane tangent at the mean of the sites where each lob is a line
+     (bearings corrected for the convergence of meridians) in O(n).
+     returns None if there are fewer than 2 lobs or they are (nearly) parallel
+     otherwise the tuple (lat,lon,ellipse,residuals,ahead) where
+      ellipse is the tuple (semi-major,semi-minor,azimuth of the semi-major)
+       of the FIX_CONF error ellipse in meters and degrees given lobs with a 
+       standard deviation of sigma degrees
+      residuals is an array of the signed miss (meters) of each lob
+      ahead is a boolean array, False where the fix is behind a site's lob
+    """
+    lats = np.asarray(lats,dtype=float)
+    lons = np.asarray(lons,dtype=float)
+    n = len(lats)
+    if n < 2: return None
+    
+    # sites in the plane, rotating each lob to the north of the origin
+    lat0 = lats.mean()
+    lon0 = lons.mean()
+    (az,baz,d) = _GEOD.inv(np.repeat(lon0,n),np.repeat(lat0,n),lons,lats)
+    az = np.radians(np.asarray(az,dtype=float))
+    xs = np.asarray(d,dtype=float) * np.sin(az)
+    ys = np.asarray(d,dtype=float) * np.cos(az)
+    conv = (np.asarray(baz,dtype=float) + 180 - np.degrees(az) + 540) % 360 - 180
+    t = np.radians(np.asarray(lobs,dtype=float) - conv)
+    nx = np.cos(t)  # normal of each lob
+    ny = -np.sin(t)
+    c = nx*xs + ny*ys
+    
+    # solve the 2x2 normal equations, reweighting with the ranges found
+    w = np.ones(n)
+    for i in range(FIX_ITERS+1):
+        sxx = (w*nx*nx).sum()
+        sxy = (w*nx*ny).sum()
+        syy = (w*ny*ny).sum()
+        det = sxx*syy - sxy*sxy
+        if det <= FIX_COND * (sxx+syy)**2: return None
+        if i == FIX_ITERS: break
+        bx = (w*nx*c).sum()
+        by = (w*ny*c).sum()
+        x = (syy*bx - sxy*by) / det
+        y = (sxx*by - sxy*bx) / det
+        w = 1 / np.maximum(np.hypot(x-xs,y-ys),FIX_MINRANGE)**2
+    
+    # covariance is sigma^2 times the inverse of the normal matrix
+    cov = math.radians(sigma)**2 * np.array([[syy,-sxy],[-sxy,sxx]]) / det
+    (vals,vecs) = np.linalg.eigh(cov)
+    ellipse = (FIX_CONF * math.sqrt(max(vals[1],0)),FIX_CONF * math.sqrt(max(vals[0],0)),
+               math.degrees(math.atan2(vecs[0,1],vecs[1,1])) % 180)
+    residuals = nx*x + ny*y - c
+    ahead = np.sin(t)*(x-xs) + np.cos(t)*(y-ys) > 0
+    (lon,lat,baz) = _GEOD.fwd(lon0,lat0,math.degrees(math.atan2(x,y)),math.hypot(x,y))
+    return lat,lon,ellipse,residuals,ahead
+
+def ellipsepoints(lat,lon,ellipse,n=ELLIPSE_PTS):
+    """
+     returns arrays (lats,lons) of n points outlining the error ellipse (see
+     lsqfix) centered at lat,lon
+    """
+    (a,b,az) = ellipse
+    t = np.linspace(0,2*np.pi,n,endpoint=False)
+    u = a * np.cos(t) # along the semi-major
+    v = b * np.sin(t)
+    (lons,lats,baz) = _GEOD.fwd(np.repeat(lon,n),np.repeat(lat,n),
+                                (az + np.degrees(np.arctan2(v,u))) % 360,np.hypot(u,v))
+    return np.asarray(lats),np.asarray(lons)
+
 def quadrant(p1,b1,p2,b2,err=3):
     """
      determines a quadrant, 4 points defining an area, which are the intersections
      between points p1 and p2 given bearings b1 and b2 with err degrees of error
      calculated in. For example, given an err of 3, the quadrant will be formed
-     by b1+3 & b2+3, b1-3 & b2+3, b1-3 & b2+3, b1-3 & b2-3
+     by b1-3 & b2-3, b1-3 & b2+3, b1+3 & b2-3, b1+3 & b2+3
      Points p1 and p2 must be tuples (lat,lon)
      Bearings b1 and b2 must be in degrees between and 0 and 359.9999.....
+     returns the list of the 4 intersections each as findcut would return it
      NOTE:
       It is assumed that it has been found that b1 and b2 intersect
     """
-    # get the error bearings
-    b1Min = (b1-err) % 360
-    b1Plus = (b1+err) % 360
-    b2Min = (b2-err) % 360
-    b2Plus = (b2+err) % 360
-    
-    # calcuate intersections for each
-    q1 = findcut(p1,b1Min,p2,b2Min)
-    q2 = findcut(p1,b1Min,p2,b2Plus)
-    q3 = findcut(p1,b1Plus,p2,b2Min)
-    q4 = findcut(p1,b1Plus,p2,b2Plus)
-    
-    return [q1,q2,q3,q4]
+    (lats,lons,status) = quadrants([p1[0]],[p1[1]],[b1],[p2[0]],[p2[1]],[b2],err)
+    qs = []
+    for i in range(4):
+        if status[0,i] == CUT_VALID: qs.append((lats[0,i],lons[0,i]))
+        elif status[0,i] == CUT_INF: qs.append(float('Inf'))
+        elif status[0,i] == CUT_AMB: qs.append(float('NaN'))
+        else: qs.append(None)
+    return qs
+
+def quadrants(lats1,lons1,b1,lats2,lons2,b2,err=3):
+    """
+     vectorized quadrant, determines the quadrants of N pairs of points in one
+     pass. Arguments are as findcuts_batch, err is degrees of error (a scalar
+     or one per pair)
+     returns the tuple lats,lons,status of N x 4 arrays where row i holds the
+     corners of pair i in the order of quadrant (b1-err & b2-err, b1-err & 
+     b2+err, b1+err & b2-err, b1+err & b2+err) with status as findcuts_batch
+    """
+    b1 = np.asarray(b1,dtype=float).reshape(-1,1)
+    b2 = np.asarray(b2,dtype=float).reshape(-1,1)
+    err = np.asarray(err,dtype=float).reshape(-1,1)
+    e1 = ((b1 + err*_QUAD_B1) % 360).ravel()
+    e2 = ((b2 + err*_QUAD_B2) % 360).ravel()
+    (lats,lons,status) = findcuts_batch(np.repeat(lats1,4),np.repeat(lons1,4),e1,
+                                        np.repeat(lats2,4),np.repeat(lons2,4),e2)
+    return lats.reshape(-1,4),lons.reshape(-1,4),status.reshape(-1,4)
+
+def wedges(lats,lons,lobs,err=3,dist=WEDGE_DIST,n=WEDGE_PTS):
+    """
+     determines the error wedges of N lobs in one pass, the area between lob-err
+     and lob+err out to dist meters from the site at lats,lons. err is degrees
+     of error (a scalar or one per lob). The far edge of each wedge is n points
+     from lob-err to lob+err (n=2 is a triangle)
+     returns the tuple lats,lons of N x n+1 arrays where row i is the outline
+     of wedge i, its site followed by the points of the far edge
+    """
+    lats = np.asarray(lats,dtype=float).reshape(-1,1)
+    lons = np.asarray(lons,dtype=float).reshape(-1,1)
+    lobs = np.asarray(lobs,dtype=float).reshape(-1,1)
+    err = np.asarray(err,dtype=float).reshape(-1,1)
+    azs = (lobs + err*np.linspace(-1,1,n)) % 360
+    m = azs.size
+    (lons2,lats2,baz) = _GEOD.fwd(np.repeat(lons,n),np.repeat(lats,n),azs.ravel(),
+                                  np.repeat(float(dist),m))
+    return (np.hstack([lats,np.asarray(lats2).reshape(-1,n)]),
+            np.hstack([lons,np.asarray(lons2).reshape(-1,n)]))
@@ -33,10 +33,11 @@
 """
 
 from __future__ import with_statement
+import time                                       # startup profiling
+_STARTUP = [('start',time.time())] # (stage,time) marks, see --profile-startup
+_MAIN = __name__ == '__main__'     # __name__ is reassigned below
 import os                                         # for path
 import sys                                        # restart program
-import pickle                                     # load and dump
-import math                                       # time conversions
 import datetime as dt                             # date and time objects
 import numpy as np                                # for arrays. vstack and sort
 from Tix import *                                 # Tix widgets
@@ -46,25 +47,55 @@ from tkFileDialog import *                        # file gui dialogs
 import tkSimpleDialog                             # for modal dialogs
 from PIL import Image                             # image input & support
 from PIL import ImageTk                           # place these after Tix import
-import matplotlib                                 # configure for matplotlib usage
-matplotlib.use('TkAgg')                           # and tkinter      
-from mpl_toolkits.basemap import Basemap          # basemap object
-from matplotlib.figure import Figure              # figure object
-from matplotlib.patches import Polygon            # polygon object
-import matplotlib.backends.backend_tkagg as tkagg # tkinter backends 
 import soi                                        # soi constants
 from soi import SOI                               # SOI objects
 from soi import Site                              # Site objects
 from soi import DF                                # DF objects
+from soi import l2z,z2l                           # local/zulu conversions
 from lobsterconfig import LobsterConfig           # preferences reader/writer
+from soistore import SOIStore                     # records, indexes & file
+from soistore import EV_ADD,EV_UPDATE,EV_DELETE   # data change events
+from soistore import EV_RESET,EV_STATUS,EV_JOURNAL
+from dfworker import DFWorker                     # background triangulation
+from dfworker import pendingdf,DF_PENDING         # df of an soi until triangulated
+from dfworker import Retriangulator               # bulk re-triangulation
+from g6list import G6ListModel                    # green 6 list rows
 from landnav import convertazimuth                # convert norths
+from g6export import ExportWorker                 # csv export thread
+from g6density import selectsois                  # filter sois for heatmaps
+from g6density import gather                      # fixes/cuts & lobs of sois
+from g6density import lobpoints                   # rasterize lobs
+from g6density import sitelobs                    # site lobs of sois
+from g6density import density                     # bin points
 from landnav import _MGRS                         # lat,lon to mgrs conversion
+from landnav import _MGRSLOCK                     # shared with dfworker threads
+from landnav import tolatlon                      # cached mgrs to lat,lon
+from landnav import tomgrs                        # cached lat,lon to mgrs
+from landnav import LRUCache                      # boundary/gridline caches
+from landnav import gridextent                    # bounds of locations
+from landnav import mgrsgrid                      # mgrs gridlines
 from landnav import _GEOD                         # dist/direction
+from landnav import setgeodesy                    # geodesy backend
 from landnav import terminus                      # terminus given azimuth
 from landnav import dist                          # dist betw/ pts and azimuth
 from landnav import validMGRS                     # valid mgrs function
 from landnav import findcut                       # cut of 2 pts & lobs
 from landnav import quadrant                      # quadrant of 2 pts & lobs
+from landnav import wedges                        # lob error wedges
+from landnav import ellipsepoints                 # outline of error ellipse
+_STARTUP.append(('imports',time.time()))
+
+# map only dependencies (matplotlib & Basemap) are imported by _loadmaps on
+# creation of the first MapPanel, they more than double the startup time.
+# numpy is not one of them, soi, landnav and g6density need it at startup
+Basemap = None
+Figure = None
+Polygon = None
+LineCollection = None
+PolyCollection = None
+RectangleSelector = None
+tkagg = None
+_NavBar = None
 
 __name__ = 'lobster'
 __license__ = 'GPL v3.0'
@@ -88,6 +119,34 @@ SITE_BTN      = 4
 SITE_LOCKED   = 5
 SITE_RBTN     = 6
 
+# for the green 6 list, row columns
+G6_ROWS       = 12                 # number of rows shown
+G6_COL_KEY    = 0
+G6_COL_SITES  = 1
+G6_COL_DTG    = 2
+G6_COL_RF     = 3
+G6_COL_STATUS = 4
+G6_COL_CONVO  = 5                  # not shown, True for convo rows
+G6_WIDTHS     = [6,14,7,9,20]      # column widths in characters
+
+# for exporting
+EXPORT_POLL      = 100             # ms between polls of export progress
+
+# for the maps
+BASEMAP_CACHE    = 8               # max # of basemaps held (high res are large)
+GRID_CACHE       = 32              # max # of projected gridlines held
+HEATMAP_BINS     = 100             # default heatmap bins per side
+LOB_ALLSITES     = "All"           # lob errors of every site on heatmaps
+
+# for the journal
+JOURNAL_COMPACT  = 60000           # ms between folding journal into file
+
+# for background triangulation
+DF_POLL          = 50              # ms between polls of finished triangulations
+DF_FLUSH         = 5.0             # max secs to wait on them before saving
+DF_BULK_POLL     = 200             # ms between polls of bulk re-triangulation
+RETRI_ERRORS     = 10              # max failed SOIs listed after it
+
 # for validiaty checks
 CHKDATE = "0123456789-"
 CHKFLOAT = "0123456789."
@@ -96,23 +155,78 @@ CHKALNUM = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
 
 # utility functions
 
-def l2z(l,ld):
-    """ converts local time l to zulu time given a difference of ld """
-    posld = abs(ld)
-    tSecs = math.floor(posld)*3600 + (posld-math.floor(posld))*3600
-    td = dt.timedelta(0,tSecs)
-    z = l - td
-    if ld < 0: z = -z
-    return z
-
-def z2l(z,ld):
-    """ converts zulu time z to local time given a difference of ld """
-    posld = abs(ld)
-    tSecs = math.floor(posld)*3600 + (posld-math.floor(posld))*3600
-    td = dt.timedelta(0,tSecs)
-    l = z + td
-    if ld < 0: l = -l
-    return l
+def _loadmaps():
+    """ imports the map only dependencies on first call """
+    global Basemap,Figure,Polygon,LineCollection,PolyCollection,RectangleSelector,tkagg,_NavBar
+    if _NavBar is not None: return
+    import matplotlib                                 # configure for matplotlib usage
+    matplotlib.use('TkAgg')                           # and tkinter
+    from mpl_toolkits.basemap import Basemap as _Basemap
+    from matplotlib.figure import Figure as _Figure
+    from matplotlib.patches import Polygon as _Polygon
+    from matplotlib.collections import LineCollection as _LineCollection
+    from matplotlib.collections import PolyCollection as _PolyCollection
+    from matplotlib.widgets import RectangleSelector as _RectangleSelector
+    import matplotlib.backends.backend_tkagg as _tkagg
+    Basemap = _Basemap
+    Figure = _Figure
+    Polygon = _Polygon
+    LineCollection = _LineCollection
+    PolyCollection = _PolyCollection
+    RectangleSelector = _RectangleSelector
+    tkagg = _tkagg
+    _NavBar = _navbarclass()
+
+# projected boundary data (see _basemap) by (projection,lat_0,lon_0,resolution),
+# a map of an SOI sharing a primary site with an earlier map reuses its coastlines
+_BOUNDARIES = LRUCache(BASEMAP_CACHE)
+_BOUNDARY_ATTRS = ['coastsegs','coastpolygons','coastpolygontypes',
+                   'landpolygons','lakepolygons']
+
+# projected gridlines by (projection,lower left,upper right), the corners are
+# 1km mgrs i.e. grid zone, 100km square and extent of the map's grid
+_GRIDLINES = LRUCache(GRID_CACHE)
+
+def _basemap(ax,lat,lon,projection='tmerc',resolution='h'):
+    """
+     returns a new Basemap centered on lat,lon drawing on the axes ax. Reading
+     and projecting the high resolution boundaries is the slowest step of
+     opening a map so only they are cached, maps of the same center share the
+     (read only) boundary lists
+    """
+    def _make(res):
+        return Basemap(projection=projection,\
+                       lat_0=lat,\
+                       lon_0=lon,\
+                       resolution=res,\
+                       area_thresh=0.1,\
+                       width=1,\
+                       height=1,\
+                       suppress_ticks=False,\
+                       ax=ax)
+    def _boundaries():
+        base = _make(resolution)
+        return dict([(a,getattr(base,a)) for a in _BOUNDARY_ATTRS if hasattr(base,a)])
+    bounds = _BOUNDARIES.get((projection,lat,lon,resolution),_boundaries)
+    base = _make(None)
+    base.resolution = resolution
+    base.__dict__.update(bounds)
+    return base
+
+def _mark(stage):
+    """ marks the time stage of startup was completed """
+    _STARTUP.append((stage,time.time()))
+
+def _startupreport(out=sys.stderr):
+    """ writes the time taken by each stage of startup to out """
+    t0 = _STARTUP[0][1]
+    prev = t0
+    out.write("startup         elapsed     delta\n")
+    for stage,t in _STARTUP[1:]:
+        out.write("%-12s %8.1fms %8.1fms\n" % (stage,(t-t0)*1000,(t-prev)*1000))
+        prev = t
+    maps = [m for m in ('matplotlib','mpl_toolkits.basemap') if m in sys.modules]
+    out.write("map modules loaded: %s\n" % (", ".join(maps) or "none"))
 
 def restart(fpath=None):
     """ restarts the program after a preferences change """
@@ -202,14 +316,14 @@ class ConversionPanel(ChildPanel):
         else:
             if m:
                 try:
-                    ll = _MGRS.toLatLon(m)
+                    ll = tolatlon(m)
                     self.txtLatLon.insert(0,"%.3f %.3f" % (ll[0],ll[1]))
                 except:
                     showerror("Error","MGRS is not valid",parent=self)
             elif ll:
                 try:
                     ll = ll.split()
-                    m = _MGRS.toMGRS(ll[0],ll[1])
+                    m = tomgrs(ll[0],ll[1])
                     self.txtMGRS.insert(0,m)
                 except:
                     showerror("Error","Lat/Lon is not valid",parent=self)
@@ -331,7 +445,7 @@ class TriangulationPanel(ChildPanel):
         
         # show msg if any are invalid
         try:
-            locA = _MGRS.toLatLon(locA)
+            locA = tolatlon(locA)
             lobA = float(lobA)
             if lobA < 0 or lobA >= 360.0: raise ValueError
         except ValueError:
@@ -344,7 +458,7 @@ class TriangulationPanel(ChildPanel):
             return None,None,None,None
         
         try:
-            locB = _MGRS.toLatLon(locB)
+            locB = tolatlon(locB)
             lobB = float(lobB)
             if lobB < 0 or lobB >= 360.0: raise ValueError
         except ValueError:
@@ -412,7 +526,7 @@ class CutPanel(TriangulationPanel):
             ans = findcut(locA,lobA,locB,lobB)
             if type(ans) == type((0,1)):
                 # answer is a tuple convert cut to mgrs & get distances
-                dest = _MGRS.toMGRS(ans[0],ans[1])
+                dest = tomgrs(ans[0],ans[1])
                 da = _GEOD.inv(locA[1],locA[0],ans[1],ans[0])[2]
                 db = _GEOD.inv(locB[1],locB[0],ans[1],ans[0])[2]
                 res = "%s dA: %.1fm dB: %.1fm" % (dest,da,db)
@@ -436,10 +550,10 @@ class QuadrantPanel(TriangulationPanel):
             [q1,q2,q3,q4] = quadrant(locA,lobA,locB,lobB)
             if type(q1) == type(q2) == type(q3) == type(q4) == type((0,1)):
                 # found an answer
-                res = "%s %s\n%s %s" % (_MGRS.toMGRS(q1[0],q1[1]),\
-                                       _MGRS.toMGRS(q2[0],q2[1]),\
-                                       _MGRS.toMGRS(q3[0],q3[1]),\
-                                       _MGRS.toMGRS(q4[0],q4[1]))
+                res = "%s %s\n%s %s" % (tomgrs(q1[0],q1[1]),\
+                                       tomgrs(q2[0],q2[1]),\
+                                       tomgrs(q3[0],q3[1]),\
+                                       tomgrs(q4[0],q4[1]))
             else:
                 # no good answer
                 res = "No Cut"
@@ -452,6 +566,7 @@ class ExportCSVPanel(ChildPanel):
     def __init__(self,tl,parent,sois,sites):
         self._sois = sois
         self._sites = sites
+        self._worker = None # running export
         ChildPanel.__init__(self,tl,parent,"Export Green 6","img/export.png")
 
 # CALLBACKS
@@ -470,24 +585,28 @@ class ExportCSVPanel(ChildPanel):
                                   initialfile="%s.csv" % fname,\
                                   filetypes=[('CSV Files','*.csv')])
         if fpath:
-            try:
-                # if successful, close the dialog
-                fout = open(fpath,'w')
-                if site == "All":
-                    sites = self._sites
-                else:
-                    sites = [site]
-                recs = self._writesois(fout,north,time,sites)
-                fout.close()
-                showinfo("Exported","Wrote %d SOIs to %s" % (recs,os.path.split(fpath)[1]))
-                self.parent.childclose(self._name)
-            except Exception, e:
-                fout.close()
-                showerror("Error","Error writing %s" % os.path.split(fpath)[1])
+            if site == "All":
+                sites = self._sites
+            else:
+                sites = [site]
+            
+            # export in the background, polling for progress
+            self._worker = ExportWorker(fpath,self._sois,sites,north,time,\
+                                        self.parent.config.declination,\
+                                        self.parent.config.ui['z2l'])
+            self.btnExport.config(state=DISABLED)
+            self.lblProgress.config(text="Exporting...")
+            self._worker.start()
+            self.after(EXPORT_POLL,self._poll)
         else:
             # do nothing
             return
 
+    def closeapp(self):
+        """ stop any running export and close """
+        if self._worker: self._worker.cancel()
+        ChildPanel.closeapp(self)
+
     def cbRdoType(self,val):
         """ enables/disables site dropdown as necessary """
         if val == 0:
@@ -534,64 +653,94 @@ class ExportCSVPanel(ChildPanel):
 
         frmBtn = Frame(frm)
         frmBtn.grid(row=2,column=0,sticky=W)
-        Button(frmBtn,text="Export",command=self.export).grid(row=0,column=0,sticky=W)
+        self.btnExport = Button(frmBtn,text="Export",command=self.export)
+        self.btnExport.grid(row=0,column=0,sticky=W)
         Button(frmBtn,text="Close",command=self.closeapp).grid(row=0,column=1,sticky=E)
-
-    def _writesois(self,f,n,t,ss):
-        """
-         writes sois to f in desired north=n and time=t. Only writes those 
-         sites in ss and excludes any convos
-        """
-        # write the header
-        G6_HEADER = ["NUM","SITE","LOCATION","TIME UP","RF","LOB","CALLSIGNS","GIST","OP NOTE","GEOLOCATION"]
-        hdr = ""
-        for h in G6_HEADER[:-1]: hdr += "%s," % h
-        hdr += "%s\n" % G6_HEADER[len(G6_HEADER)-1]
-        f.write(hdr)
-        
-        recNum = 0
-        # iterate each soi  
-        for sid in self._sois:
-            soi = self._sois[sid]
-            try:
-                soi.dtg
-            except AttributeError:
-                # no dtg this is a convo
-                pass
-            else:
-                for ssid in soi.pri:
-                    # only write if it is in specified sites list
-                    if ssid in ss:
-                        recNum += 1
-                        f.write("%d," % recNum)  # NUM    
-                        f.write("%s," % ssid) # SITE
-                        f.write("%s," % soi.sites[ssid].location) # LOCATION
-                        tu = soi.dtg
-                        if t == "local": 
-                            tu = z2l(tu,self.parent.config.ui['z2l'])
-                            tu = tu.strftime("%d%H%ML%b%Y").upper()
-                        else:
-                            tu = tu = tu.strftime("%d%H%ML%b%Y").upper()
-                        f.write("%s," % tu) # TIME UP   
-                        f.write("%.3f," % soi.getrf()) # RF
-                        lob = soi.sites[ssid].lob
-                        if n != "true": lob = convertazimuth("true",n,lob,self.parent.config.declination) 
-                        f.write("%.1f," % lob) # LOB
-                        css = soi.getuniquecallsigns()
-                        callsigns = ""
-                        if css:
-                            for cs in css[:-1]: callsigns += "%s " % cs
-                            callsigns += "%s" % css[len(css)-1]
-                        f.write("%s," % callsigns) # CALLSIGNS
-                        f.write("%s," % self._cleantext(soi.gist)) # GIST
-                        f.write("%s," % self._cleantext(soi.opnote)) # OP NOTE
-                        f.write("%s\n" % soi.df.status) # GEOLOCATION
-        return recNum        
-        
-    def _cleantext(self,text):
-        """ cleans text for csv, removes non-printable characters and commas """
-        return "".join([ch for ch in text if 31 < ord(ch) < 126 and ord(ch) != 44])
+        self.lblProgress = Label(frmBtn,text="")
+        self.lblProgress.grid(row=1,column=0,columnspan=2,sticky=W)
+
+    def _poll(self):
+        """ updates export progress, notifying when finished """
+        w = self._worker
+        if w.is_alive():
+            self.lblProgress.config(text="Exported %d of %d" % (w.done,w.total))
+            self.after(EXPORT_POLL,self._poll)
+            return
+        self._worker = None
+        if w.error:
+            self.btnExport.config(state=NORMAL)
+            self.lblProgress.config(text="")
+            showerror("Error","Error writing %s" % os.path.split(w.fpath)[1])
+        elif w.result is not None:
+            showinfo("Exported","Wrote %d SOIs to %s" % (w.result,os.path.split(w.fpath)[1]))
+            self.parent.childclose(self._name)
          
+class RetriangulatePanel(ChildPanel):
+    """ Displays bulk re-triangulation of all SOIs """
+    def __init__(self,tl,parent):
+        self._worker = None # running re-triangulation
+        ChildPanel.__init__(self,tl,parent,"Re-triangulate","img/globe.png")
+
+# CALLBACKS
+
+    def start(self):
+        """ re-triangulates all SOIs in the background, polling for progress """
+        try:
+            cutt = int(self.txtCutt.get())
+        except ValueError:
+            showerror('Invalid','Cut Threshold must be numeric',parent=self)
+            return
+        self._worker = Retriangulator(self.parent.data,self.parent.data.keys(),cutt)
+        self.btnStart.config(state=DISABLED)
+        self.lblProgress.config(text="Re-triangulating...")
+        self._worker.start()
+        self.after(DF_BULK_POLL,self._poll)
+
+    def closeapp(self):
+        """ stop any running re-triangulation and close """
+        if self._worker: self._worker.cancel()
+        ChildPanel.closeapp(self)
+
+# PRIVATE
+
+    def _makegui(self):
+        """ set up the gui """
+        frm = Frame(self)
+        frm.pack(side=TOP,fill=BOTH,expand=TRUE)
+        Label(frm,text="Cut Threshold: ").grid(row=0,column=0,sticky=W)
+        self.txtCutt = Entry(frm,width=6)
+        self.txtCutt.grid(row=0,column=1,sticky=W)
+        self.txtCutt.insert(0,self.parent.config.geo['cutt'])
+        frmBtn = Frame(frm)
+        frmBtn.grid(row=1,column=0,columnspan=2,sticky=W)
+        self.btnStart = Button(frmBtn,text="Start",command=self.start)
+        self.btnStart.grid(row=0,column=0,sticky=W)
+        Button(frmBtn,text="Close",command=self.closeapp).grid(row=0,column=1,sticky=E)
+        self.lblProgress = Label(frmBtn,text="")
+        self.lblProgress.grid(row=1,column=0,columnspan=2,sticky=W)
+
+    def _poll(self):
+        """ updates progress, swapping in the new dfs when finished """
+        w = self._worker
+        if w.is_alive():
+            self.lblProgress.config(text="Re-triangulated %d of %d" % (w.done,w.total))
+            self.after(DF_BULK_POLL,self._poll)
+            return
+        self._worker = None
+        if w.error:
+            self.btnStart.config(state=NORMAL)
+            self.lblProgress.config(text="")
+            showerror("Error","Failed to re-triangulate: %s" % w.error,parent=self)
+        elif w.result is not None:
+            n = len(self.parent.setdfs(w.result))
+            showinfo("Re-triangulated","Re-triangulated %d SOIs with a %dm threshold" % (n,w.cutt))
+            if w.failed:
+                keys = sorted(w.failed.keys())
+                msg = "\n".join(["SOI %d: %s" % (key,w.failed[key]) for key in keys[:RETRI_ERRORS]])
+                if len(keys) > RETRI_ERRORS: msg += "\n..."
+                showwarning("Re-triangulated","%d SOIs failed and were left as is\n%s" % (len(keys),msg))
+            self.parent.childclose(self._name)
+
 class PreferencesPanel(ChildPanel):
     """
      Displays configuration options for modifying
@@ -633,6 +782,7 @@ class PreferencesPanel(ChildPanel):
         if ellipse != "WGS84":
             showerror('Invalid','Currently on WGS84 allowed')
             ellipse = "WGS84"
+        geodesy = self.gvar.get().lower()
         
         # ui
         north = self.nvar.get().lower()
@@ -650,10 +800,16 @@ class PreferencesPanel(ChildPanel):
             showerror('Invalid',"Display time must be local or zulu")
             return
         
+        # existing sois keep their dfs until re-triangulated
+        geo = self.parent.config.geo
+        if (cutt != geo['cutt'] or geodesy != geo['geodesy']) and self.parent.data:
+            showinfo('Triangulation',
+                     'Existing SOIs keep their DFs, use Utilities->Triangulation->Re-triangulate to apply the changes')
+        
         # everything checks out, write to conf file
         lc = LobsterConfig()
         lc.declination = {'decl':decl,'g2m':g2m,'g2t':g2t}
-        lc.geo = {'ellipse':ellipse,'cutt':cutt}
+        lc.geo = {'ellipse':ellipse,'cutt':cutt,'geodesy':geodesy}
         lc.ui = {'azimuth':north,'z2l':z2l,'dtime':dtime}
         try:
             lc.write('lobster.conf')
@@ -694,6 +850,12 @@ class PreferencesPanel(ChildPanel):
         Label(frmGeo,text="Cut Threshold:   ").grid(row=1,column=0,sticky=W)
         self.txtCutt = Entry(frmGeo,width=4)
         self.txtCutt.grid(row=1,column=1,sticky=E)
+        Label(frmGeo,text="Geodesy:").grid(row=2,column=0,sticky=W)
+        geodesies = ["Ellipsoidal","Fast"]
+        self.gvar = StringVar(self)
+        self.gvar.set(geodesies[0])
+        self.optGeodesy = Tkinter.OptionMenu(frmGeo,self.gvar,*geodesies)
+        self.optGeodesy.grid(row=2,column=1,sticky=E)
         
         # ui
         frmUI = Frame(frm,borderwidth=1,relief='sunken')
@@ -733,6 +895,7 @@ class PreferencesPanel(ChildPanel):
             # geo
             self.txtEllipse.insert(0,lc.geo['ellipse'])
             self.txtCutt.insert(0,lc.geo['cutt'])
+            self.gvar.set(lc.geo['geodesy'].title())
             
             # ui
             self.nvar.set(lc.ui['azimuth'].title())
@@ -797,62 +960,68 @@ class LOBErrorPanel(tkSimpleDialog.Dialog):
         self.result = (self.sites[self.v.get()],int(self.txtDegree.get()),self.cvar.get())
 
 #### Private NavigationToolbar subclass
-class _NavBar(tkagg.NavigationToolbar2TkAgg):
-    """ Customizes matplotlib NavigationToolbar """
-    def __init__(self,control,canvas,window):
-        self.control = control
-        self.canvas=canvas
-        self.window=window
-        self._idle=True
-        
-        # we override toolitems before initializing IOT to remove buttons 
-        # we don't want and add buttons - this is a lot easier than rewriting 
-        # _init_toolbar
-        # NOTE: any button images are saved in 
-        # /usr/local/lib/python2.7/dist-packages/matplotlib/mpl-data/images/
-        # TODO is there a way to work around this?
-        self.toolitems = (('Home', 'Reset original view', 'home', 'home'),\
-                          ('Back', 'Back to  previous view', 'back', 'back'),\
-                          ('Forward', 'Forward to next view', 'forward', 'forward'),\
-                          ('Zoom', 'Zoom to rectangle', 'zoom_to_rect', 'zoom'),\
-                          ('Separator','','separator','do_nothing'),\
-                          ('Lob Error','Draw LOBs with errors','quadrant','loberror'),\
-                          ('Clear','Clear Error LOBs','erase','clear'),\
-                          ('Annotate','Annotate','labels','label'),\
-                          ('Separator','','separator','do_nothing'),\
-                          ('Save', 'Save the figure', 'filesave', 'save_figure'))
-        tkagg.NavigationToolbar2.__init__(self,canvas)
-
-    def do_nothing(self): pass
-
-    def loberror(self):
-        """ show quadrant around 2 selected lobs """
-        self.control.loberror()
-
-    def clear(self):
-        """ clear all quadrants """
-        self.control.clearloberrors()
-
-    def label(self):
-        """ show labels """
-        self.control.annotate()
+def _navbarclass():
+    """
+     returns the _NavBar class, defined on first use because its base class
+     is in the matplotlib tkinter backend (see _loadmaps)
+    """
+    class _NavBar(tkagg.NavigationToolbar2TkAgg):
+        """ Customizes matplotlib NavigationToolbar """
+        def __init__(self,control,canvas,window):
+            self.control = control
+            self.canvas=canvas
+            self.window=window
+            self._idle=True
+        
+            # we override toolitems before initializing IOT to remove buttons 
+            # we don't want and add buttons - this is a lot easier than rewriting 
+            # _init_toolbar
+            # NOTE: any button images are saved in 
+            # /usr/local/lib/python2.7/dist-packages/matplotlib/mpl-data/images/
+            # TODO is there a way to work around this?
+            self.toolitems = (('Home', 'Reset original view', 'home', 'home'),\
+                              ('Back', 'Back to  previous view', 'back', 'back'),\
+                              ('Forward', 'Forward to next view', 'forward', 'forward'),\
+                              ('Zoom', 'Zoom to rectangle', 'zoom_to_rect', 'zoom'),\
+                              ('Separator','','separator','do_nothing'),\
+                              ('Lob Error','Draw LOBs with errors','quadrant','loberror'),\
+                              ('Clear','Clear Error LOBs','erase','clear'),\
+                              ('Annotate','Annotate','labels','label'),\
+                              ('Separator','','separator','do_nothing'),\
+                              ('Save', 'Save the figure', 'filesave', 'save_figure'))
+            tkagg.NavigationToolbar2.__init__(self,canvas)
+
+        def do_nothing(self): pass
+
+        def loberror(self):
+            """ show quadrant around 2 selected lobs """
+            self.control.loberror()
+
+        def clear(self):
+            """ clear all quadrants """
+            self.control.clearloberrors()
+
+        def label(self):
+            """ show labels """
+            self.control.annotate()
     
-    def set_message(self,s):
-        """ override to show mgrs rather than x,y """
-        # if s has the format x=<xcoord> y=ycoord and it's not a 
-        # a zoom rect, change to show mgrs otherwise just show s
-        if "x=" in s and "y=" in s:
-            if s.startswith('zoom rect,'): s = s.replace('zoom rect,','')
+        def set_message(self,s):
+            """ override to show mgrs rather than x,y """
+            # if s has the format x=<xcoord> y=ycoord and it's not a 
+            # a zoom rect, change to show mgrs otherwise just show s
+            if "x=" in s and "y=" in s:
+                if s.startswith('zoom rect,'): s = s.replace('zoom rect,','')
             
-            # remove white space using split which returns a list with
-            # x=<xcoord> and y=<ycoord>. split each of these on '=' and convert
-            # to float to get the numeric x and y coords
-            coords=s.split() # remove white space, returns a list with x and y
-            x = float(coords[0].split('=')[1])
-            y = float(coords[1].split('=')[1])
-            s = self.control._statusbar((x,y))    
-        self.message.set(s)
-  
+                # remove white space using split which returns a list with
+                # x=<xcoord> and y=<ycoord>. split each of these on '=' and convert
+                # to float to get the numeric x and y coords
+                coords=s.split() # remove white space, returns a list with x and y
+                x = float(coords[0].split('=')[1])
+                y = float(coords[1].split('=')[1])
+                s = self.control._statusbar((x,y))    
+            self.message.set(s)
+    return _NavBar
+
 class MapPanel(ChildPanel):
     """
      Displays SOI on a simple map
@@ -862,6 +1031,7 @@ class MapPanel(ChildPanel):
         self.soi = soi # the soi data
         self.qs = []   # list of quandrants drawn
         self.ls = []   # list of text labels drawn
+        _loadmaps()
         ChildPanel.__init__(self,tl,parent,"Triangulation SOI %d" % key,"img/globe.png")
 
     # CALLBACKS
@@ -872,27 +1042,24 @@ class MapPanel(ChildPanel):
         # d.result is a tuple (site,err,color)
         d = LOBErrorPanel(self,self.soi.pri)
         if d.result is None: return
-        loc = self.soi.sites[d.result[0]].location
-        lob = self.soi.sites[d.result[0]].lob
-        err = d.result[1]
-        color = d.result[2]
-        self._drawloberror(loc,lob,err,color)
+        (lats,lons,lobs) = sitelobs([self.soi],d.result[0])
+        self._drawloberror(lats,lons,lobs,d.result[1],d.result[2])
 
     def clearloberrors(self):
         """ removes any drawn loberrors """
         for q in self.qs: q.remove()
-        self.canvas.show()
         self.qs = []
+        self._blit()
   
     def annotate(self):
         """ labels site(s), degrees of LOB(s), cut(s) """
         if not self.ls:
             for l in self.ptLabels:
-                self.ls.append(self.ax.text(l[0]+1,l[1]+1,l[2]))
+                self.ls.append(self.ax.text(l[0]+1,l[1]+1,l[2],animated=True))
         else:
             for l in self.ls: l.remove()
             self.ls = []
-        self.canvas.show()
+        self._blit()
     
     # PRIVATE
     def _makegui(self):
@@ -921,16 +1088,8 @@ class MapPanel(ChildPanel):
         # enough to be relevant without manual zooming. we do this by setting the 
         # width and height to 1, the map will 'grow' to fit the gridlines
         primary = self.soi.sites[self.soi.pri[0]].location
-        (lat,lon) = _MGRS.toLatLon(primary)
-        self.base = Basemap(projection='tmerc',\
-                            lat_0=lat,\
-                            lon_0=lon,\
-                            resolution='h',\
-                            area_thresh=0.1,\
-                            width=1,\
-                            height=1,\
-                            ax=self.ax,\
-                            suppress_ticks=False)
+        (lat,lon) = tolatlon(primary)
+        self.base = _basemap(self.ax,lat,lon)
         
         # save for labeling, each is a tuple (x,y,lbl)
         self.ptLabels = []
@@ -941,7 +1100,7 @@ class MapPanel(ChildPanel):
         for site in self.soi.pri:
             # get the next site, it's location. convert to lat/lon & project
             s = self.soi.sites[site]
-            (lat,lon) = _MGRS.toLatLon(s.location)
+            (lat,lon) = tolatlon(s.location)
             x,y = self.base(lon,lat)
             self.ptLabels.append((x,y,s.name))
             
@@ -963,19 +1122,39 @@ class MapPanel(ChildPanel):
             i += 1       
                         
         # plot any fix/cut(s)
-        if self.soi.df.state == soi.DF_FIX:
-            # a fix, plot location of the first cut
-            (lat,lon) = _MGRS.toLatLon(self.soi.df.fix)
+        if self.soi.df.fix:
+            # a fix, plot its location and any error ellipse. The fix of
+            # ambiguous cuts is hollow and its ellipse only outlined
+            amb = self.soi.df.state != soi.DF_FIX
+            (lat,lon) = tolatlon(self.soi.df.fix)
             x,y = self.base(lon,lat)
-            self.ptLabels.append((x,y,self.soi.df.cuts[0][soi.DF_CUT_X]))
-            self.base.plot(x,y,cutcolors[0]+'s',markersize=msize)
-            self.base.plot(x,y,'w*',markersize=msize)
-        elif self.soi.df.state >= soi.DF_CUT:
+            if amb:
+                self.ptLabels.append((x,y,"%s (amb)" % self.soi.df.fix))
+                self.base.plot(x,y,'ks',markersize=msize,markerfacecolor='none')
+            else:
+                self.ptLabels.append((x,y,self.soi.df.fix))
+                self.base.plot(x,y,cutcolors[0]+'s',markersize=msize)
+                self.base.plot(x,y,'w*',markersize=msize)
+            if self.soi.df.ellipse:
+                (lats,lons) = ellipsepoints(lat,lon,self.soi.df.ellipse)
+                xs,ys = self.base(lons,lats)
+                if amb:
+                    patch = Polygon(np.vstack([xs,ys]).T,closed=True,fill=False,
+                                    edgecolor='k',linestyle='dashed')
+                else:
+                    patch = Polygon(np.vstack([xs,ys]).T,closed=True,
+                                    facecolor=cutcolors[0],alpha=0.2)
+                self.ax.add_patch(patch)
+                for j in range(0,len(lats),len(lats)//4): locs.append(tomgrs(lats[j],lons[j]))
+        if soi.DF_CUT <= self.soi.df.state < soi.DF_FIX:
             # multiple cuts, plot all
             i = 0
             for cut in self.soi.df.cuts:
+                # skip Inf/Amb/None cuts, they have no location
+                if not self.soi.df._validcut(cut[soi.DF_CUT_X]): continue
+                
                 # for each cut, get location, convert to lat,lon and project onto map
-                (lat,lon) = _MGRS.toLatLon(cut[soi.DF_CUT_X])
+                (lat,lon) = tolatlon(cut[soi.DF_CUT_X])
                 x,y = self.base(lon,lat)
                 self.ptLabels.append((x,y,cut[soi.DF_CUT_X]))
                 self.base.plot(x,y,cutcolors[i]+'s',markersize=msize)
@@ -992,7 +1171,7 @@ class MapPanel(ChildPanel):
             lons = []
             lats = []
             for cut in self.soi.df.cuts:
-                (lat,lon) = _MGRS.toLatLon(cut[6]) 
+                (lat,lon) = tolatlon(cut[6]) 
                 lats.append(lat)
                 lons.append(lon)
                 #x,y = self.base(lon,lat)
@@ -1013,9 +1192,36 @@ class MapPanel(ChildPanel):
         self.ax.legend(loc=2,borderaxespad=0.2,numpoints=1)
         
         # show the canvas and pack it
+        self._makeoverlay()
         self.canvas.show()
         self.canvas.get_tk_widget().pack(side=TOP,fill=BOTH,expand=1)
 
+    def _makeoverlay(self):
+        """
+         lob errors and labels are an overlay of animated artists, they are
+         blitted onto a saved background of the map rather than redrawing it
+        """
+        self._bg = None
+        self.canvas.mpl_connect('draw_event',self._ondraw)
+    
+    def _ondraw(self,event):
+        """ a full redraw (i.e. pan/zoom), saves the background & draws overlay """
+        self._bg = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._drawoverlay()
+    
+    def _drawoverlay(self):
+        """ draws the overlay's artists """
+        for a in self.qs + self.ls: self.ax.draw_artist(a)
+    
+    def _blit(self):
+        """ redraws the overlay over the background """
+        if self._bg is None:
+            self.canvas.draw() # draw_event saves the background
+            return
+        self.canvas.restore_region(self._bg)
+        self._drawoverlay()
+        self.canvas.blit(self.ax.bbox)
+
     def _drawgridlines(self,ls):
         """
          draws north and east gridlines
@@ -1030,201 +1236,81 @@ class MapPanel(ChildPanel):
          5) IOT to label the grid lines we use the minor ticks, which makes 
             the left/bottom edge of the map somewhat unsightly and they don't
             match the gridlines when zoomed in
-         TODO:
-           1) cannot handle situations where map crosses more than one zone
-              horizontally or vertically - add a check for this
+         6) projected gridlines are cached by projection and the grid zone,
+            100km square and 1km extent of the map (see _gridgeometry)
         """
-        # NOTE: cannot handle different grid zone designators
-        (ll,ur) = self._gridcorners(ls)
-        (es,ns) = self._gridings(ll,ur)
-        gzd = ll[0:3] 
-        
-        # sanity check - if the grid zone designators are different
-        if ll[0:3] != ur[0:3]:
-            showinfo("Error","Multiple GZDs, will not draw gridlines",parent=self)
-            return
+        (s,w,n,e) = gridextent(ls)
+        key = (tuple(sorted(self.base.projparams.items())),tomgrs(s,w,2),tomgrs(n,e,2))
+        (segs,xts,xls,yts,yls) = _GRIDLINES.get(key,lambda:self._gridgeometry((s,w,n,e)))
+        
+        # one collection per color, 100km square boundaries are black. like
+        # Basemap.plot, rescale the axes so the map grows to fit the lines
+        for (major,gColor) in [(False,"#993300"),(True,"black")]:
+            if segs[major]:
+                self.ax.add_collection(LineCollection(segs[major],colors=gColor,linestyles='-'))
+        self.ax.autoscale_view()
+        self.base.set_axes_limits(ax=self.ax)
         
-        # draw eastings from first northing to last
-        xs = []
-        prevZ = es[0][0]
-        for e in es:
-            # for each easting, plot a line from the first northing to the last
-            (lat,lon) = _MGRS.toLatLon("%s%s%s%s%s" % (gzd,e[0],ns[0][0],e[1],ns[0][1]))
-            (lat1,lon1) = _MGRS.toLatLon("%s%s%s%s%s" % (gzd,e[0],ns[len(ns)-1][0],e[1],ns[len(ns)-1][1]))
-            x,y = self.base(lon,lat)
-            x1,y1 = self.base(lon1,lat1)
-            if prevZ == e[0]:
-                gColor = "#993300"
-            else:
-                gColor = "black"
-            prevZ = e[0]
-            self.base.plot([x,x1],[y,y1],linestyle='-',color=gColor)
-            xs.append(x)
         # tick labels, disable major & use minor using the 2digit as tick marks    
         # TODO: label grid changes i.e. instead of 00, use TA/UA ???
         self.ax.set_xticks([])
-        self.ax.set_xticks(xs,minor=True)
-        self.ax.set_xticklabels([e[1] for e in es],minor=True)
-        
-        # draw northings from first easting to last
-        ys = []
-        prevZ = ns[0][0]
-        for n in ns:
-            # for each northing, plot a line from the first easting to the last
-            (lat,lon) = _MGRS.toLatLon("%s%s%s%s%s" % (gzd,es[0][0],n[0],es[0][1],n[1]))
-            (lat1,lon1) = _MGRS.toLatLon("%s%s%s%s%s" % (gzd,es[len(es)-1][0],n[0],es[len(es)-1][1],n[1]))
-            x,y = self.base(lon,lat)
-            x1,y1 = self.base(lon1,lat1)
-            if prevZ == n[0]:
-                gColor = "#993300"
-            else:
-                gColor = "black"
-            prevZ = n[0]
-            self.base.plot([x,x1],[y,y1],linestyle='-',color=gColor)
-            ys.append(y)
-        # tick labels, disable major & use minor using the 2digit as tick marks   
-        self.ax.set_yticks(ys,minor=True)
-        self.ax.set_yticklabels([n[1] for n in ns],minor=True)
+        self.ax.set_xticks(xts,minor=True)
+        self.ax.set_xticklabels(xls,minor=True)
+        self.ax.set_yticks(yts,minor=True)
+        self.ax.set_yticklabels(yls,minor=True)
         self.ax.set_yticks([])        
     
-    def _gridcorners(self,gs):
+    def _gridgeometry(self,extent):
         """
-         Given gs, a list of mgrs locations returns the mgrs location at the 
-         lower left and upper right corners such that each location in gs is 
-         encompassed
+         projects the mgrs gridlines covering extent (s,w,n,e) returning the
+         tuple (segs,xticks,xlabels,yticks,ylabels) where segs is a dict of
+         major -> list of (N,2) arrays of line points and the ticks are where
+         the eastings (northings) cross the bottom (left) of the grid. All
+         points are projected in one call
         """
-        # make the first point in the list the min/max
-        (lat,lon) = _MGRS.toLatLon(gs[0])
-        w=e = lon
-        s=n = lat
-    
-        # iterate list of points excluding the first saving min, max lat and lon
-        for g in gs[1:len(gs)]:
-            (lat,lon) = _MGRS.toLatLon(g)
-            w=min(lon,w)
-            e=max(lon,e)
-            s=min(lat,s)
-            n=max(lat,n)
-    
-        # convert the far south and far west as lower left and the far north and 
-        # far east as upper right
-        ll = _MGRS.toMGRS(s,w)
-        ur = _MGRS.toMGRS(n,e)
-        
-        return ll,ur
-
-    def _gridings(self,ll,ur):
-        """
-         given ll, a lower left mgrs location and ur, an upper right mgrs location
-         returns the tuple es = eastings, ns = northings such that:
-          each es is a pair (L=east to west band,DD=2 digit location)
-          each ns is a pair (L=south to north band,DD=2 digit location)
-        """
-        # inc to add/subtract from extremes if we have a 1000m wide/high map
-        eInc = 0
-        nInc = 0
-        if abs(int(ll[5:7])-int(ur[5:7])) % 100 <= 1: eInc += 2
-        if abs(int(ll[10:12])-int(ur[10:12])) % 100 <= 1: nInc += 2
-        
-        # eastings    
-        es = []
-        curL = ll[3]
-        curE = ll[5:7] 
-        next = self._firsting(curL,curE,eInc)
-        stop = self._lasting(ur[3],ur[5:7],eInc)
-        while next != stop:
-            # append next to list of eastings
-            es.append(next)
-            
-            # calculate the next easting
-            nextE = (int(next[1]) + 1) % 100
-            if nextE == 0:
-                # increase the letter designator skip 'O' and 'I'
-                curL = chr(ord(curL)+1)
-                if curL == '0' or curL == 'I':
-                    curL = chr(ord(curL)+1)
-            nextE = str(nextE)
-            if len(nextE) == 1: nextE = "0" + nextE
-            next = [curL,nextE]
-        
-        # northings
-        ns = []
-        curL = ll[4]
-        curN = ll[10:12]
-        next = self._firsting(curL,curN,nInc)
-        stop = self._lasting(ur[4],ur[10:12],nInc)
-        while next != stop:
-            # append next to list of northings
-            ns.append(next)
-            
-            # calculate the next northings
-            nextN = (int(next[1]) + 1) % 100
-            if nextN == 0:
-                # increase the letter designator skip 'O' and 'I'
-                curL = chr(ord(curL)+1)
-                if curL == '0' or curL == 'I':
-                    curL = chr(ord(curL)+1)
-            nextN = str(nextN)
-            if len(nextN) == 1: nextN = "0" + nextN
-            next = [curL,nextN]
-
-        return es,ns
-
-    def _firsting(self,l,d,i):
-        """ decrements i and ensures a valid first 'ing """
-        newd = (int(d) - i) % 100
-        newl = l
-        if newd > int(d):
-            newl = chr(ord(newl)-1)
-            if newl == '0' or newl == 'I':
-                newl = chr(ord(newl)-1)
-        newd = str(newd)
-        if len(newd) == 1: newd = "0" + newd
-        return [newl,newd]    
-
-    def _lasting(self,l,d,i):
-        """ increments i and adds 2 to ensure extremes of map are drawn """
-        newd = (int(d) + (i +2)) % 100
-        newl = l
-        if newd < int(d):
-            newl = chr(ord(newl)+1)
-            if newl == 'O' or newl == 'I':
-                newl = chr(ord(newl)+1)
-        newd = str(newd)
-        if len(newd) == 1: newd = 'O' + newd
-        return [newl,newd]
-
-    def _drawloberror(self,loc,lob,err,color):
-        """ draws an error around the lob """
-        # TODO figure a way to set lobdist to 10000
-        # get lat/lon and +/- lobs
-        (lat,lon) = _MGRS.toLatLon(loc)
-        mB = (lob - err) % 360
-        pB = (lob + err) % 360
+        (es,ns) = mgrsgrid(extent)
+        lines = es + ns
+        if not lines: return {False:[],True:[]},[],[],[],[]
+        xs,ys = self.base(np.concatenate([l[1] for l in lines]),
+                          np.concatenate([l[0] for l in lines]))
+        xy = np.column_stack([xs,ys])
+        segs = {False:[],True:[]}
+        starts = []
+        i = 0
+        for (lats,lons,lbl,major) in lines:
+            segs[major].append(xy[i:i+len(lats)])
+            starts.append(xy[i])
+            i += len(lats)
+        xts = [starts[k][0] for k in range(len(es))]
+        yts = [starts[k][1] for k in range(len(es),len(lines))]
+        return segs,xts,[e[2] for e in es],yts,[n[2] for n in ns]
+
+    def _drawloberror(self,lats,lons,lobs,err,color):
+        """ draws an error wedge around each of the lobs from sites at lats,lons """
+        if not len(lats): return
         
         # TODO: 
         # draw edges as dashed lines, in same color as polygon
-        (mLat,mLon,mmgrs,mbaz) = terminus(loc,mB,10000)
-        mX,mY = self.base(mLon,mLat)
-        (pLat,pLon,pmgrs,pbaz) = terminus(loc,pB,10000)
-        
-        # project and stack
-        xs,ys = self.base([lon,mLon,pLon],[lat,mLat,pLat])
-        xy = np.vstack([xs,ys]).T
-        
-        # we have three points now
-        p = Polygon(xy,closed=True,facecolor=color,linewidth=0,alpha=0.4)
-        self.fig.gca().add_patch(p)
+        # get all wedges, project them in one call and reshape to polygons
+        (wlats,wlons) = wedges(lats,lons,lobs,err)
+        xs,ys = self.base(wlons.ravel(),wlats.ravel())
+        xy = np.dstack([np.reshape(xs,wlats.shape),np.reshape(ys,wlats.shape)])
+        
+        # a single collection of all the wedges
+        p = PolyCollection(xy,closed=True,facecolors=color,linewidths=0,alpha=0.4,animated=True)
+        self.ax.add_collection(p)
         self.qs.append(p)
-        self.canvas.show()
+        self._blit()
         
     def _statusbar(self,cs):
         """ 
          converts the (x,y) tuple coords to mgrs format 
          private fct used by _NavBar for mouseover
         """
+        # NOTE: bypasses the conversion cache, mouseover positions are rarely
+        # repeated and would only evict site locations
         lon,lat = self.base(cs[0],cs[1],inverse=True)
-        m = _MGRS.toMGRS(lat,lon)
+        with _MGRSLOCK: m = _MGRS.toMGRS(lat,lon)
         retval = "%s (lat=%f lon=%f)" % (m,lat,lon)
         return retval
 
@@ -1241,6 +1327,7 @@ class ConvoMapPanel(MapPanel):
         self.cnv = cnv # the convo
         self.qs = []   # list of quadrants drawn
         self.ls = []   # list of labels annotated
+        _loadmaps()
         ChildPanel.__init__(self,tl,parent,"Triangulation Convo %d" % key,"img/globe.png")
 
 #### CALLBACKS
@@ -1250,7 +1337,7 @@ class ConvoMapPanel(MapPanel):
         # show the lob error panel and get the user selected        
         sites = []
         for o in self.cnv.order:
-            for site in self.parent._sois[self.cnv.keys[o]].sites:
+            for site in self.parent.data[self.cnv.keys[o]].sites:
                 if not site in sites:
                     sites.append(site)
         
@@ -1259,13 +1346,9 @@ class ConvoMapPanel(MapPanel):
         if d.result is None: return
         
         # draw lob for each soi that site is in
-        for o in self.cnv.order:
-            s = self.parent._sois[self.cnv.keys[o]]
-            if s.sites.has_key(d.result[0]):
-                self._drawloberror(s.sites[d.result[0]].location,\
-                                   s.sites[d.result[0]].lob,\
-                                   d.result[1],\
-                                   d.result[2])
+        sois = [self.parent.data[self.cnv.keys[o]] for o in self.cnv.order]
+        (lats,lons,lobs) = sitelobs(sois,d.result[0])
+        self._drawloberror(lats,lons,lobs,d.result[1],d.result[2])
         
 #### PRIVATE FCTS
 
@@ -1280,10 +1363,10 @@ class ConvoMapPanel(MapPanel):
                      'cutcolors':['k','g','r','b','y','m','c','orange']}
         
         # get sender and responders. identify if static or moved during collect
-        snd = self.parent._sois[self.cnv.sender]
+        snd = self.parent.data[self.cnv.sender]
         rcvs = []
         for o in self.cnv.order[1:]: # skip the first i.e. the sender
-            rcvs.append(self.parent._sois[self.cnv.keys[o]])
+            rcvs.append(self.parent.data[self.cnv.keys[o]])
         
         # structs for data keeping
         sitecolors = ['g','r','b','y'] # allowed site colors
@@ -1321,16 +1404,8 @@ class ConvoMapPanel(MapPanel):
         # make a basemap using axes from above. Center around the sender, primary
         # site. Set the width and height to 1 (map will grow after adding gridlines)
         primary = snd.sites[snd.pri[0]].location
-        (lat,lon) = _MGRS.toLatLon(primary)
-        self.base = Basemap(projection='tmerc',\
-                            lat_0=lat,\
-                            lon_0=lon,\
-                            resolution='h',\
-                            area_thresh=0.1,\
-                            width=1,\
-                            height=1,\
-                            ax=self.ax,\
-                            suppress_ticks=False)
+        (lat,lon) = tolatlon(primary)
+        self.base = _basemap(self.ax,lat,lon)
         
         # plot the sender, then receivers in order of time
         locs = []
@@ -1351,6 +1426,7 @@ class ConvoMapPanel(MapPanel):
         self.ax.legend(loc=2,borderaxespad=0.2,numpoints=1)
         
         # show the canvas and pack it
+        self._makeoverlay()
         self.canvas.show()
         self.canvas.get_tk_widget().pack(side=TOP,fill=BOTH,expand=1)
 
@@ -1370,7 +1446,7 @@ class ConvoMapPanel(MapPanel):
             # get next site, location convert to lat/lon and project
             # NOTE: we only plot if this site has not already been plotted
             s = this.sites[site]
-            (lat,lon) = _MGRS.toLatLon(s.location)
+            (lat,lon) = tolatlon(s.location)
             x,y = self.base(lon,lat)
             
             # we could overlabel if for example, there are three 
@@ -1416,22 +1492,29 @@ class ConvoMapPanel(MapPanel):
             i += 1
         
         # plot any fixes
-        if this.df.state == soi.DF_FIX:
-            # a fix, plot location of the first cut
-            (lat,lon) = _MGRS.toLatLon(this.df.fix)
+        if this.df.fix:
+            # a fix, plot its location (the fix of ambiguous cuts is hollow)
+            (lat,lon) = tolatlon(this.df.fix)
             x,y = self.base(lon,lat)
             # instead of labeling with MGRS location, label with callsign
             cs = self.cnv.cs[self.cnv.order[current]]
             if cs is None: cs = "UI"
-            self.ptLabels.append((x,y,cs))
-            self.base.plot(x,y,cutcolors[0]+'s',markersize=msize)
-            self.base.plot(x,y,'w*',markersize=msize)
-        elif this.df.state >= soi.DF_CUT:
+            if this.df.state != soi.DF_FIX:
+                self.ptLabels.append((x,y,"%s (amb)" % cs))
+                self.base.plot(x,y,'ks',markersize=msize,markerfacecolor='none')
+            else:
+                self.ptLabels.append((x,y,cs))
+                self.base.plot(x,y,cutcolors[0]+'s',markersize=msize)
+                self.base.plot(x,y,'w*',markersize=msize)
+        if soi.DF_CUT <= this.df.state < soi.DF_FIX:
             # multiple cuts, plot all
             i = 0
             for cut in this.df.cuts:
+                # skip Inf/Amb/None cuts, they have no location
+                if not this.df._validcut(cut[soi.DF_CUT_X]): continue
+                
                 # for each cut, get location, convert to lat,lon and project onto map
-                (lat,lon) = _MGRS.toLatLon(cut[soi.DF_CUT_X])
+                (lat,lon) = tolatlon(cut[soi.DF_CUT_X])
                 x,y = self.base(lon,lat)
                 cs = self.cnv.cs[self.cnv.order[current]]
                 if cs is None: cs = "UI"
@@ -1449,7 +1532,7 @@ class ConvoMapPanel(MapPanel):
             lons = []
             lats = []
             for cut in this.df.cuts:
-                (lat,lon) = _MGRS.toLatLon(cut[6]) 
+                (lat,lon) = tolatlon(cut[6]) 
                 lats.append(lat)
                 lons.append(lon)
             xs,ys = self.base(lons,lats)
@@ -1460,6 +1543,209 @@ class ConvoMapPanel(MapPanel):
         
         return locs
 
+class HeatmapPanel(MapPanel):
+    """
+     Displays the density of the fixes/cuts and lobs of all SOIs, optionally
+     filtered by rf, time up and callsign, as heatmaps
+    """
+    def __init__(self,tl,parent):
+        self.key = None     # no single soi
+        self.base = None    # made on first draw
+        self.qs = []        # list of quadrants drawn
+        self.ls = []        # list of labels annotated
+        self.ptLabels = []  # nothing to annotate
+        self._selector = None # rubber band selection
+        _loadmaps()
+        ChildPanel.__init__(self,tl,parent,"Heatmap","img/globe.png")
+
+#### CALLBACKS
+
+    def loberror(self):
+        """ overrides MapPanel lob error fct, draws the site's lob errors of all SOIs shown """
+        if self.base is None:
+            showinfo("Lob Error","Draw the heatmap first",parent=self)
+            return
+        try:
+            (rf,start,end,callsign,bins) = self._filters()
+        except ValueError, e:
+            showerror("Invalid Entry",str(e),parent=self)
+            return
+        sois = list(selectsois(self.parent.data,rf,start,end,callsign))
+        sites = sorted(set(name for rec in sois for name in rec.pri))
+        if not sites:
+            showinfo("Lob Error","No sites to draw",parent=self)
+            return
+        d = LOBErrorPanel(self,[LOB_ALLSITES] + sites)
+        if d.result is None: return
+        name = None if d.result[0] == LOB_ALLSITES else d.result[0]
+        (lats,lons,lobs) = sitelobs(sois,name)
+        self._drawloberror(lats,lons,lobs,d.result[1],d.result[2])
+
+    def draw(self):
+        """ bins the SOIs matching the filters and draws the heatmaps """
+        try:
+            (rf,start,end,callsign,bins) = self._filters()
+        except ValueError, e:
+            showerror("Invalid Entry",str(e),parent=self)
+            return
+        recs = selectsois(self.parent.data,rf,start,end,callsign)
+        ((glats,glons),(llats,llons,lazs)) = gather(recs)
+        showGeos = self.gvar.get() and len(glats) > 0
+        showLobs = self.lvar.get() and len(llats) > 0
+        
+        # clear the previous heatmaps (and any lob errors & labels)
+        self.ax.cla()
+        self.qs = []
+        self.ls = []
+        self._selector = None
+        self.ax.set_title("%d fixes/cuts %d lobs" % (len(glats),len(llats)))
+        if not showGeos and not showLobs:
+            self.canvas.draw()
+            return
+        
+        # the lobs are rasterized by sampling points along them
+        lats = []
+        lons = []
+        if showGeos:
+            lats.append(glats)
+            lons.append(glons)
+        if showLobs:
+            (plats,plons,weights) = lobpoints(llats,llons,lazs)
+            lats.append(plats)
+            lons.append(plons)
+        lats = np.concatenate(lats)
+        lons = np.concatenate(lons)
+        
+        # center a basemap on the points and project them all in one call
+        (s,w,n,e) = (lats.min(),lons.min(),lats.max(),lons.max())
+        self.base = _basemap(self.ax,(s+n)/2,(w+e)/2)
+        xs,ys = self.base(lons,lats)
+        xs = np.asarray(xs)
+        ys = np.asarray(ys)
+        pad = max(xs.max()-xs.min(),ys.max()-ys.min(),1000) * 0.05
+        extent = ((xs.min()-pad,xs.max()+pad),(ys.min()-pad,ys.max()+pad))
+        img = (extent[0][0],extent[0][1],extent[1][0],extent[1][1])
+        
+        # empty bins are masked so the grid shows through
+        i = 0
+        if showLobs:
+            if showGeos: i = len(glats)
+            (grid,_,_) = density(xs[i:],ys[i:],bins,extent,weights)
+            self.ax.imshow(np.ma.masked_equal(grid,0),origin='lower',extent=img,\
+                           cmap='Blues',alpha=0.6,interpolation='nearest')
+        if showGeos:
+            (grid,_,_) = density(xs[:len(glats)],ys[:len(glats)],bins,extent)
+            self.ax.imshow(np.ma.masked_equal(grid,0),origin='lower',extent=img,\
+                           cmap='hot_r',alpha=0.8,interpolation='nearest')
+        self._drawgridlines([tomgrs(s,w),tomgrs(n,e)])
+        self.ax.set_xlim(extent[0])
+        self.ax.set_ylim(extent[1])
+        self._makeselector()
+        self.canvas.draw()
+
+    def cbSelect(self):
+        """ turns rubber band selection on/off """
+        if self._selector: self._selector.set_active(bool(self.svar.get()))
+
+    def onselect(self,eclick,erelease):
+        """ selects the SOIs geolocated inside the rubber band in the green 6 """
+        if self.base is None or eclick.xdata is None or erelease.xdata is None: return
+        xs = [eclick.xdata,erelease.xdata,eclick.xdata,erelease.xdata]
+        ys = [eclick.ydata,eclick.ydata,erelease.ydata,erelease.ydata]
+        lons,lats = self.base(xs,ys,inverse=True)
+        keys = self.parent.data.spatialindex().inbox(min(lats),min(lons),max(lats),max(lons))
+        self.parent.selectkeys(keys)
+        self.lblSelected.config(text="%d SOIs selected" % len(keys))
+
+#### PRIVATE FCTS
+
+    def _makegui(self):
+        """ filters and a figure """
+        frm = Frame(self)
+        frm.pack(side=TOP,fill=BOTH,expand=TRUE)
+        
+        # filters, blank for no filter
+        frmFilter = Frame(frm,borderwidth=1,relief='sunken')
+        frmFilter.pack(side=TOP,fill=X)
+        Label(frmFilter,text="RF: ").grid(row=0,column=0,sticky=W)
+        self.txtRFMin = Entry(frmFilter,width=9)
+        self.txtRFMin.grid(row=0,column=1,sticky=W)
+        Label(frmFilter,text=" - ").grid(row=0,column=2)
+        self.txtRFMax = Entry(frmFilter,width=9)
+        self.txtRFMax.grid(row=0,column=3,sticky=W)
+        Label(frmFilter,text=" Callsign: ").grid(row=0,column=4,sticky=W)
+        self.txtCallsign = Entry(frmFilter,width=10)
+        self.txtCallsign.grid(row=0,column=5,sticky=W)
+        Label(frmFilter,text="From: ").grid(row=1,column=0,sticky=W)
+        self.txtStart = Entry(frmFilter,width=15)
+        self.txtStart.grid(row=1,column=1,columnspan=2,sticky=W)
+        Label(frmFilter,text=" To: ").grid(row=1,column=3,sticky=W)
+        self.txtEnd = Entry(frmFilter,width=15)
+        self.txtEnd.grid(row=1,column=4,columnspan=2,sticky=W)
+        Label(frmFilter,text="Bins: ").grid(row=2,column=0,sticky=W)
+        self.txtBins = Entry(frmFilter,width=5)
+        self.txtBins.grid(row=2,column=1,sticky=W)
+        self.txtBins.insert(0,str(HEATMAP_BINS))
+        self.gvar = IntVar(self)
+        self.gvar.set(1)
+        Checkbutton(frmFilter,text="Fixes/Cuts",variable=self.gvar).grid(row=2,column=2,columnspan=2,sticky=W)
+        self.lvar = IntVar(self)
+        self.lvar.set(0)
+        Checkbutton(frmFilter,text="LOBs",variable=self.lvar).grid(row=2,column=4,sticky=W)
+        Button(frmFilter,text="Draw",command=self.draw).grid(row=2,column=5,sticky=E)
+        self.svar = IntVar(self)
+        self.svar.set(0)
+        Checkbutton(frmFilter,text="Select",variable=self.svar,\
+                    command=self.cbSelect).grid(row=3,column=0,columnspan=2,sticky=W)
+        self.lblSelected = Label(frmFilter,text="")
+        self.lblSelected.grid(row=3,column=2,columnspan=4,sticky=W)
+        
+        # make a figure & get the axes
+        self.fig = Figure()
+        self.ax = self.fig.add_subplot(111)
+        
+        # use a FigureCanvas and custom navigation toolbar
+        self.canvas = tkagg.FigureCanvasTkAgg(self.fig,master=frm)
+        tbar = _NavBar(self,self.canvas,frm)
+        self._makeoverlay()
+        self.canvas.get_tk_widget().pack(side=TOP,fill=BOTH,expand=1)
+        self.draw()
+
+    def _makeselector(self):
+        """ (re)makes the rubber band selector, active if Select is checked """
+        self._selector = RectangleSelector(self.ax,self.onselect,drawtype='box',\
+                                           useblit=True,button=[1],minspanx=5,\
+                                           minspany=5,spancoords='pixels')
+        self._selector.set_active(bool(self.svar.get()))
+
+    def _filters(self):
+        """
+         returns the tuple (rf,start,end,callsign,bins) of the filter entries, 
+         raising ValueError if any are invalid
+        """
+        rf = None
+        if self.txtRFMin.get() or self.txtRFMax.get():
+            rf = (float(self.txtRFMin.get() or 0),float(self.txtRFMax.get() or 'inf'))
+        start = self._dtg(self.txtStart.get())
+        end = self._dtg(self.txtEnd.get())
+        callsign = self.txtCallsign.get().strip() or None
+        bins = int(self.txtBins.get())
+        if bins < 1: raise ValueError, "Bins must be at least 1"
+        return rf,start,end,callsign,bins
+
+    def _dtg(self,s):
+        """ returns the zulu datetime of the entry s, None if blank """
+        s = s.strip()
+        if not s: return None
+        dtg = dt.datetime.strptime(s,"%Y-%m-%d %H%M")
+        if self.parent.config.ui['dtime'] == 'local': dtg = l2z(dtg,self.parent.config.ui['z2l'])
+        return dtg
+
+    def _statusbar(self,cs):
+        """ overrides MapPanel statusbar, there is no map until drawn """
+        if self.base is None: return ""
+        return MapPanel._statusbar(self,cs)
+
 class ViewSOIPanel(ChildPanel):
     """
      Displays SOI details and allows for edit of Gist
@@ -1620,8 +1906,18 @@ class ViewSOIPanel(ChildPanel):
                     cut = self.soi.df.getcut(self.soi.pri[r],self.soi.pri[c])
                     Label(frmDF,text=cut,width=15,relief='sunken').grid(row=r+1,column=c+1,sticky=N)
         
-        # add the final deterimination
-        Label(frmDF,text="Location: %s" % self.soi.df.status).grid(row=r+2,column=0,columnspan=len(self.soi.pri)+1,sticky=W)
+        # add the final deterimination, the fix of ambiguous cuts is noted
+        status = self.soi.df.status
+        amb = ""
+        if self.soi.df.fix and self.soi.df.state != soi.DF_FIX:
+            status = "%s, ambiguous fix %s" % (status,self.soi.df.fix)
+            amb = " (ambiguous)"
+        Label(frmDF,text="Location: %s" % status).grid(row=r+2,column=0,columnspan=len(self.soi.pri)+1,sticky=W)
+        if self.soi.df.ellipse:
+            (a,b,az) = self.soi.df.ellipse
+            Label(frmDF,text="Error (95%%)%s: %.0fm x %.0fm at %.0f%s" % (amb,a,b,az,u'\N{DEGREE SIGN}')).grid(row=r+3,column=0,columnspan=len(self.soi.pri)+1,sticky=W)
+            miss = " ".join(["%s %.0fm" % (n,abs(self.soi.df.residuals[n])) for n in self.soi.pri if n in self.soi.df.residuals])
+            Label(frmDF,text="Miss: %s" % miss).grid(row=r+4,column=0,columnspan=len(self.soi.pri)+1,sticky=W)
         
         # fsave and close buttons
         Button(frmBtn,text="Save",command=self.save).grid(row=0,column=0,sticky=W)
@@ -1714,7 +2010,7 @@ class ViewConvoPanel(ChildPanel):
         Label(frmJustify,text="Responses:").grid(row=2,column=0,sticky=W)
         
         # get the sender object & configure details
-        snd = self.parent._sois[self.cnv.sender]
+        snd = self.parent.data[self.cnv.sender]
         dtg = snd.dtg
         if self.parent.config.ui['dtime'] == 'local': dtg = l2z(dtg,self.parent.config.ui['z2l'])
         cs = self.cnv.cs[self.cnv.order[0]]
@@ -1729,6 +2025,7 @@ class ViewConvoPanel(ChildPanel):
             strDF = snd.df.status[-15:]
         elif dfState == soi.DF_AMB_CUT:
             strDF = "Amb Cuts"
+            if snd.df.fix: strDF = "~%s" % snd.df.fix
         elif dfState == soi.DF_FIX:
             strDF = snd.df.fix
         else:
@@ -1764,7 +2061,7 @@ class ViewConvoPanel(ChildPanel):
         r = 2
         for o in self.cnv.order[1:]: # skip the first
             # get the current responder object & configure details
-            rsp = self.parent._sois[self.cnv.keys[o]]
+            rsp = self.parent.data[self.cnv.keys[o]]
             dtg = rsp.dtg
             if self.parent.config.ui['dtime'] == 'local': dtg = l2z(dtg,self.parent.config.ui['z2l'])
             cs = self.cnv.cs[o]
@@ -1779,6 +2076,7 @@ class ViewConvoPanel(ChildPanel):
                 strDF = rsp.df.status[-15:]
             elif dfState == soi.DF_AMB_CUT:
                 strDF = "Amb Cuts"
+                if rsp.df.fix: strDF = "~%s" % rsp.df.fix
             elif dfState == soi.DF_FIX:
                 strDF = rsp.df.fix
             else:
@@ -1862,7 +2160,7 @@ class ViewConvoPanel(ChildPanel):
             
             # associated callsigns
             Label(frmCS,text="SOI %d" % self.cnv.keys[o]).grid(row=i+1,column=0,sticky=E)
-            callsigns = ['None']+self.parent._sois[self.cnv.keys[o]].getuniquecallsigns()
+            callsigns = ['None']+self.parent.data[self.cnv.keys[o]].getuniquecallsigns()
             self.vCS[self.cnv.keys[o]] = StringVar(self)
             self.vCS[self.cnv.keys[o]].set(self.cnv.cs[o])
             opt = Tkinter.OptionMenu(frmCS,self.vCS[self.cnv.keys[o]],*callsigns)
@@ -1871,8 +2169,8 @@ class ViewConvoPanel(ChildPanel):
             # gist and opnote
             cs = self.cnv.cs[o]
             if cs is None: cs = "UI"
-            gist += "%s: %s\n" % (cs,self.parent._sois[self.cnv.keys[o]].gist.strip())
-            opnote += "%d %s\n" % (self.cnv.keys[o],self.parent._sois[self.cnv.keys[o]].opnote.strip())
+            gist += "%s: %s\n" % (cs,self.parent.data[self.cnv.keys[o]].gist.strip())
+            opnote += "%d %s\n" % (self.cnv.keys[o],self.parent.data[self.cnv.keys[o]].opnote.strip())
         
         # fsave and close buttons
         Button(frmBtn,text="Save",command=self.save).grid(row=0,column=0,sticky=W)
@@ -1922,8 +2220,8 @@ class ConvoPanel(ChildPanel):
         # if any of the keys is a convo, 'flatten' the convo
         newkeys = []
         for key in self.keys:
-            if type(self.parent._sois[key]) == type(Convo(None,None,None,None)):
-                for skey in self.parent._sois[key].keys:
+            if self.parent.data.summary(key).convo:
+                for skey in self.parent.data[key].keys:
                     if skey not in newkeys:
                         newkeys.append(skey)
             else:
@@ -1935,7 +2233,7 @@ class ConvoPanel(ChildPanel):
         os = []
         for key in self.keys:
             # save the associated data, add tuple (key,dtg)
-            self.sois[key] = self.parent._sois[key]
+            self.sois[key] = self.parent.data[key]
             os.append((key,self.sois[key].dtg))
         os.sort(key=lambda o:o[1])            # sort tuple (key,dtg) by dtg  
         
@@ -1993,22 +2291,155 @@ class ConvoPanel(ChildPanel):
         Button(frmBtn,text="Merge",command=self.merge).grid(row=0,column=0,sticky=W)
         Button(frmBtn,text="Close",command=self.closeapp).grid(row=0,column=1,sticky=E) 
 
-class Convo(object):
+#### GREEN 6 LIST
+
+class G6ListView(Frame):
     """
-     placeholder for conversations
+     A virtual green 6 list. Only the rows of the G6ListModel currently scrolled
+     to are created in the Tix HList, so scrolling and loading cost the same
+     regardless of the number of rows. Changes are rendered once when idle.
+     The selection is kept here so rows scrolled out of view stay selected.
+     Clicking a column header sorts on that column (again to reverse it)
     """
-    def __init__(self,sender,order,keys,cs):
-        """
-         sender - key of sending soi
-         order - list of ordering, index into keys,cs
-         keys - list of keys of sois in convo
-         cs - list of callsigns associated with each soi
-        """
-        self.sender = sender
-        self.order = order
-        self.keys = keys
-        self.cs = cs
-        
+    def __init__(self,parent,headers,imgSOI=None,imgConvo=None,nRows=G6_ROWS):
+        Frame.__init__(self,parent)
+        self.model = G6ListModel(G6_COL_DTG)
+        self._imgs = {False:imgSOI,True:imgConvo}
+        self._n = nRows         # number of rows shown
+        self._top = 0           # display index of first row shown
+        self._selected = set()  # selected keys
+        self._visible = []      # keys of rows shown
+        self._pending = False   # a render is scheduled
+        
+        # the hlist and scrollbar, headers are buttons for sorting
+        self.hlist = HList(self,columns=len(headers),header=1,height=nRows,\
+                           selectmode='extended',separator='\t',\
+                           selectforeground='white')
+        self.hlist.grid(row=0,column=0,sticky=NSEW)
+        self.sb = Scrollbar(self,orient=VERTICAL,command=self._yview)
+        self.sb.grid(row=0,column=1,sticky=NS)
+        self.columnconfigure(0,weight=1)
+        for i in range(len(headers)):
+            btn = Button(self.hlist,text=headers[i],relief=FLAT,\
+                         command=lambda col=i:self.sort(col))
+            self.hlist.header_create(i,itemtype=WINDOW,window=btn)
+            self.hlist.column_width(i,chars=G6_WIDTHS[i])
+        
+        # scroll with mouse wheel and page up/down
+        self.hlist.bind('<Button-4>',lambda e:self._scrollto(self._top-3))
+        self.hlist.bind('<Button-5>',lambda e:self._scrollto(self._top+3))
+        self.hlist.bind('<MouseWheel>',lambda e:self._scrollto(self._top-e.delta/40))
+        self.hlist.bind('<Prior>',lambda e:self._scrollto(self._top-self._n))
+        self.hlist.bind('<Next>',lambda e:self._scrollto(self._top+self._n))
+
+    def bind(self,seq,func): self.hlist.bind(seq,func)
+
+    def insert(self,rows):
+        """ inserts rows, a sequence of (key,row) """
+        self.model.insert(rows)
+        self._changed()
+
+    def delete(self,keys):
+        """ deletes the rows with keys """
+        self._sync()
+        self.model.delete(keys)
+        self._selected.difference_update(keys)
+        self._changed()
+
+    def update(self,key,row):
+        """ replaces the row with key """
+        self.model.update(key,row)
+        self._changed()
+
+    def clear(self):
+        """ deletes all rows """
+        self.model.clear()
+        self._selected.clear()
+        self._top = 0
+        self._changed()
+
+    def sort(self,col):
+        """ sorts on col, reversing the order if already sorted on col """
+        self._sync()
+        self.model.sort(col,col == self.model.sortcol and not self.model.reverse)
+        self._changed()
+
+    def selection(self):
+        """ returns the selected keys in display order """
+        self._sync()
+        if len(self._selected) == 1: return list(self._selected)
+        return [key for key in self.model.keys() if key in self._selected]
+
+    def select(self,keys):
+        """ selects only the rows with keys, scrolling to the first """
+        self._selected = set([key for key in keys if key in self.model])
+        self.hlist.selection_clear()
+        if self._selected:
+            self.see(min(self._selected,key=self.model.index))
+        self._changed()
+
+    def clearselection(self):
+        """ unselects all rows """
+        self._selected.clear()
+        self.hlist.selection_clear()
+
+    def see(self,key):
+        """ scrolls so the row with key is shown """
+        i = self.model.index(key)
+        if i < self._top: self._scrollto(i)
+        elif i >= self._top + self._n: self._scrollto(i-self._n+1)
+
+#### PRIVATE FUNCTIONS
+
+    def _changed(self):
+        """ schedules a render """
+        if not self._pending:
+            self._pending = True
+            self.after_idle(self._render)
+
+    def _sync(self):
+        """ updates the selection from the rows shown """
+        if self._visible:
+            self._selected.difference_update(self._visible)
+            for e in self.hlist.info_selection():
+                if int(e) in self.model: self._selected.add(int(e))
+
+    def _render(self):
+        """ recreates the rows shown """
+        self._pending = False
+        self._sync()
+        self._top = max(0,min(self._top,len(self.model)-self._n))
+        self.hlist.delete_all()
+        self._visible = []
+        for key,row in self.model.window(self._top,self._n):
+            e = str(key)
+            self.hlist.add(e,itemtype=IMAGETEXT,image=self._imgs[row[G6_COL_CONVO]],text=key)
+            self.hlist.item_create(e,1,itemtype=IMAGETEXT,text=row[G6_COL_SITES])
+            self.hlist.item_create(e,2,itemtype=IMAGETEXT,text=row[G6_COL_DTG].time().strftime("%H%M"))
+            self.hlist.item_create(e,3,itemtype=IMAGETEXT,text=row[G6_COL_RF])
+            self.hlist.item_create(e,4,itemtype=IMAGETEXT,text=row[G6_COL_STATUS])
+            if key in self._selected: self.hlist.selection_set(e)
+            self._visible.append(key)
+        n = len(self.model)
+        if n: self.sb.set(float(self._top)/n,float(self._top+len(self._visible))/n)
+        else: self.sb.set(0,1)
+
+    def _scrollto(self,top):
+        """ shows rows starting at display index top """
+        top = max(0,min(top,len(self.model)-self._n))
+        if top != self._top:
+            self._top = top
+            self._render()
+
+    def _yview(self,*args):
+        """ scrollbar command """
+        if args[0] == 'moveto':
+            self._scrollto(int(float(args[1])*len(self.model)))
+        elif args[0] == 'scroll':
+            n = int(args[1])
+            if args[2] == 'pages': n *= self._n
+            self._scrollto(self._top+n)
+
 class LobsterRTPanel(Frame):
     """
      LobsterRTPanel - entry panel. Defines a simple menu and fields for entering
@@ -2035,10 +2466,12 @@ class LobsterRTPanel(Frame):
         self._imgG6Convo = None   # img for convo in g6 list
         self._dialogs = {}        # dict of open child dialogs
         self._txtSites = []       # list of site entry widgets
-        self._sois = {}           # internal data bin
-        self._nSOI = None         # internal record counter
-        self._curFile = None      # the current file, data is saved to
-        self._hasChanged = False  # has data changed
+        self._df = DFWorker()     # triangulates sois in the background
+        self._dfJobs = {}         # key -> job of sois waiting on triangulation
+        self._dfPoll = None       # scheduled poll of triangulations
+        self._compactFailed = False # a failed journal compaction was reported
+        self.data = SOIStore()    # the records, indexes & file
+        self.data.subscribe(self._ondata)
                 
         # make the menu, read the config, make the gui and initialize
         self._readconf()
@@ -2046,25 +2479,30 @@ class LobsterRTPanel(Frame):
         self._makegui()
         self._initialize()
         
-        # passed a file?
+        # passed a file? otherwise recover any untitled data
         if fpath: self.openfile(fpath)
+        else: self._recover()
+        self.after(JOURNAL_COMPACT,self._compactjournal)
 
 ## MENU CALLBACKS
 
     def newfile(self):
         """ closes current and initializes new """
-        if self._hasChanged:
+        if self.data.changed:
             ans = askyesnocancel('Save First?','There is unsaved data, Save before opening new?')
             if ans is None: return
-            elif ans:
-                self.savefile()    
+            elif ans and not self.savefile(): return
         self._closedialogs()
         self._closefile()
         self._initialize()
-        self._filestatus(False)
+        self.data.discard() # unsaved changes were saved or declined
 
     def openfile(self,fpath=None):
-        """ opens a pickled g6 file """
+        """ opens a g6 file (store or pickled) """
+        if self.data.changed:
+            ans = askyesnocancel('Save First?','There is unsaved data, Save before opening?')
+            if ans is None: return
+            elif ans and not self.savefile(): return
         # if a file was not passed, open the file dialog
         if not fpath:
             fpath = askopenfilename(title='Open Green 6',\
@@ -2073,12 +2511,9 @@ class LobsterRTPanel(Frame):
         if fpath:
             self._closedialogs()
             try:
-                # load all data from file and close before adding to gui, etc
-                fin = open(fpath,'rb')
-                sites = pickle.load(fin)
-                soiRec = pickle.load(fin)
-                sois = pickle.load(fin)
-                fin.close()
+                # any changes left in the journal (i.e. after a crash) are
+                # applied, the green 6 list follows the data
+                nReplay = self.data.open(fpath,True)
             except Exception, e:
                 showerror('Failed to Open Green 6',e)
             else:
@@ -2090,85 +2525,61 @@ class LobsterRTPanel(Frame):
                 if self.config.ui['dtime'] == 'local': n = z2l(n,self.config.ui['z2l'])
                 self.txtSOIDate.insert(0,n.date().strftime("%Y-%m-%d"))
                 self.txtSOITU.insert(0,n.time().strftime("%H%M"))
-                
-                # sites
-                for i in range(len(sites)):
-                    # convert time to local if necessary
-                    dtg = dt.datetime.strptime(self.txtSOIDate.get()+" "+sites[i][0],"%Y-%m-%d %H%M")
-                    if self.config.ui['dtime'] == 'local': dtg = z2l(dtg,self.config.ui['z2l']) 
-                    self._txtSites[i][SITE_TU].insert(0,dtg.time().strftime("%H%M"))
-                    self._txtSites[i][SITE_NAME].insert(0,sites[i][1])
-                    self._txtSites[i][SITE_LOC].insert(0,sites[i][2])
-                    self._txtSites[i][SITE_LOCKED] = sites[i][3]
-                    
-                    if sites[i][3]:
-                        if self._imgLocked:
-                            self._txtSites[i][SITE_BTN].config(image=self._imgLocked)
-                        else:
-                            self._txtSites[i][SITE_BTN].config(text="L")
-                        self._txtSites[i][SITE_TU].config(state=DISABLED)
-                        self._txtSites[i][SITE_NAME].config(state=DISABLED)
-                        self._txtSites[i][SITE_LOC].config(state=DISABLED)
-                    else:
-                        if self._imgLocked:
-                            self._txtSites[i][SITE_BTN].config(image=self._imgUnLocked)
-                        else:
-                            self._txtSites[i][SITE_BTN].config(text="U")
-                        self._txtSites[i][SITE_TU].config(state=NORMAL)
-                        self._txtSites[i][SITE_NAME].config(state=NORMAL)
-                        self._txtSites[i][SITE_LOC].config(state=NORMAL)
-                
-                # sois
-                self._nSOI = soiRec
-                self._sois = sois
-                
-                # sort sois by tu and add in sorted order
-                skeys = self._sois.keys()
-                skeys.sort(key=lambda key:self._dtg(key))   
-                for key in skeys: self._addgreen6(key,self._sois[key])
-                
-                # set the cur file and change the title
-                self._curFile = fpath
-                self._filestatus(False)
+                self._loadsites(self.data.sites)
+                if nReplay:
+                    showinfo('Recovered Changes',
+                             'Recovered %d unsaved changes from the journal' % nReplay)
+
+    def _loadsites(self,sites):
+        """ fills the site rows """
+        # sites
+        for i in range(len(sites)):
+            # convert time to local if necessary
+            dtg = dt.datetime.strptime(self.txtSOIDate.get()+" "+sites[i][0],"%Y-%m-%d %H%M")
+            if self.config.ui['dtime'] == 'local': dtg = z2l(dtg,self.config.ui['z2l']) 
+            self._txtSites[i][SITE_TU].insert(0,dtg.time().strftime("%H%M"))
+            self._txtSites[i][SITE_NAME].insert(0,sites[i][1])
+            self._txtSites[i][SITE_LOC].insert(0,sites[i][2])
+            self._txtSites[i][SITE_LOCKED] = sites[i][3]
+            
+            if sites[i][3]:
+                if self._imgLocked:
+                    self._txtSites[i][SITE_BTN].config(image=self._imgLocked)
+                else:
+                    self._txtSites[i][SITE_BTN].config(text="L")
+                self._txtSites[i][SITE_TU].config(state=DISABLED)
+                self._txtSites[i][SITE_NAME].config(state=DISABLED)
+                self._txtSites[i][SITE_LOC].config(state=DISABLED)
+            else:
+                if self._imgLocked:
+                    self._txtSites[i][SITE_BTN].config(image=self._imgUnLocked)
+                else:
+                    self._txtSites[i][SITE_BTN].config(text="U")
+                self._txtSites[i][SITE_TU].config(state=NORMAL)
+                self._txtSites[i][SITE_NAME].config(state=NORMAL)
+                self._txtSites[i][SITE_LOC].config(state=NORMAL)
 
-    def _dtg(self,key):
-        """ returns the dtg of the soi corresponding to key """
-        try:
-            # attempt for an soi
-            return self._sois[key].getdtg()
-        except AttributeError:
-            # its a convo, return sender
-            return self._sois[self._sois[key].sender].getdtg()
-       
     def savefile(self):
-        """ saves the current pickled g6 file """
+        """ saves the current g6 file, returns True if saved """
         # is there a file already in use
-        if self._curFile:
-            result = self._save(self._curFile)
-            if not result: showinfo('Failed to Save',result)
-            else: self._filestatus(False)
-        else:
+        fpath = self.data.fpath
+        if not fpath:
             fpath = asksaveasfilename(title='Save Green 6',\
                                       filetypes=[('Green 6 Files','*.g6')])
-            if fpath:
-                result = self._save(fpath)
-                if result:
-                    self._curFile = fpath
-                    self._filestatus(False)
-                else:
-                    showinfo('Failed to Save',result)
+            if not fpath: return False
+        result = self._save(fpath)
+        if result is not True:
+            showinfo('Failed to Save',result)
+            return False
+        return True
     
     def saveasfile(self):
-        """ saves the current pickled g6 file under a new name"""
+        """ saves the current g6 file under a new name"""
         fpath = asksaveasfilename(title='Save Green 6 as...',\
                                   filetypes=[('Green 6 Files','*.g6')])
         if fpath:
             result = self._save(fpath)
-            if result:
-                self._curFile = fpath
-                self._filestatus(False)
-            else:
-                showerror('Failed to Save',result)
+            if result is not True: showerror('Failed to Save',result)
     
     def exportfile(self):
         """ exports the current g6 file as a csv """
@@ -2177,12 +2588,14 @@ class LobsterRTPanel(Frame):
         dialog = self._getdialogs("exportcsv")
         if not dialog:
             # if there are no sois, don't export
-            if not self._sois: showinfo("SOIS empty","There is nothing to export")
+            if not self.data: showinfo("SOIS empty","There is nothing to export")
+            elif not self._flushdf():
+                showinfo("Triangulating","SOIs are still being triangulated, try again")
             else:
                 sites = []
                 for i in range(NUM_SITES): sites.append(self._txtSites[i][SITE_NAME].get())
                 t = Toplevel()
-                pnl = ExportCSVPanel(t,self,self._sois,sites)
+                pnl = ExportCSVPanel(t,self,self.data,sites)
                 self._adddialog(pnl._name,Minion(t,pnl,"exportcsv",True))
         else:
             dialog[0].tk.deiconify()
@@ -2202,12 +2615,12 @@ class LobsterRTPanel(Frame):
 
     def closeapp(self):
         # if there is unsaved date prompt to save data, otherwise, prompt to quit
-        if self._hasChanged:
+        if self.data.changed:
             ans = askyesnocancel('Save First?','There is unsaved data. Save before quitting')
             if ans is None: return
-            elif ans:
-                self.savefile()
+            elif ans and not self.savefile(): return
             self._closedialogs(True)
+            self.data.close(True,True) # unsaved changes were saved or declined
             self.quit()
         else:
             ans = askquestion('Quit?','Really Quit?',parent=self)
@@ -2216,6 +2629,7 @@ class LobsterRTPanel(Frame):
             else:
                 # quit will handle closing dialogs but do it anyway
                 self._closedialogs(True)
+                self.data.close()
                 self.quit()
 
     def convert(self):
@@ -2240,6 +2654,31 @@ class LobsterRTPanel(Frame):
             dialog[0].tk.deiconify()
             dialog[0].tk.lift()
 
+    def heatmap(self):
+        """ show heatmap of all sois """
+        dialog = self._getdialogs("heatmap")
+        if not dialog:
+            t = Toplevel()
+            pnl = HeatmapPanel(t,self)
+            self._adddialog(pnl._name,Minion(t,pnl,"heatmap",True))
+        else:
+            dialog[0].tk.deiconify()
+            dialog[0].tk.lift()
+
+    def retriangulate(self):
+        """ show bulk re-triangulation dialog """
+        dialog = self._getdialogs("retriangulate")
+        if not dialog:
+            if not self.data:
+                showinfo("SOIS empty","There is nothing to re-triangulate")
+                return
+            t = Toplevel()
+            pnl = RetriangulatePanel(t,self)
+            self._adddialog(pnl._name,Minion(t,pnl,"retriangulate",True))
+        else:
+            dialog[0].tk.deiconify()
+            dialog[0].tk.lift()
+
     def cut(self):
         """ show cut dialog """
         dialog = self._getdialogs("cut")
@@ -2303,13 +2742,11 @@ class LobsterRTPanel(Frame):
         """
         s = self._validate()
         if s:
-            # is there a cut?
-            s.triangulate(self.config.geo['cutt'])
-            
-            # add to internal and to display list
-            self._sois[self._nSOI]=s
-            self._addgreen6(self._nSOI,s)
-            self._nSOI += 1
+            # add to the data (the list follows) as pending, the cuts are
+            # found in the background so entry is never held up
+            s.df = pendingdf()
+            self._logsites()
+            self._triangulate(self.data.add(s),s)
 
             # clear LOBs/RF for next entry and set focus to first site
             for i in range(NUM_SITES): self._txtSites[i][SITE_LOB].delete(0,END)
@@ -2318,7 +2755,6 @@ class LobsterRTPanel(Frame):
             self.txtOpNote.delete("1.0",END)
             self._txtSites[0][SITE_LOB].focus_set()
             self.btnCallsign.config(state=DISABLED)
-            self._filestatus(True)
  
     def sitelock(self,i):
         """ lock the row, except lob, at i """
@@ -2374,7 +2810,7 @@ class LobsterRTPanel(Frame):
         mnu.add_command(label="Convo",command=lambda:self.ckp(None))
 
         # cannot map or edit multiple signals, have to select and open each one
-        n = len(self.g6.info_selection())
+        n = len(self.g6.selection())
         if n == 0: return
         elif n == 1: mnu.entryconfig(6,state=DISABLED) # disable convo
         elif n > 1:
@@ -2384,56 +2820,24 @@ class LobsterRTPanel(Frame):
     
     def ukp(self,event):
         """ unselect current selected """
-        self.g6.selection_clear()
+        self.g6.clearselection()
     
     def dkp(self,event):
         """ delete current selected entry from list and internal data """
-        ss = self.g6.info_selection()
-        for s in ss:
-            # delete from internal and remove from g6 list
-            del self._sois[int(s)]
-            self.g6.delete_entry(s)
-            
-            # delete from any convos
-            rConvo = []
-            for soi in self._sois:
-                if type(self._sois[soi]) == type(Convo(None,None,None,None)):
-                    # attempt to remove this key from convos set of keys
-                    try:
-                        # we have to delete from key,order and callsign
-                        i = self._sois[soi].keys.index(int(s))
-                        self._sois[soi].keys.pop(i)
-                        self._sois[soi].keys.pop(i)
-                        self._sois[soi].cs.pop(i)
-                        
-                        # was this the sender ?, make it next in order
-                        if self._sois[soi].sender == int(s):
-                            self.sender = self._sois[soi].keys[self.order[0]]
-                        
-                        # identify convos with 1 or fewer sois
-                        if len(self._sois[soi].keys) <= 1:
-                            rConvo.append(soi)
-                    except ValueError:
-                        pass
-            
-            # delete any convos with empty keys
-            if rConvo:
-                showinfo("Removing Convos","Convos %s are now invalid, removing them" % ", ".join(map(str,rConvo)))
-                for r in rConvo:
-                    del self._sois[r]
-                    self.g6.delete_entry(r)
-        self._filestatus(True)
+        rConvo = self.data.delete(self.g6.selection())
+        if rConvo:
+            showinfo("Removing Convos","Convos %s are now invalid, removing them" % ", ".join(map(str,rConvo)))
 
     def vkp(self,event):
         """ display the selected record """
         # allow multiple panels but only 1 per key
-        sid = int(self.g6.info_selection()[0])
-        if type(self._sois[sid]) == type(Convo(None,None,None,None)):
+        sid = self.g6.selection()[0]
+        if self.data.summary(sid).convo:
             # open a convo dialog
             dialog = self._getdialogs("convo_%d" % sid,False)
             if not dialog:
                 t = Toplevel()
-                pnl = ViewConvoPanel(t,self,sid,self._sois[sid])
+                pnl = ViewConvoPanel(t,self,sid,self.data[sid])
                 self._adddialog(pnl._name,Minion(t,pnl,"convo_%d" % sid,True))
             else:
                 dialog[0].tk.deiconify()
@@ -2443,7 +2847,7 @@ class LobsterRTPanel(Frame):
             dialog = self._getdialogs("soi_%d" % sid,False)
             if not dialog:
                 t = Toplevel()
-                pnl = ViewSOIPanel(t,self,sid,self._sois[sid])
+                pnl = ViewSOIPanel(t,self,sid,self.data[sid])
                 self._adddialog(pnl._name,Minion(t,pnl,"soi_%d" % sid,True))
             else:
                 dialog[0].tk.deiconify()
@@ -2452,12 +2856,12 @@ class LobsterRTPanel(Frame):
     def mkp(self,event):
         """ display selected on map """
         # allow multiple MapPanels but only 1 per key
-        sid = int(self.g6.info_selection()[0])
-        if type(self._sois[sid]) == type(Convo(None,None,None,None)):
+        sid = self.g6.selection()[0]
+        if self.data.summary(sid).convo:
             dialog = self._getdialogs("convomap_%d" % sid,False)
             if not dialog:
                 t = Toplevel()
-                pnl = ConvoMapPanel(t,self,sid,self._sois[sid])
+                pnl = ConvoMapPanel(t,self,sid,self.data[sid])
                 self._adddialog(pnl._name,Minion(t,pnl,"convomap_%d" % sid,True))
             else:
                 dialog[0].tk.deiconify()
@@ -2466,7 +2870,7 @@ class LobsterRTPanel(Frame):
             dialog = self._getdialogs("map_%d" % sid,False)
             if not dialog:
                 t = Toplevel()
-                pnl = MapPanel(t,self,sid,self._sois[sid])
+                pnl = MapPanel(t,self,sid,self.data[sid])
                 self._adddialog(pnl._name,Minion(t,pnl,"map_%d" % sid,True))
             else:
                 dialog[0].tk.deiconify()
@@ -2474,10 +2878,9 @@ class LobsterRTPanel(Frame):
 
     def ckp(self,event):
         """ merge 2 or more sois into a conversation """
-        ss = self.g6.info_selection()
+        ss = self.g6.selection()
         dialog = self._getdialogs("convo",False)
         if not dialog:
-            ss = map(int,ss)
             t = Toplevel()
             pnl = ConvoPanel(t,self,ss)
             self._adddialog(pnl._name,Minion(t,pnl,"convo",True))
@@ -2573,64 +2976,43 @@ class LobsterRTPanel(Frame):
 
 ## CHILD WINDOW CALLBACKS 
 
+    def setdfs(self,dfs):
+        """
+         swaps in the dfs (key -> DF) of a bulk re-triangulation returning the
+         keys set. background triangulations of those keys are superseded
+        """
+        for key in dfs: self._dfJobs.pop(key,None)
+        return self.data.setdfs(dfs)
+
+    def selectkeys(self,keys):
+        """ selects the records keys in the green 6 """
+        self.g6.select(keys)
+
     def childclose(self,pname):
         """ child window notifying of closing """
         self._deletedialog(pname)
 
     def savesoi(self,key,soi):
         """ saves the updated gist in soi to key """
-        # save internally
-        self._sois[key] = soi
-        
-        # update g6 list - for convos, no changes are reflected in list
-        if type(soi) != type(Convo(None,None,None,None)):
-            dtg = soi.getdtg()
-            if self.config.ui['dtime'] == 'local': dtg = z2l(dtg,self.config.ui['z2l'])
-            self.g6.item_configure(key,2,text=dtg.time().strftime("%H%M"))
-            self.g6.item_configure(key,3,text=soi.rf)
-        self._filestatus(True)
-        
-        # does edited soi affect any convos? only care about removed callsigns
-        # TODO: add an info message saying some convos have been affected
-        affected = []
-        for soi in self._sois:
-            if type(self._sois[soi]) == type(Convo(None,None,None,None)):
-                # soi is a convo
-                try:
-                    # the edited soi is at index i in convo, append to affected
-                    i=self._sois[soi].keys.index(key)
-                    affected.append(self._sois[soi].keys[i])
-                    
-                    # if the callsign at i no longer exists in the soi, change it to None
-                    if not self._sois[soi].cs[i] in self._sois[key].getuniquecallsigns():
-                        self._sois[soi].css[i] = None
-                    
-                except ValueError:
-                    # soi is not in convo
-                    pass
-
-        # showinfo message if any affected convos
+        # save internally, callsigns no longer in the soi are cleared from
+        # any convos it is part of
+        affected = self.data.update(key,soi)
         if affected:
             showinfo('Convos Affected','The edited SOI is part of convos %s' % ",".join(map(str,affected)))
 
     def mergesois(self,sender,order,keys,callsigns):
         """ merges selected sois into a convo """
-        c = Convo(sender,order,keys,callsigns)
-        self._sois[self._nSOI] = c
-        self._addgreen6(self._nSOI,c)
-        self._nSOI += 1
-        self._filestatus(True)
+        self.data.merge(sender,order,keys,callsigns)
 
     def changeprefs(self):
         """ preferences have changed, reload window """
         # if there is unsaved data, ask to save before reloading
         self._closedialogs(True) # we're reloading, so close everything
-        if self._hasChanged:
+        if self.data.changed:
            ans = askquestion('Save First?','Restarting program for changes to take effect. Save first?')
            if ans == 'yes': self.savefile()
-        fpath = None
-        if self._curFile: fpath=self._curFile
-        restart(fpath)
+        self.data.closejournal(False) # unsaved changes are recovered on restart
+        restart(self.data.fpath)
 
 ## PRIVATE FUNCTIONS
         
@@ -2661,7 +3043,11 @@ class LobsterRTPanel(Frame):
         self.mnuUtilsTriang = Menu(self.mnuUtils,tearoff=0)
         self.mnuUtilsTriang.add_command(label="Cut",command=self.cut)
         self.mnuUtilsTriang.add_command(label="Quadrant",command=self.quadrant)
+        self.mnuUtilsTriang.add_separator()
+        self.mnuUtilsTriang.add_command(label="Re-triangulate",command=self.retriangulate)
         self.mnuUtils.add_cascade(label="Triangulation",menu=self.mnuUtilsTriang)
+        self.mnuUtils.add_separator()
+        self.mnuUtils.add_command(label="Heatmap",command=self.heatmap)
         
         # help menu
         self.mnuHelp = Menu(self.menubar,tearoff=0)
@@ -2776,17 +3162,9 @@ class LobsterRTPanel(Frame):
         self.txtSOpNote.grid(row=3,column=1,columnspan=7,rowspan=2,sticky=W)
         
         # ENTERED SIGNALS
-        self.slist = ScrolledHList(frmMid,options="hlist.columns 5 hlist.header 1")
-        self.g6 = self.slist.hlist
-        self.g6.config(selectforeground='white') 
-        self.g6.config(separator='\t')
-        self.g6.config(selectmode='extended')
         headers = ["ID","SITE(S)",tLBL,"RF","FIX/CUT"]
-        style={}
-        style['header'] = DisplayStyle(TEXT,refwindow=self.g6,anchor=CENTER)
-        for i in range(len(headers)):
-            self.g6.header_create(i,itemtype=TEXT,text=headers[i],style=style['header'])
-        self.slist.grid(row=5,column=0,columnspan=8,sticky=NSEW)
+        self.g6 = G6ListView(frmMid,headers,self._imgG6SOI,self._imgG6Convo)
+        self.g6.grid(row=5,column=0,columnspan=8,sticky=NSEW)
         
         # BINDINGS
         
@@ -2874,6 +3252,7 @@ class LobsterRTPanel(Frame):
             self.config.read('lobster.conf')
         except Exception, e:
             showerror('Error in Preferences',e)
+        setgeodesy(self.config.geo['geodesy'])
         
     def _initialize(self):
         # set date/time entries
@@ -2881,9 +3260,6 @@ class LobsterRTPanel(Frame):
         if self.config.ui['dtime'] == 'local': n = z2l(n,self.config.ui['z2l'])
         self.txtSOIDate.insert(0,n.date().strftime("%Y-%m-%d"))
         self.txtSOITU.insert(0,n.time().strftime("%H%M"))
-        self._curFile = None
-        self._sois = {}
-        self._nSOI = 1
         self.master.title("LOBster v%s" % __version__)
 
     def _validate(self):
@@ -2960,71 +3336,167 @@ class LobsterRTPanel(Frame):
             return None
 
     def _save(self,fpath):
-        """ saves data to file fpath """
+        """
+         saves data to file fpath. If fpath is the open store, only records
+         changed since the last save are appended otherwise all records are
+         written to a new store. Returns True or the exception on failure
+        """
         try:
-            fout = open(fpath,'wb')
-            
-            # write current sites, locked state and dtg info, then internal data
-            sites = []
-            for i in range(NUM_SITES):
-                if self._txtSites[i][SITE_TU].get() == "": break
-                # convert time to zulu if necessary
-                dtg = dt.datetime.strptime(self.txtSOIDate.get()+" "+\
-                                           self._txtSites[i][SITE_TU].get(),\
-                                           "%Y-%m-%d %H%M")
-                if self.config.ui['dtime'] == 'local': dtg = l2z(dtg,self.config.ui['z2l'])
-                sites.append([dtg.time().strftime("%H%M"),\
-                              self._txtSites[i][SITE_NAME].get(),\
-                              self._txtSites[i][SITE_LOC].get(),\
-                              self._txtSites[i][SITE_LOCKED]])
-            pickle.dump(sites,fout)
-            
-            # and internal
-            pickle.dump(self._nSOI,fout) 
-            pickle.dump(self._sois,fout)
-            fout.close()
+            if not self._flushdf():
+                raise RuntimeError("SOIs are still being triangulated, try again")
+            self.data.setsites(self._sites())
+            self.data.save(fpath)
             return True
         except Exception,e:
             return e
 
-    def _addgreen6(self,k,s):
-        """ adds soi to the green 6 list """       
-        if type(s) == type(Convo(None,None,None,None)):
-            # Convo
-            # convert dtg if nessary 
-            dtg = self._sois[s.sender].getdtg()
-            if self.config.ui['dtime'] == 'local': dtg = z2l(dtg,self.config.ui['z2l'])
-            
-            # and compile participating sites
+    def _sites(self):
+        """ returns a list of current sites (tu,name,location,locked) """
+        sites = []
+        for i in range(NUM_SITES):
+            if self._txtSites[i][SITE_TU].get() == "": break
+            # convert time to zulu if necessary
+            dtg = dt.datetime.strptime(self.txtSOIDate.get()+" "+\
+                                       self._txtSites[i][SITE_TU].get(),\
+                                       "%Y-%m-%d %H%M")
+            if self.config.ui['dtime'] == 'local': dtg = l2z(dtg,self.config.ui['z2l'])
+            sites.append([dtg.time().strftime("%H%M"),\
+                          self._txtSites[i][SITE_NAME].get(),\
+                          self._txtSites[i][SITE_LOC].get(),\
+                          self._txtSites[i][SITE_LOCKED]])
+        return sites
+
+    def _recover(self):
+        """ offers to recover any untitled data left in the autosave journal """
+        n = self.data.recover()
+        if n:
+            ans = askyesno('Recover Data?',
+                           'There are %d unsaved changes from a previous session. Recover them?' % n)
+            if ans:
+                self._loadsites(self.data.sites)
+                return
+            self.data.discard()
+
+    def _logsites(self):
+        """ passes the current sites to the data (which journals them) """
+        try:
+            self.data.setsites(self._sites())
+        except ValueError:
+            # sites currently being edited, journal them on the next change
+            pass
+
+    def _compactjournal(self):
+        """
+         periodically folds journaled changes into the current file. Skipped
+         (until the next period) while triangulations are running or the sites
+         are being edited so pending sois and stale sites are never saved
+        """
+        self.after(JOURNAL_COMPACT,self._compactjournal)
+        if self._dfJobs: return
+        try:
+            sites = self._sites()
+        except ValueError:
+            return
+        try:
+            if sites != self.data.sites: self.data.setsites(sites)
+            self.data.compact()
+        except Exception, e:
+            # report once, not every period, until it succeeds again
+            if not self._compactFailed:
+                self._compactFailed = True
+                showerror('Failed to Save','Journaled changes could not be saved: %s' % e)
+        else:
+            self._compactFailed = False
+
+    def _ondata(self,event,keys):
+        """ follows changes to the data """
+        if event == EV_RESET:
+            # all at once, the list is sorted by tu. sois left pending (i.e.
+            # by a crash) are triangulated again
+            self._dfJobs.clear()
+            self.g6.clear()
+            self.g6.insert([(key,self._g6row(key)) for key in self.data.keys()])
+            for key in self.data.keys():
+                if self.data.summary(key).status == DF_PENDING:
+                    self._triangulate(key,self.data[key])
+        elif event == EV_ADD:
+            self.g6.insert([(key,self._g6row(key)) for key in keys])
+        elif event == EV_UPDATE:
+            for key in keys: self.g6.update(key,self._g6row(key))
+        elif event == EV_DELETE:
+            for key in keys: self._dfJobs.pop(key,None)
+            self.g6.delete(keys)
+        elif event == EV_STATUS:
+            self._filestatus()
+        elif event == EV_JOURNAL:
+            showerror('Journal Failed','Unsaved changes will not be journaled: %s' % keys)
+
+    def _triangulate(self,key,rec):
+        """ triangulates the soi rec at key in the background """
+        self._dfJobs[key] = self._df.submit(key,rec,self.config.geo['cutt'])
+        if self._dfPoll is None: self._dfPoll = self.after(DF_POLL,self._polldf)
+
+    def _polldf(self):
+        """ applies finished triangulations, polling while any are running """
+        self._dfPoll = None
+        self._applydf()
+        if len(self._df): self._dfPoll = self.after(DF_POLL,self._polldf)
+
+    def _flushdf(self):
+        """
+         waits (up to DF_FLUSH secs) on and applies all running triangulations
+         (i.e. before saving) returning False if any are still running
+        """
+        self._applydf()
+        end = time.time() + DF_FLUSH
+        while self._dfJobs:
+            left = end - time.time()
+            if left <= 0: return False
+            self._applydf(left)
+        return True
+
+    def _applydf(self,timeout=None):
+        """
+         sets the df of each soi whose triangulation has finished, waiting up
+         to timeout secs for one if set
+        """
+        for (key,job,df,e) in self._df.results(timeout):
+            # results of sois deleted or replaced (new/open) since are dropped
+            if self._dfJobs.get(key) != job: continue
+            del self._dfJobs[key]
+            if e:
+                showerror('Triangulation Failed','SOI %d: %s' % (key,e))
+                continue
+            rec = self.data[key]
+            rec.df = df
+            self.data.update(key,rec)
+
+    def _g6row(self,k):
+        """ returns the green 6 list row of record k from its summary """
+        summary = self.data.summary(k)
+        if summary.convo:
+            # Convo, compile participating sites, dtg and rf are the sender's
+            sender = self.data.summary(summary.sender)
             sites = []
-            for skey in s.keys:
-                for site in self._sois[skey].sites.keys():
+            for skey in summary.keys:
+                for site in self.data.summary(skey).sites:
                     if not site in sites: sites.append(site)
-            
-            # add the convo
-            self.g6.add(k,itemtype=IMAGETEXT,image=self._imgG6Convo,text=k)
-            self.g6.item_create(k,1,itemtype=IMAGETEXT,text=":".join(sites))
-            self.g6.item_create(k,2,itemtype=IMAGETEXT,text=dtg.time().strftime("%H%M"))
-            self.g6.item_create(k,3,itemtype=IMAGETEXT,text=self._sois[s.sender].rf)
-            self.g6.item_create(k,4,itemtype=IMAGETEXT,text="Mult") 
+            dtg = sender.dtg
+            rf = sender.rf
+            status = "Mult"
         else:
             # SOI
-            # convert dtg if necessary
-            dtg = s.getdtg() # convert time to local if necessary
-            if self.config.ui['dtime'] == 'local': dtg = z2l(dtg,self.config.ui['z2l'])
-            
-            # add the soi 
-            self.g6.add(k,itemtype=IMAGETEXT,image=self._imgG6SOI,text=k)
-            self.g6.item_create(k,1,itemtype=IMAGETEXT,text=":".join(s.sites))
-            self.g6.item_create(k,2,itemtype=IMAGETEXT,text=dtg.time().strftime("%H%M"))
-            self.g6.item_create(k,3,itemtype=IMAGETEXT,text=s.rf)
-            self.g6.item_create(k,4,itemtype=IMAGETEXT,text=s.df.status)
+            sites = summary.sites
+            dtg = summary.dtg
+            rf = summary.rf
+            status = summary.status
+        
+        # convert dtg if necessary
+        if self.config.ui['dtime'] == 'local': dtg = z2l(dtg,self.config.ui['z2l'])
+        return (k,":".join(sites),dtg,rf,status,summary.convo)
 
     def _closefile(self):
-        """ close file, resets curFile and deletes everything"""
-        # delete internal data
-        self._sois = {}
-        
+        """ clears the site rows & entries (the data is closed by SOIStore) """
         # delete all site info, set lock status to unlocked
         for i in range(NUM_SITES):
             self._clearsiterow(i)
@@ -3036,21 +3508,20 @@ class LobsterRTPanel(Frame):
         self.txtSOIRF.delete(0,END)
         self.txtGist.delete("1.0",END)
         self.txtOpNote.delete("1.0",END)
-        self.g6.delete_all()
 
-    def _filestatus(self,hasChanged):
-        """ file is saved or has unsaved changes """
-        self._hasChanged = hasChanged
-        if not self._curFile:
-            if self._hasChanged:
+    def _filestatus(self):
+        """ shows whether the file is saved or has unsaved changes """
+        if not self.data.fpath:
+            if self.data.changed:
                 self.master.title("LOBster Untitled*")
             else:
                 self.master.title("LOBster v%s" % __version__)
         else:
-            if self._hasChanged:
-                self.master.title("LOBster (%s)*" % os.path.split(self._curFile)[1].split('.')[0])
+            name = os.path.split(self.data.fpath)[1].split('.')[0]
+            if self.data.changed:
+                self.master.title("LOBster (%s)*" % name)
             else:
-                self.master.title("LOBster (%s)" % os.path.split(self._curFile)[1].split('.')[0])
+                self.master.title("LOBster (%s)" % name)
 
 ## VALIDATION METHODS
 
@@ -3180,10 +3651,21 @@ class LobsterRTPanel(Frame):
 
 #### start the program
 def main():
-    # a green 6 (.g6) file can be passed on the command line
-    t = Tk()
+    # a green 6 (.g6) file can be passed on the command line and
+    # --profile-startup reports the time taken to show the main window
+    args = [arg for arg in sys.argv[1:] if arg != '--profile-startup']
+    profile = len(args) < len(sys.argv[1:])
     fpath = None
-    if len(sys.argv) == 2: fpath = sys.argv[1]
-    LobsterRTPanel(t,fpath).mainloop()
-
-if __name__ == '__main__': main()
+    if args: fpath = args[-1]
+    t = Tk()
+    _mark('tk')
+    pnl = LobsterRTPanel(t,fpath)
+    _mark('gui')
+    if profile:
+        def _report():
+            _mark('shown')
+            _startupreport()
+        t.after_idle(_report)
+    pnl.mainloop()
+
+if _MAIN: main()
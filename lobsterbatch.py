@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+""" lobsterbatch.py: headless green 6 processing
+
+ Processes green 6 files without a display, only the soi, landnav and storage
+ modules are loaded (no Tk, matplotlib or Basemap).
+
+  python lobsterbatch.py stats g6 [g6 ...]
+   prints record counts, df results, time span and sites of each file
+  python lobsterbatch.py triangulate [-t CUTT] [-g GEODESY] [-o OUT] g6 [g6 ...]
+   re-triangulates every SOI with cut threshold CUTT (meters) saving to OUT or
+   in place (a pickled green 6 is rewritten as a store)
+  python lobsterbatch.py export [-f {csv,geojson}] [-t CUTT] [-g GEODESY] [-s SITE]
+                                [-n {true,grid,magnetic}] [-l] [-c CONF] g6 out
+   exports SOIs to csv or GeoJSON, re-triangulating first if CUTT is given
+
+ GEODESY is ellipsoidal (default) or fast (see landnav.setgeodesy)
+"""
+
+__license__ = 'GPL v3.0'
+__version__ = '0.0.1'
+__date__ = 'October 2026'
+__author__ = 'Dale Patterson'
+__maintainer__ = 'Dale Patterson'
+__email__ = 'wraith.wireless@yandex.com'
+__status__ = 'Development'
+
+import os                                            # for path, rename
+import sys                                           # for stderr, exit
+import argparse                                      # command line
+from soi import SOI                                  # SOI objects
+from soi import summarize                            # list columns of records
+from soi import CUT_THRESHOLD                        # default cut threshold
+from g6store import openg6                           # open a green 6
+from g6store import G6Store                          # green 6 storage engine
+from g6journal import journalpath                    # green 6's journal
+from landnav import setgeodesy                       # geodesy backend
+from landnav import GEODESY_MODES,GEODESY_ELLIPSOIDAL
+
+# df results by status
+DF_RESULTS = ['FIX','CUT','CUT(s)','LOB','NONE']
+
+def dfresult(status):
+    """ returns the df result (one of DF_RESULTS) of an SOI's df status """
+    if not status: return 'NONE'
+    if status.startswith('FIX'): return 'FIX'
+    if status == 'CUT(s)': return 'CUT(s)'
+    if status.startswith('CUT'): return 'CUT'
+    if status.startswith('LOB'): return 'LOB'
+    return 'NONE'
+
+def stats(sois):
+    """
+     returns a dict of statistics of the LazyRecords sois computed from the
+     record summaries i.e. without loading records
+    """
+    st = {'records':len(sois),'sois':0,'convos':0,'first':None,'last':None,
+          'df':dict([(r,0) for r in DF_RESULTS]),'sites':{}}
+    for key in sois.keys():
+        summary = sois.summary(key)
+        if summary.convo:
+            st['convos'] += 1
+            continue
+        st['sois'] += 1
+        st['df'][dfresult(summary.status)] += 1
+        for site in summary.sites: st['sites'][site] = st['sites'].get(site,0) + 1
+        if summary.dtg:
+            if st['first'] is None or summary.dtg < st['first']: st['first'] = summary.dtg
+            if st['last'] is None or summary.dtg > st['last']: st['last'] = summary.dtg
+    return st
+
+def retriangulate(fpath,cutt,out=None,progress=None):
+    """
+     re-triangulates all SOIs of the green 6 fpath with cut threshold cutt,
+     writing to out or in place. returns the tuple (# of SOIs, # of SOIs whose
+     df changed). Records are loaded one at a time
+    """
+    (store,sites,nSOI,sois) = openg6(fpath,summarize)
+    dest = out
+    if not out: dest = fpath + '.tmp'
+    nSOIs = nChanged = 0
+    new = G6Store(dest,True)
+    try:
+        keys = sorted(sois.keys())
+        for i in range(len(keys)):
+            rec = sois.peek(keys[i])
+            if isinstance(rec,SOI):
+                before = None
+                if rec.df: before = rec.df.status
+                rec.triangulate(cutt)
+                nSOIs += 1
+                if rec.df and rec.df.status != before: nChanged += 1
+            new.put(keys[i],rec,summarize(rec))
+            if progress: progress(i+1,len(keys))
+        new.setmeta({'sites':sites,'nSOI':nSOI})
+        new.checkpoint()
+        new.flush(True)
+    except:
+        new.close()
+        os.remove(dest)
+        if store: store.close()
+        raise
+    new.close()
+    if store: store.close()
+    if not out: os.rename(dest,fpath)
+    return nSOIs,nChanged
+
+class Triangulated(object):
+    """
+     read-only dict of records that are loaded one at a time (not kept in
+     memory) and re-triangulated with cut threshold cutt if cutt is not None
+    """
+    def __init__(self,records,cutt=None):
+        self._records = records
+        self._cutt = cutt
+    def __len__(self): return len(self._records)
+    def keys(self): return self._records.keys()
+    def __getitem__(self,key):
+        rec = self._records.peek(key)
+        if self._cutt is not None and isinstance(rec,SOI): rec.triangulate(self._cutt)
+        return rec
+
+#### commands
+
+def _progress(done,total):
+    """ writes progress to stderr if it is a terminal """
+    if sys.stderr.isatty(): sys.stderr.write("\r%d/%d" % (done,total))
+
+def cmdstats(args):
+    """ prints statistics of each file """
+    ret = 0
+    for fpath in args.g6:
+        try:
+            (store,sites,nSOI,sois) = openg6(fpath,summarize)
+        except Exception, e:
+            sys.stderr.write("%s: %s\n" % (fpath,e))
+            ret = 1
+            continue
+        try:
+            st = stats(sois)
+        finally:
+            if store: store.close()
+        print "%s: %d records (%d SOIs, %d convos)" % (fpath,st['records'],st['sois'],st['convos'])
+        print "  DF: %s" % "  ".join(["%s %d" % (r,st['df'][r]) for r in DF_RESULTS])
+        if st['first']:
+            print "  DTG: %s - %s" % (st['first'].strftime("%Y-%m-%d %H%MZ"),
+                                      st['last'].strftime("%Y-%m-%d %H%MZ"))
+        names = sorted(st['sites'].keys())
+        print "  Sites: %s" % " ".join(["%s(%d)" % (n,st['sites'][n]) for n in names])
+    return ret
+
+def cmdtriangulate(args):
+    """ re-triangulates each file """
+    if args.out and len(args.g6) > 1:
+        sys.stderr.write("-o can only be used with a single file\n")
+        return 2
+    ret = 0
+    for fpath in args.g6:
+        if not args.out and os.path.exists(journalpath(fpath)):
+            sys.stderr.write("%s: has unsaved changes (journal), skipping\n" % fpath)
+            ret = 1
+            continue
+        try:
+            (n,nChanged) = retriangulate(fpath,args.cutt,args.out,_progress)
+        except Exception, e:
+            sys.stderr.write("%s: %s\n" % (fpath,e))
+            ret = 1
+            continue
+        if sys.stderr.isatty(): sys.stderr.write("\n")
+        print "%s: re-triangulated %d SOIs, %d changed" % (args.out or fpath,n,nChanged)
+    return ret
+
+def cmdexport(args):
+    """ exports a file to csv or GeoJSON """
+    import g6export
+    try:
+        (store,sites,nSOI,sois) = openg6(args.g6,summarize)
+    except Exception, e:
+        sys.stderr.write("%s: %s\n" % (args.g6,e))
+        return 1
+    try:
+        recs = Triangulated(sois,args.cutt)
+        if args.format == 'geojson':
+            n = g6export.exportgeojson(args.out,recs,_progress)
+        else:
+            decl = None
+            z2lDiff = 0
+            if args.north != 'true' or args.local:
+                from lobsterconfig import LobsterConfig
+                config = LobsterConfig(args.conf)
+                decl = config.declination
+                z2lDiff = config.ui['z2l']
+            dtime = 'zulu'
+            if args.local: dtime = 'local'
+            n = g6export.export(args.out,recs,args.site,args.north,dtime,decl,z2lDiff,_progress)
+    except Exception, e:
+        sys.stderr.write("\nError writing %s: %s\n" % (args.out,e))
+        return 1
+    finally:
+        if store: store.close()
+    if sys.stderr.isatty(): sys.stderr.write("\n")
+    print "Wrote %d %s to %s" % (n,{'csv':'rows','geojson':'features'}[args.format],args.out)
+    return 0
+
+def main():
+    ap = argparse.ArgumentParser(description='Headless green 6 processing')
+    sp = ap.add_subparsers()
+
+    p = sp.add_parser('stats',help='print statistics of green 6 files')
+    p.add_argument('g6',nargs='+',help='green 6 (.g6) file')
+    p.set_defaults(cmd=cmdstats)
+
+    p = sp.add_parser('triangulate',help='re-triangulate all SOIs')
+    p.add_argument('g6',nargs='+',help='green 6 (.g6) file')
+    p.add_argument('-t','--cutt',type=int,default=CUT_THRESHOLD,
+                   help='cut threshold in meters (default %d)' % CUT_THRESHOLD)
+    p.add_argument('-g','--geodesy',default=GEODESY_ELLIPSOIDAL,choices=GEODESY_MODES,
+                   help='geodesy of distances (default %s)' % GEODESY_ELLIPSOIDAL)
+    p.add_argument('-o','--out',help='save to OUT instead of in place')
+    p.set_defaults(cmd=cmdtriangulate)
+
+    p = sp.add_parser('export',help='export SOIs to csv or GeoJSON')
+    p.add_argument('g6',help='green 6 (.g6) file')
+    p.add_argument('out',help='file to write')
+    p.add_argument('-f','--format',default='csv',choices=['csv','geojson'])
+    p.add_argument('-t','--cutt',type=int,help='re-triangulate with cut threshold in meters')
+    p.add_argument('-g','--geodesy',default=GEODESY_ELLIPSOIDAL,choices=GEODESY_MODES,
+                   help='geodesy of distances (default %s)' % GEODESY_ELLIPSOIDAL)
+    p.add_argument('-s','--site',action='append',help='only export site (csv, repeatable)')
+    p.add_argument('-n','--north',default='true',choices=['true','grid','magnetic'],
+                   help='north of lobs (csv, default true)')
+    p.add_argument('-l','--local',action='store_true',help='time up in local time (csv)')
+    p.add_argument('-c','--conf',default='lobster.conf',help='LOBster preferences')
+    p.set_defaults(cmd=cmdexport)
+
+    args = ap.parse_args()
+    if hasattr(args,'geodesy'): setgeodesy(args.geodesy)
+    return args.cmd(args)
+
+if __name__ == '__main__': sys.exit(main())
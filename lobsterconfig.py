@@ -56,11 +56,16 @@ class LobsterConfig(object):
         except Exception, e:
             raise ConfigInvalidParamException, e
         
-        # GEO: ellipse is a string, threshold a int
+        # GEO: ellipse is a string, threshold a int, geodesy is one of
+        # ellipsoidal or fast (optional, older conf files do not have it)
         # TODO: ensure ellipse is one of allowed strings
         try:
             self.geo['ellipse'] = g['ellipse']
             self.geo['cutt'] = int(g['cut_threshold'])
+            gd = g.get('geodesy','ellipsoidal').lower()
+            if not (gd == 'ellipsoidal' or gd == 'fast'):
+                raise ConfigInvalidParamException, "Geodesy must be ellipsoidal or fast"
+            self.geo['geodesy'] = gd
         except KeyError, e:
             raise ConfigRequiredParamException, "Parameter %s missing" % e
         except Exception, e:
@@ -96,7 +101,8 @@ class LobsterConfig(object):
                                'gtom':self.declination['g2m'],\
                                'gtot':self.declination['g2t']}
         conf['GEO'] = {'ellipse':self.geo['ellipse'],\
-                       'cut_threshold':self.geo['cutt']}
+                       'cut_threshold':self.geo['cutt'],\
+                       'geodesy':self.geo['geodesy']}
         conf['UI'] = {'azimuth':self.ui['azimuth'],\
                       'local_diff':self.ui['z2l'],\
                       'display_time':self.ui['dtime']}
@@ -111,5 +117,5 @@ class LobsterConfig(object):
     def _default(self):
         """ initializes internal to default configuation """
         self.declination = {'decl':'easterly','g2m':3,'g2t':1}
-        self.geo = {'ellipse':'WGS84','cutt':100}
+        self.geo = {'ellipse':'WGS84','cutt':100,'geodesy':'ellipsoidal'}
         self.ui = {'azimuth':'true','z2l':4.5,'dtime':'zulu'}
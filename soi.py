@@ -5,10 +5,17 @@
  of sites and lobs to emitters of interest
 """
 import itertools                                     # for permutations
-import math                                          # for isnan,isinf
-from landnav import findcut                          # cut fct for pairs of pts
-from landnav import _GEOD
-from landnav import _MGRS
+import collections                                   # for namedtuple
+import math                                          # time conversions
+import datetime as dt                                # for timedelta
+import numpy as np                                   # for geoterm arrays
+from landnav import findcuts_geo                     # cut fct for pairs of pts
+from landnav import CUT_VALID,CUT_INF,CUT_AMB        # cut status
+from landnav import geoterms                         # precomputed site terms
+from landnav import GEO_LAT,GEO_LON                  # geoterms indices
+from landnav import lsqfix                           # least squares fix
+from landnav import _GEOD                            # geodesy (see setgeodesy)
+from landnav import tolatlon,tomgrs                  # cached mgrs conversions
 
 
 __name__ = 'soi'
@@ -23,16 +30,65 @@ __status__ = 'Development'
 # GLOBALS
 CUT_THRESHOLD = 100 # max dist in meters to identify a cut
 
+# utility functions
+
+def l2z(l,ld):
+    """ converts local time l to zulu time given a difference of ld """
+    posld = abs(ld)
+    tSecs = math.floor(posld)*3600 + (posld-math.floor(posld))*3600
+    td = dt.timedelta(0,tSecs)
+    z = l - td
+    if ld < 0: z = -z
+    return z
+
+def z2l(z,ld):
+    """ converts zulu time z to local time given a difference of ld """
+    posld = abs(ld)
+    tSecs = math.floor(posld)*3600 + (posld-math.floor(posld))*3600
+    td = dt.timedelta(0,tSecs)
+    l = z + td
+    if ld < 0: l = -l
+    return l
+
 class Site(object):
     """
      A Site has a 5 letter name, a time up (dtg the site was up and running),
      a location (in MGRS) and a lob (bearing to an emitter). 
+     The site's geometry (lat/lon, radians and the sin/cos of its latitude) is
+     derived from location on first use and cached until location changes
     """
+    __slots__ = ('name','tu','lob','_location','_geo')
+    
     def __init__(self,name,tu,location,lob):
         self.name=name
         self.tu=tu
         self.location=location
         self.lob=lob
+    
+    def _getlocation(self): return self._location
+    def _setlocation(self,location):
+        self._location = location
+        self._geo = None
+    location = property(_getlocation,_setlocation)
+    
+    def _getgeo(self):
+        """ returns the geoterms of location, calculating them if necessary """
+        if self._geo is None:
+            (lat,lon) = tolatlon(self._location)
+            self._geo = geoterms(lat,lon)
+        return self._geo
+    geo = property(_getgeo)
+    latlon = property(lambda self: self._getgeo()[0:2])
+    
+    # only the record is pickled, the geometry is rederived on first use. This
+    # also loads sites pickled before Site defined __slots__
+    def __getstate__(self):
+        return {'name':self.name,'tu':self.tu,'location':self._location,'lob':self.lob}
+    def __setstate__(self,state):
+        self.name = state['name']
+        self.tu = state['tu']
+        self.location = state['location']
+        self.lob = state['lob']
 
 # DF STATES
 DF_INVALID = -1
@@ -62,24 +118,76 @@ class DF(object):
      ptcut is a grid designator or (Inf,Amb,None) if there is a cut from A & B 
      and distA and distB are distances (in meters) or Inf from points A & B 
      respectively
+      - fix is the weighted least squares fix of the lobs of three or more
+        sites (see landnav.lsqfix), ellipse its error ellipse (semi-major,
+        semi-minor,azimuth) and residuals a dict of the miss (meters) of each
+        site's lob. If there is no least squares fix, fix is the centroid of
+        the cuts. dists are the distances of each cut from the fix
       - state identifies the result of the df and is one of:
          DF_INVALID - no df, no points and lobs have been given
-         DF_NONE - all cuts are ambiguous, infinite or none
+         DF_NONE - no least squares fix and all cuts are ambiguous, infinite
+          or none
          DF_LOB - only one site has been entered or only one site has a lob
          DF_CUT - a cut but no fix
-         DF_AMB_CUT - (ambiguous cut) two or more differing cuts
-         DF_FIX - a possible fix has been identified
-     NOTE: we only calculate cuts. Every pairing of points and corresponding 
-      bearings are used to calculate a list of cuts
+         DF_AMB_CUT - (ambiguous cut) two or more differing cuts, the lobs
+          do not agree on a fix
+         DF_FIX - a possible fix has been identified, every lob points to it
+          and they miss it by (rms) less than the threshold
+     NOTE: we calculate cuts for display. The state of three or more sites is
+      decided by the least squares fix alone, cuts (and dists) are only
+      calculated for every pairing of points and corresponding bearings on
+      first use. Once found, lobs can be added or changed with addlob/updatelob
+      which only calculate the cuts of the pairings involving that site
     """
     def __init__(self):
         #self.centroid = None
         self.fix = None
-        self.cuts = []
-        self.dists = []
-        self.avgDist = float('inf')
+        self.ellipse = None
+        self.residuals = {}
         self.state = DF_INVALID
         self.status = ""
+        self._sites = []             # sites in pairing order
+        self._delta = CUT_THRESHOLD  # threshold used to identify a fix
+        self._cuts = None            # cuts, None until first used
+        self._cutlls = []            # lat,lon of each cut or None if invalid
+        self._sumll = [0.0,0.0,0]    # sum of valid cut lats, lons & count
+        self._dists = None           # dists & avgDist, None until first used
+        self._avgDist = float('inf')
+    
+    def __setstate__(self,state):
+        """
+         DFs pickled before incremental updates have no sites (see SOI), those
+         pickled before least squares fixes have no ellipse and those pickled
+         before cuts were found on first use have their cuts and dists
+        """
+        self.__dict__.update(state)
+        if not state.has_key('_sites'): self._sites = None
+        if not state.has_key('ellipse'):
+            self.ellipse = None
+            self.residuals = {}
+        if state.has_key('cuts'):
+            self._cuts = self.__dict__.pop('cuts')
+            self._dists = self.__dict__.pop('dists',None)
+            self._avgDist = self.__dict__.pop('avgDist',float('inf'))
+            if not state.has_key('_cutlls'): self._cutlls = None
+    
+    def _getcuts(self):
+        """ returns the cuts, calculating them if necessary """
+        if self._cuts is None: self._findcuts()
+        return self._cuts
+    cuts = property(_getcuts)
+    
+    def _getdists(self):
+        """ returns the dists of the cuts from the fix, calculating them if necessary """
+        if self._dists is None: self._finddists()
+        return self._dists
+    dists = property(_getdists)
+    
+    def _getavgdist(self):
+        """ returns the average dist of the valid cuts from the fix """
+        if self._dists is None: self._finddists()
+        return self._avgDist
+    avgDist = property(_getavgdist)
         
 #### ACCESSORS ####
 
@@ -94,100 +202,220 @@ class DF(object):
                 return cut[DF_CUT_X]
         return None
     
+    def incremental(self):
+        """ returns True if this df supports addlob/updatelob """
+        return self._sites is not None
+    
 #### TRIANGULATION ####
     
-    def find(self,pts,delta):
+    def find(self,sites,delta):
         """
-         find cuts (if any) between all pairings of pts and using the threshold
+         find cuts (if any) between all pairings of sites and using the threshold
          delta determines if each found cut is within the max distance
         """
+        self._sites = list(sites)
+        self._delta = delta
+        self._cuts = None
+        self._deconflict()
+    
+    def addlob(self,site,delta=None):
+        """
+         adds site (a Site) calculating only the cuts between it and the sites
+         already present and updates the fix and state. If the site's name is 
+         already present, it is updated instead (see updatelob)
+        """
+        for i in range(len(self._sites)):
+            if self._sites[i].name == site.name: return self.updatelob(site,delta)
+        if delta is not None: self._delta = delta
+        
+        # pair each existing site with the new (last) site, if cuts are found
+        self._sites.append(site)
+        if self._cuts is not None:
+            n = len(self._sites)-1
+            for (cut,ll) in self._triangulate([(i,n) for i in range(n)]):
+                self._appendcut(cut,ll)
+        self._deconflict()
+    
+    def updatelob(self,site,delta=None):
+        """
+         replaces the site having the same name as site (i.e. the location or 
+         lob has changed) recalculating only the cuts involving it and updates
+         the fix and state. Raises KeyError if there is no such site
+        """
+        n = None
+        for i in range(len(self._sites)):
+            if self._sites[i].name == site.name: n = i
+        if n is None: raise KeyError, site.name
+        if delta is not None: self._delta = delta
+        self._sites[n] = site
+        
+        # the cuts (if found) involving site, keep each cut at its index &
+        # pairing order
+        if self._cuts is not None:
+            iCuts = []
+            pairs = []
+            names = [s.name for s in self._sites]
+            for k in range(len(self._cuts)):
+                cut = self._cuts[k]
+                if cut[DF_CUT_ANAME] == site.name or cut[DF_CUT_BNAME] == site.name:
+                    iCuts.append(k)
+                    pairs.append((names.index(cut[DF_CUT_ANAME]),names.index(cut[DF_CUT_BNAME])))
+            for k,(cut,ll) in zip(iCuts,self._triangulate(pairs)):
+                self._setcut(k,cut,ll)
+        self._deconflict()
+
+#### PRIVATE FUNCTIONS ####
+
+    def _findcuts(self):
+        """ calculates the cuts of all pairings of sites """
+        self._cuts = []
+        self._cutlls = []
+        self._sumll = [0.0,0.0,0]
+        if not self._sites: return
+        
         # get all possible pairings (where (a,b) = (b,a) and excluding (a,a))
-        for combos in list(itertools.combinations(range(len(pts)),2)):
-            ptA = pts[combos[0]]                  # first pt
-            ptB = pts[combos[1]]                  # second pt
-            lla = _MGRS.toLatLon(ptA[1])          # convert to lat lon
-            llb = _MGRS.toLatLon(ptB[1])          # convert to lat lon
-            llx = findcut(lla,ptA[2],llb,ptB[2])  # triangulate
-            if type(llx) == type((0,1)):
-                # NOTE: geod.inv goes lon,lat in argument pairs ignore the first 
-                # two return values which are azimuth, back azimuth
-                ptX = _MGRS.toMGRS(llx[0],llx[1])
-                da = _GEOD.inv(lla[1],lla[0],llx[1],llx[0])[2]
-                db = _GEOD.inv(llb[1],llb[0],llx[1],llx[0])[2] 
+        for (cut,ll) in self._triangulate(list(itertools.combinations(range(len(self._sites)),2))):
+            self._appendcut(cut,ll)
+
+    def _finddists(self):
+        """
+         calculates the distances between each cut and the fix (in one pass),
+         NaN for invalid cuts, and their average
+        """
+        self._dists = []
+        self._avgDist = float('inf')
+        if self.fix is None: return
+        cuts = self.cuts
+        lls = self._cutlls
+        if lls is None: # pickled before the lat,lons were kept
+            lls = [tolatlon(cut[DF_CUT_X]) if self._validcut(cut[DF_CUT_X]) else None for cut in cuts]
+        valid = np.array([ll for ll in lls if ll is not None]).reshape(-1,2)
+        if not len(valid): return
+        llc = tolatlon(self.fix)
+        ds = iter(_GEOD.inv(valid[:,1],valid[:,0],np.repeat(llc[1],len(valid)),
+                            np.repeat(llc[0],len(valid)))[2])
+        for ll in lls:
+            if ll is None: self._dists.append(float('NaN'))
+            else: self._dists.append(float(ds.next()))
+        self._avgDist = sum([d for d in self._dists if d == d]) / len(valid)
+
+    def _triangulate(self,pairs):
+        """
+         calculates the cuts of pairs, a list of tuples of indexes into sites,
+         in one pass. returns a list of tuples (cut,(lat,lon)) where the lat,lon
+         is None for an invalid cut
+        """
+        if not pairs: return []
+        sites = self._sites
+        ias = [pair[0] for pair in pairs]
+        ibs = [pair[1] for pair in pairs]
+        geos = np.array([site.geo for site in sites])
+        (lats,lons,status) = findcuts_geo(geos[ias].T,[sites[i].lob for i in ias],
+                                          geos[ibs].T,[sites[i].lob for i in ibs])
+        
+        # distances from each site to the valid cuts, all pairs in one pass
+        # NOTE: geod.inv goes lon,lat in argument pairs ignore the first two
+        # return values which are azimuth, back azimuth
+        valid = np.flatnonzero(status == CUT_VALID)
+        if len(valid):
+            ka = [ias[k] for k in valid]
+            kb = [ibs[k] for k in valid]
+            das = _GEOD.inv(geos[ka,GEO_LON],geos[ka,GEO_LAT],lons[valid],lats[valid])[2]
+            dbs = _GEOD.inv(geos[kb,GEO_LON],geos[kb,GEO_LAT],lons[valid],lats[valid])[2]
+            dists = dict(zip(valid,zip(das,dbs)))
+        
+        ret = []
+        for k in range(len(pairs)):
+            sA = sites[ias[k]]                    # first site
+            sB = sites[ibs[k]]                    # second site
+            ll = None
+            if status[k] == CUT_VALID:
+                ptX = tomgrs(float(lats[k]),float(lons[k]))
+                (da,db) = map(float,dists[k])
+                ll = tolatlon(ptX) # the centroid is of the grid locations
             else:
                 da = -1
                 db = -1
-                if math.isinf(llx):
+                if status[k] == CUT_INF:
                     ptX = "Inf"
-                elif math.isnan(llx):
+                elif status[k] == CUT_AMB:
                     ptX = "Amb"
                 else:
                     ptX = "None"
             
-            # append to cuts
-            # cuts is a list of tuples 
-            # (nameA,ptA,bA,nameB,ptB,bB,ptCut,distA,distB)
-            self.cuts.append((ptA[0],ptA[1],ptA[2],ptB[0],ptB[1],ptB[2],ptX,da,db))
-                     
-        self._deconflict(pts,delta)
+            # cuts are tuples (nameA,ptA,bA,nameB,ptB,bB,ptCut,distA,distB)
+            ret.append(((sA.name,sA.location,sA.lob,sB.name,sB.location,sB.lob,ptX,da,db),ll))
+        return ret
 
-#### PRIVATE FUNCTIONS ####
+    def _appendcut(self,cut,ll):
+        """ appends cut having lat,lon ll adding it to the centroid sums """
+        self._cuts.append(cut)
+        self._cutlls.append(ll)
+        self._addll(ll,1)
+    
+    def _setcut(self,k,cut,ll):
+        """ replaces the cut at index k updating the centroid sums """
+        self._addll(self._cutlls[k],-1)
+        self._cuts[k] = cut
+        self._cutlls[k] = ll
+        self._addll(ll,1)
+    
+    def _addll(self,ll,sign):
+        """ adds (sign=1) or subtracts (sign=-1) ll from the centroid sums """
+        if ll is None: return
+        self._sumll[0] += sign*ll[0]
+        self._sumll[1] += sign*ll[1]
+        self._sumll[2] += sign
 
-    def _deconflict(self,pts,delta):
+    def _deconflict(self):
         """
          attempts to make sense of multiple cuts if possible, identify a cut
          and set the DF state
         """
+        sites = self._sites
+        self.fix = None
+        self.ellipse = None
+        self.residuals = {}
+        self._dists = None
         self.status = "None"
-        if len(pts) == 1:
+        if len(sites) == 1:
             # only 1 point, we have a LOB
             self.state = DF_LOB
-            self.status = "LOB %s->%.0f" % (pts[0][0],pts[0][2])
-        elif len(pts) == 2:
+            self.status = "LOB %s->%.0f" % (sites[0].name,sites[0].lob)
+        elif len(sites) == 2:
             # only 2 points, we have either a valid cut or two lobs
             if self._validcut(self.cuts[0][DF_CUT_X]):
                 self.state = DF_CUT
-                self.status = "CUT %s<->%s %s" % (pts[0][0],pts[1][0],self.cuts[0][DF_CUT_X])
+                self.status = "CUT %s<->%s %s" % (sites[0].name,sites[1].name,self.cuts[0][DF_CUT_X])
             else:
                 self.state = DF_LOB
                 self.status = "LOB(s)"
         else:
-            # three or more cuts - get the centroid
-            self.fix = self._centroid()
-
-            # sum the number of valid cuts, number of invalid and get
-            # distances bewteen each cut and the centroid
-            nV = 0
-            nNaN = 0
-            for cut in self.cuts:
-                # tally valid
-                if self._validcut(cut[DF_CUT_X]): nV += 1
-                
-                # compile distances
-                if not self._validcut(cut[DF_CUT_X]):
-                    self.dists.append(float('NaN'))
-                    nNaN += 1
-                else:
-                    llpt = _MGRS.toLatLon(cut[DF_CUT_X])
-                    llc = _MGRS.toLatLon(self.fix)
-                    dist = _GEOD.inv(llpt[1],llpt[0],llc[1],llc[0])[2]
-                    self.dists.append(dist)
-            
-            # if every distance was NaN we do not have a fix
-            if nNaN == len(self.dists):
-                self.state = DF_NONE
-                self.status = "No Cuts"
-            else:
-                # find average distance
-                # NOTE: any inf will result in dist of inf, meaning we 
-                # may have cuts but no fix
-                self.avgDist = sum(self.dists) / len(self.dists)
-                if self.avgDist < delta:
-                    # the fix is the centroid
+            # three or more lobs - the state is decided by the least squares
+            # fix of the lobs alone, cuts are not needed
+            lsq = lsqfix([site.latlon[0] for site in sites],
+                         [site.latlon[1] for site in sites],
+                         [site.lob for site in sites])
+            if lsq:
+                (lat,lon,self.ellipse,residuals,ahead) = lsq
+                self.fix = tomgrs(lat,lon)
+                for i in range(len(sites)): self.residuals[sites[i].name] = float(residuals[i])
+                rms = math.sqrt((residuals**2).mean())
+                if ahead.all() and rms < self._delta:
                     self.state = DF_FIX
                     self.status = "FIX %s" % self.fix
                 else:
-                    # note we save the centroid
+                    # note we save the fix
+                    self.state = DF_AMB_CUT
+                    self.status = "CUT(s)"
+            else:
+                # no least squares fix (parallel lobs), the fix is the
+                # centroid of the valid cuts if any
+                self.fix = self._centroid()
+                if self.fix is None:
+                    self.state = DF_NONE
+                    self.status = "No Cuts"
+                else:
                     self.state = DF_AMB_CUT
                     self.status = "CUT(s)"
 
@@ -199,18 +427,13 @@ class DF(object):
         return True
 
     def _centroid(self):
-        """ finds the centroid """
+        """ finds the centroid of the valid cuts, None if there are none """
         # we consider each cut as a point in a polygon taking 
         # the centroid, center of the polygon will guestimate the fix
-        lats = 0
-        lons = 0
-        for cut in self.cuts:
-            (lat,lon) = _MGRS.toLatLon(cut[DF_CUT_X])
-            lats += lat
-            lons += lon
-        lats /= len(self.cuts)
-        lons /= len(self.cuts)
-        return _MGRS.toMGRS(lats,lons)
+        if self._cuts is None: self._findcuts()
+        (lats,lons,n) = self._sumll
+        if n == 0: return None
+        return tomgrs(lats/n,lons/n)
 
 class SOI(object):
     """
@@ -236,12 +459,34 @@ class SOI(object):
 
     def triangulate(self,delta=CUT_THRESHOLD):
         """ attempts to find a df of the soi given the threshold delta """
-        sites = []
-        for site in self.sites.values(): sites.append((site.name,site.location,site.lob))
-        
+        sites = self.sites.values()
         if sites:
             self.df = DF()
             self.df.find(sites,delta)
+    
+    def addlob(self,name,tu,location,lob,delta=CUT_THRESHOLD):
+        """
+         adds a site (see addsite) and updates the df with only the cuts 
+         involving the new site
+        """
+        self.addsite(name,tu,location,lob)
+        if self.df is None or not self.df.incremental():
+            self.triangulate(delta)
+        else:
+            self.df.addlob(self.sites[name],delta)
+    
+    def updatelob(self,name,location=None,lob=None,delta=CUT_THRESHOLD):
+        """
+         changes the location and/or lob of the existing site name and updates
+         the df with only the cuts involving that site
+        """
+        site = self.sites[name]
+        if location is not None: site.location = location
+        if lob is not None: site.lob = lob
+        if self.df is None or not self.df.incremental():
+            self.triangulate(delta)
+        else:
+            self.df.updatelob(site,delta)
 
 #### ACCESSORS ####
 
@@ -278,3 +523,44 @@ class SOI(object):
         return ret
     def getopnote(self): return self.opnote
 
+class Convo(object):
+    """
+     placeholder for conversations
+    """
+    def __init__(self,sender,order,keys,cs):
+        """
+         sender - key of sending soi
+         order - list of ordering, index into keys,cs
+         keys - list of keys of sois in convo
+         cs - list of callsigns associated with each soi
+        """
+        self.sender = sender
+        self.order = order
+        self.keys = keys
+        self.cs = cs
+
+    def remove(self,key):
+        """
+         removes the soi key (and its callsign) from the convo, if key was the
+         sender the next soi in order becomes the sender
+        """
+        i = self.keys.index(key)
+        self.keys.pop(i)
+        self.cs.pop(i)
+        self.order = [o - (o > i) for o in self.order if o != i]
+        if self.order: self.sender = self.keys[self.order[0]]
+
+#### SUMMARIES ####
+
+# the list columns of a record, sites, dtg, rf and df status of an SOI or sender
+# and keys of a convo. Summaries are stored with records so that a green 6 can
+# be listed without loading the records
+Summary = collections.namedtuple('Summary','convo sites dtg rf status sender keys')
+
+def summarize(rec):
+    """ returns the Summary of the SOI or convo rec """
+    if isinstance(rec,SOI):
+        status = None
+        if rec.df: status = rec.df.status
+        return Summary(False,tuple(rec.sites.keys()),rec.dtg,rec.rf,status,None,None)
+    return Summary(True,None,None,None,None,rec.sender,tuple(rec.keys))
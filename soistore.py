@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+""" soistore.py: SOI data model
+
+ The records (SOIs and convos) of a green 6 and everything kept about them,
+ the record counter, sites, indexes, unsaved changes and persistence (the
+ green 6 store and its write-ahead journal) independent of any GUI. Listeners
+ are notified of changes so a view (i.e. the green 6 list) can follow the
+ data. Can be used headless i.e.
+
+  data = SOIStore()
+  data.open('test.g6')
+  key = data.add(soi)
+  data.save()
+  data.close()
+"""
+
+__name__ = 'soistore'
+__license__ = 'GPL v3.0'
+__version__ = '0.0.1'
+__date__ = 'October 2026'
+__author__ = 'Dale Patterson'
+__maintainer__ = 'Dale Patterson'
+__email__ = 'wraith.wireless@yandex.com'
+__status__ = 'Development'
+
+from soi import Convo                                # Convo objects
+from soi import summarize                            # summaries of records
+from g6store import saveg6                           # save store
+from g6store import openg6                           # open store or pickle
+from g6store import LazyRecords                      # records loaded on access
+from g6store import OP_PUT,OP_DEL,OP_META            # journal record ops
+from g6journal import G6Journal                      # write-ahead journal
+from g6journal import journalpath                    # green 6's journal
+from g6index import G6Index                          # time, rf & convo indexes
+from g6spatial import SpatialIndex                   # index of fixes/cuts
+from g6spatial import geolocations                   # fix/cuts of an soi
+
+# CONSTANTS
+AUTOSAVE = "autosave.g6j" # journal of untitled data
+
+# change events, listeners are called as listener(event,keys)
+EV_ADD     = 0 # keys were added
+EV_UPDATE  = 1 # keys were changed
+EV_DELETE  = 2 # keys were deleted
+EV_RESET   = 3 # all records were replaced (new/open), keys is None
+EV_STATUS  = 4 # saved/unsaved or the file changed, keys is None
+EV_JOURNAL = 5 # journaling failed and stopped, keys is the exception
+
+class SOIStore(object):
+    """
+     The records of a green 6. Records are read with [], summary & peek and
+     changed with add, update, delete & merge. Every change is indexed and
+     journaled. fpath is the current file (None if untitled), changed is True
+     if there are unsaved changes
+    """
+    def __init__(self):
+        self.fpath = None                         # current file
+        self.changed = False                      # has unsaved changes
+        self.sites = []                           # sites (see setsites)
+        self.nSOI = 1                             # record counter
+        self.index = G6Index()                    # time, rf & convo indexes
+        self._recs = LazyRecords(None,summarize)  # the records
+        self._geo = None                          # spatial index (see spatialindex)
+        self._store = None                        # open green 6 store of fpath
+        self._dirty = set()                       # keys changed since last save
+        self._jrnl = None                         # write-ahead journal
+        self._listeners = []
+
+    def subscribe(self,listener):
+        """ adds listener(event,keys) to be notified of changes """
+        self._listeners.append(listener)
+
+    def unsubscribe(self,listener): self._listeners.remove(listener)
+
+#### ACCESSORS ####
+
+    def __len__(self): return len(self._recs)
+    def __contains__(self,key): return self._recs.has_key(key)
+    def __getitem__(self,key): return self._recs[key]
+    def has_key(self,key): return self._recs.has_key(key)
+    def keys(self): return self._recs.keys()
+
+    def summary(self,key):
+        """ returns the summary of record key without loading it if possible """
+        return self._recs.summary(key)
+
+    def peek(self,key):
+        """ returns record key without keeping it loaded """
+        return self._recs.peek(key)
+
+    def convos(self,key):
+        """ returns the set of keys of convos containing the SOI key """
+        return self.index.convos(key)
+
+    def spatialindex(self):
+        """
+         returns the SpatialIndex of the fixes/cuts of the SOIs, built on first
+         use (loading each SOI once) then kept up to date with changes
+        """
+        if self._geo is None:
+            self._geo = SpatialIndex()
+            for key in self._recs.keys():
+                if self._recs.summary(key).convo: continue
+                self._geo.insert(key,geolocations(self._recs.peek(key)))
+        return self._geo
+
+    def meta(self):
+        """ returns the metadata dict of sites & record counter """
+        return {'sites':self.sites,'nSOI':self.nSOI}
+
+#### MODIFIERS ####
+
+    def add(self,rec):
+        """ adds the SOI or convo rec returning its key """
+        key = self.nSOI
+        self._recs[key] = rec
+        self.nSOI += 1
+        self._logchange(key)
+        self._logmeta()
+        self._notify(EV_ADD,[key])
+        self._setchanged(True)
+        return key
+
+    def merge(self,sender,order,keys,callsigns):
+        """ adds a convo of the SOIs keys returning its key """
+        return self.add(Convo(sender,order,keys,callsigns))
+
+    def update(self,key,rec):
+        """
+         replaces record key with rec returning a list of the convos the SOI
+         is part of. Callsigns of those convos no longer in the SOI are cleared
+        """
+        self._recs[key] = rec
+        self._logchange(key)
+        affected = []
+        if not isinstance(rec,Convo):
+            for c in sorted(self.index.convos(key)):
+                # the edited soi is at index i in convo
+                cnv = self._recs[c]
+                i = cnv.keys.index(key)
+                affected.append(c)
+                if not cnv.cs[i] in rec.getuniquecallsigns():
+                    cnv.cs[i] = None
+                    self._logchange(c)
+        self._notify(EV_UPDATE,[key])
+        self._setchanged(True)
+        return affected
+
+    def delete(self,keys):
+        """
+         deletes the records keys, removing deleted SOIs from any convos.
+         returns a list of the convos that were deleted because they were
+         left with 1 or fewer SOIs
+        """
+        # find the convos of the deleted before dropping them from the
+        # indexes (once, not per deleted key)
+        deleted = set([key for key in keys if self._recs.has_key(key)])
+        affected = set()
+        for key in deleted: affected.update(self.index.convos(key))
+        affected.difference_update(deleted)
+        self.index.removemany(deleted)
+        for key in deleted:
+            del self._recs[key]
+            self._logchange(key)
+
+        # delete from any convos, identifying those with 1 or fewer sois
+        rConvo = []
+        for c in sorted(affected):
+            cnv = self._recs[c]
+            for key in cnv.keys[:]:
+                if key in deleted: cnv.remove(key)
+            self._logchange(c)
+            if len(cnv.keys) <= 1: rConvo.append(c)
+        self.index.removemany(rConvo)
+        for c in rConvo:
+            del self._recs[c]
+            self._logchange(c)
+        self._notify(EV_DELETE,sorted(deleted) + rConvo)
+        self._setchanged(True)
+        return rConvo
+
+    def setdfs(self,dfs):
+        """
+         sets the df of each SOI in dfs (a dict key -> DF) at once i.e. after
+         a bulk re-triangulation. keys no longer in the data are skipped.
+         Records that are not loaded are updated without loading them
+        """
+        keys = sorted([key for key in dfs if self._recs.has_key(key)])
+        for key in keys:
+            rec = self._recs.peek(key)
+            rec.df = dfs[key]
+            self._recs.replace(key,rec)
+            self._logchange(key)
+        if keys:
+            self._notify(EV_UPDATE,keys)
+            self._setchanged(True)
+        return keys
+
+    def setsites(self,sites):
+        """ sets the sites (a list of [tu,name,location,locked]) """
+        self.sites = sites
+        self._logmeta()
+
+    def touch(self):
+        """ marks the data as having unsaved changes """
+        self._setchanged(True)
+
+#### PERSISTENCE ####
+
+    def new(self):
+        """ closes the current file and starts untitled data """
+        self.close()
+        self.openjournal()
+        if self._jrnl is not None: self._jrnl.truncate()
+        self._notify(EV_RESET,None)
+        self._setchanged(False)
+
+    def open(self,fpath,discard=False):
+        """
+         opens the green 6 fpath (store or pickled) applying any changes left
+         in its journal (i.e. after a crash). Unsaved changes to the current
+         data are left in its journal unless discard. Stores are kept open for
+         appending and records are only loaded when accessed, pickled files
+         are rewritten as a store on the next save. returns the number of
+         journaled changes recovered. Raises an exception if fpath cannot be
+         opened, leaving the current data as is
+        """
+        (store,sites,nSOI,recs) = openg6(fpath,summarize)
+        self.close(True,discard)
+        self._store = store
+        self.fpath = fpath
+        self.openjournal(fpath)
+        n = self._load(sites,nSOI,recs)
+        self._setchanged(n > 0,True)
+        return n
+
+    def recover(self):
+        """
+         opens the autosave journal loading any untitled data left from a
+         previous session. returns the number of changes recovered, discard
+         drops them
+        """
+        self.close()
+        self.openjournal()
+        n = self._load([],1,LazyRecords(None,summarize))
+        self._setchanged(n > 0,True)
+        return n
+
+    def discard(self):
+        """ drops all unsaved changes (and their journal) starting untitled data """
+        self.close(True,True)
+        self.new()
+
+    def save(self,fpath=None):
+        """
+         saves to fpath (the current file if None), making it the current file.
+         If fpath is the open store, only records changed since the last save
+         are appended otherwise all records are written to a new store. Raises
+         an exception on failure
+        """
+        if fpath is None: fpath = self.fpath
+        store = saveg6(fpath,self.meta(),self._recs,self._store,self._dirty)
+        if store is not self._store:
+            self._recs.setstore(store)
+            if self._store: self._store.close()
+            self._store = store
+        self._dirty.clear()
+
+        # saved changes are no longer needed in the journal
+        if self._jrnl is not None and self._jrnl.fpath != journalpath(fpath):
+            self.closejournal()
+            self.openjournal(fpath)
+        if self._jrnl is not None: self._jrnl.truncate()
+        self.fpath = fpath
+        self._setchanged(False,True)
+
+    def compact(self):
+        """ folds journaled changes into the current file, returns True if saved """
+        if self.fpath and self._jrnl is not None and len(self._jrnl):
+            self.save()
+            return True
+        return False
+
+    def close(self,remove=True,discard=False):
+        """
+         closes the store & journal and drops all records. The journal file is
+         removed if remove unless it holds unsaved changes that are not to be
+         discarded
+        """
+        remove = remove and (discard or not self.changed)
+        self._recs.close()
+        self._recs = LazyRecords(None,summarize)
+        self._geo = None
+        self.index.clear()
+        self._dirty.clear()
+        self.sites = []
+        self.nSOI = 1
+        self.fpath = None
+        if self._store:
+            self._store.close()
+            self._store = None
+        self.closejournal(remove)
+
+    def openjournal(self,fpath=None):
+        """ opens the journal for fpath or the autosave journal if untitled """
+        jpath = AUTOSAVE
+        if fpath: jpath = journalpath(fpath)
+        try:
+            self._jrnl = G6Journal(jpath)
+        except Exception, e:
+            self._jrnl = None
+            self._notify(EV_JOURNAL,e)
+
+    def closejournal(self,remove=True):
+        """ closes the journal, removing the journal file if remove """
+        if self._jrnl is not None:
+            self._jrnl.close(remove)
+            self._jrnl = None
+
+#### PRIVATE FUNCTIONS ####
+
+    def _load(self,sites,nSOI,recs):
+        """
+         applies journaled changes to sites, nSOI & recs and makes them the
+         current data returning the number of changes replayed
+        """
+        n = 0
+        if self._jrnl is not None:
+            replayed = self._jrnl.replay()
+            for op,key,obj in replayed:
+                if op == OP_PUT:
+                    recs[key] = obj
+                    self._dirty.add(key)
+                elif op == OP_DEL:
+                    recs.pop(key,None)
+                    self._dirty.add(key)
+                elif op == OP_META:
+                    sites = obj['sites']
+                    nSOI = obj['nSOI']
+            n = len(replayed)
+        self.sites = sites
+        self.nSOI = nSOI
+        self._recs = recs
+        self.index.build(recs)
+        self._notify(EV_RESET,None)
+        return n
+
+    def _logchange(self,key):
+        """ marks key as changed, updates the indexes and journals it """
+        self._dirty.add(key)
+        exists = self._recs.has_key(key)
+        if exists: self.index.update(key,self._recs.summary(key))
+        else: self.index.remove(key)
+        if self._geo is not None:
+            if exists and not self._recs.summary(key).convo:
+                self._geo.insert(key,geolocations(self._recs.peek(key)))
+            else:
+                self._geo.remove(key)
+        if self._jrnl is not None:
+            try:
+                if exists: self._jrnl.put(key,self._recs.peek(key))
+                else: self._jrnl.delete(key)
+            except Exception, e:
+                self.closejournal(False)
+                self._notify(EV_JOURNAL,e)
+
+    def _logmeta(self):
+        """ journals the sites & record counter """
+        if self._jrnl is not None:
+            try:
+                self._jrnl.setmeta(self.meta())
+            except Exception, e:
+                self.closejournal(False)
+                self._notify(EV_JOURNAL,e)
+
+    def _setchanged(self,changed,force=False):
+        """ sets the unsaved status, notifying if it changed (or if force) """
+        if changed != self.changed or force:
+            self.changed = changed
+            self._notify(EV_STATUS,None)
+
+    def _notify(self,event,keys):
+        """ notifies listeners of event """
+        for listener in self._listeners[:]: listener(event,keys)